@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+
+# --------------------------------------------------
+# BATCH EXECUTION WITH ERROR ISOLATION
+# --------------------------------------------------
+CREATE_QUARANTINE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_quarantine (
+    id BIGSERIAL PRIMARY KEY,
+    source TEXT NOT NULL,
+    record TEXT,
+    error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+INSERT_QUARANTINE_SQL = """
+INSERT INTO ingest_quarantine (source, record, error, created_at)
+VALUES (%s, %s, %s, NOW());
+"""
+
+# Concurrent CREATE TABLE IF NOT EXISTS can still collide in the
+# catalog, so parallel workers serialise the DDL on this lock
+QUARANTINE_DDL_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('ingest_quarantine'));"
+
+
+def plain_record(record):
+    # Typed Arrow batches are bisected down to one-row batches
+    if hasattr(record, "to_pylist"):
+        rows = record.to_pylist()
+        return rows[0] if len(rows) == 1 else rows
+    return record
+
+
+def serialize_record(record):
+    return json.dumps(plain_record(record), default=str)
+
+# --------------------------------------------------
+class TableQuarantine:
+    """
+    Writes rejected records to ingest_quarantine in the caller's transaction.
+
+    Creating it commits the table DDL, so create one per connection and
+    reuse it rather than one per batch.
+    """
+
+    def __init__(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute(QUARANTINE_DDL_LOCK_SQL)
+            cursor.execute(CREATE_QUARANTINE_TABLE_SQL)
+        conn.commit()
+
+    def write(self, cursor, source, record, error):
+        cursor.execute(INSERT_QUARANTINE_SQL, (source, serialize_record(record), str(error)))
+
+
+class FileQuarantine:
+    """Appends rejected records as JSON lines to a local file"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, cursor, source, record, error):
+        line = json.dumps(
+            {"source": source, "record": plain_record(record), "error": str(error)}, default=str
+        )
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def make_quarantine(conn, quarantine_file=None):
+    return FileQuarantine(quarantine_file) if quarantine_file else TableQuarantine(conn)
+
+# --------------------------------------------------
+class BatchExecutor:
+    """
+    Writes batches optimistically and isolates bad rows by bisection.
+
+    `write_batch(cursor, rows)` performs the actual write (COPY, multi-row
+    INSERT, ...) and returns how many rows it stored, or None for all of
+    them. A batch runs under a savepoint; if it fails, it is rolled back
+    to the savepoint and split in halves until the failing rows are
+    found. Those go to the quarantine with their error text and every
+    other row is kept. Nothing is committed here; the caller commits
+    once per batch so that other per-batch state (e.g. checkpoints)
+    lands in the same transaction.
+    """
+
+    def __init__(self, cursor, write_batch, quarantine, source):
+        self.cursor = cursor
+        self.write_batch = write_batch
+        self.quarantine = quarantine
+        self.source = source
+
+    def reject(self, record, error):
+        """Quarantine a record that failed before reaching the database"""
+        self.quarantine.write(self.cursor, self.source, record, error)
+
+    def execute(self, rows):
+        """Write rows; returns (stored, quarantined)"""
+        if not rows:
+            return 0, 0
+        if len(rows) == 1:
+            return self._write_row(rows)
+        try:
+            return self._attempt(rows), 0
+        except Exception as batch_error:
+            logging.warning(
+                f"Batch of {len(rows)} rows failed, isolating bad rows: {batch_error}"
+            )
+        return self._bisect(rows)
+
+    def _attempt(self, rows):
+        self.cursor.execute("SAVEPOINT batch_write")
+        try:
+            stored = self.write_batch(self.cursor, rows)
+        except Exception:
+            self.cursor.execute("ROLLBACK TO SAVEPOINT batch_write")
+            self.cursor.execute("RELEASE SAVEPOINT batch_write")
+            raise
+        self.cursor.execute("RELEASE SAVEPOINT batch_write")
+        return len(rows) if stored is None else stored
+
+    def _write_row(self, rows):
+        """Attempt a one-row batch once; quarantine the row if it fails"""
+        try:
+            return self._attempt(rows), 0
+        except Exception as row_error:
+            logging.error(f"Quarantined record from {self.source}: {row_error}")
+            # A one-row Arrow batch is quarantined as the batch itself
+            record = rows[0] if isinstance(rows, list) else rows
+            self.quarantine.write(self.cursor, self.source, record, row_error)
+            return 0, 1
+
+    def _bisect(self, rows):
+        """Retry the halves of a failed batch of two or more rows"""
+        stored, quarantined = 0, 0
+        mid = len(rows) // 2
+        for half in (rows[:mid], rows[mid:]):
+            # A single row that fails is only attempted once
+            if len(half) == 1:
+                half_stored, half_quarantined = self._write_row(half)
+            else:
+                try:
+                    half_stored, half_quarantined = self._attempt(half), 0
+                except Exception:
+                    half_stored, half_quarantined = self._bisect(half)
+            stored += half_stored
+            quarantined += half_quarantined
+        return stored, quarantined
+
+# --------------------------------------------------
+class PipelineExecutor:
+    """
+    Keeps several batches in flight on one psycopg 3 connection.
+
+    In pipeline mode batches are sent without waiting for the previous
+    result, and the client only syncs every `max_in_flight` batches.
+    Each group of batches is one transaction. If any batch of a group
+    fails, the server skips the rest of the group, so the group is
+    rolled back and replayed without pipelining through BatchExecutor,
+    which isolates the bad rows under savepoints and quarantines them.
+    Unlike BatchExecutor, this commits, once per group.
+    """
+
+    def __init__(self, conn, write_batch, quarantine, source, max_in_flight=8):
+        self.conn = conn
+        self.write_batch = write_batch
+        self.max_in_flight = max_in_flight
+        self.source = source
+        self.fallback = BatchExecutor(conn.cursor(), write_batch, quarantine, source)
+
+    def execute(self, batches):
+        """Write and commit every batch; returns (stored, quarantined)"""
+        stored, quarantined = 0, 0
+        group = []
+        for rows in batches:
+            group.append(rows)
+            if len(group) >= self.max_in_flight:
+                group_stored, group_quarantined = self._execute_group(group)
+                stored += group_stored
+                quarantined += group_quarantined
+                group = []
+                logging.info(
+                    f"{stored} rows stored, {quarantined} quarantined through the pipeline"
+                )
+        if group:
+            group_stored, group_quarantined = self._execute_group(group)
+            stored += group_stored
+            quarantined += group_quarantined
+        return stored, quarantined
+
+    def _execute_group(self, group):
+        try:
+            stored = 0
+            with self.conn.pipeline():
+                with self.conn.cursor() as cursor:
+                    for rows in group:
+                        written = self.write_batch(cursor, rows)
+                        stored += len(rows) if written is None else written
+            self.conn.commit()
+            return stored, 0
+        except Exception as group_error:
+            self.conn.rollback()
+            logging.warning(
+                f"Pipelined group of {len(group)} batches failed, replaying it: {group_error}"
+            )
+
+        stored, quarantined = 0, 0
+        for rows in group:
+            batch_stored, batch_quarantined = self.fallback.execute(rows)
+            stored += batch_stored
+            quarantined += batch_quarantined
+        self.conn.commit()
+        return stored, quarantined
@@ -0,0 +1,288 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import deque
+from datetime import datetime
+
+from json_stream import iter_object_items
+from stage_runner import run_command
+
+# --------------------------------------------------
+# END-TO-END PIPELINE BENCHMARK
+# --------------------------------------------------
+# Generates a synthetic dataset at each scale factor, runs the
+# generators and the ingest stages (into a local sink, no database
+# needed) as separate processes, and records rows/s, CPU time and
+# peak RSS per stage. Results can be saved as a baseline; later runs
+# are compared against it and regressions beyond the thresholds are
+# flagged (exit status 1).
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_SINK = "sqlite"
+DEFAULT_BASELINE = os.path.join(SCRIPT_DIR, "benchmarks", "baseline.json")
+
+# A stage regresses when its throughput drops or its peak memory
+# grows by more than these fractions of the baseline
+THROUGHPUT_REGRESSION = 0.20
+MEMORY_REGRESSION = 0.25
+
+# Output lines kept per stage to show when it fails
+ERROR_TAIL_LINES = 20
+
+SINK_EXTENSIONS = {"sqlite": ".sqlite", "duckdb": ".duckdb", "parquet": ""}
+
+
+def raw_path(data_dir, *parts):
+    return os.path.join(data_dir, "raw", *parts)
+
+
+def popularity_product_count(path):
+    """Products in product_popularity.json, from the metadata at its top"""
+    with open(path, "r", encoding="utf-8") as f:
+        for key, value in iter_object_items(f, stream_keys=("products",)):
+            if key == "metadata":
+                return value.get("exported_products", value.get("total_products", 0))
+    return 0
+
+
+def benchmark_stages(data_dir, scale, seed, sink):
+    """
+    (stage name, command, rows function) in run order.
+
+    The rows function is called after the stage succeeds and returns
+    the number of input rows it processed.
+    """
+    python = sys.executable
+    sink_path = os.path.join(data_dir, "sink" + SINK_EXTENSIONS[sink])
+    popularity_path = raw_path(data_dir, "external_api", "product_popularity.json")
+    counts = {}
+
+    def synthetic_rows():
+        with open(os.path.join(data_dir, "synthetic_counts.json"), "r", encoding="utf-8") as f:
+            counts.update(json.load(f))
+        return counts["reviews"] + counts["ratings"]
+
+    return [
+        ("generate_synthetic_data",
+         [python, "-c",
+          "import json, sys; from generate_synthetic_data import generate_synthetic_data; "
+          f"counts = generate_synthetic_data({data_dir!r}, {scale!r}, {seed!r}, force=True); "
+          f"json.dump(counts, open({os.path.join(data_dir, 'synthetic_counts.json')!r}, 'w'))"],
+         synthetic_rows),
+        ("generate_purchase_history",
+         [python, "generate_purchase_history.py", "--data-dir", data_dir],
+         lambda: counts["reviews"]),
+        ("generate_clickstream",
+         [python, "generate_clickstream.py", "--data-dir", data_dir, "--seed", str(seed)],
+         lambda: counts["reviews"]),
+        ("generate_external_api",
+         [python, "generate_external_api.py", "--data-dir", data_dir],
+         lambda: counts["ratings"]),
+        ("ingest_reviews",
+         [python, "ingest_reviews.py", "--input",
+          raw_path(data_dir, "reviews", "electronics_reviews.json"),
+          "--sink", sink, "--sink-path", sink_path],
+         lambda: counts["reviews"]),
+        ("ingest_purchase_history",
+         [python, "ingest_purchase_history.py", "--input",
+          raw_path(data_dir, "transactions", "purchase_history.csv"),
+          "--sink", sink, "--sink-path", sink_path],
+         lambda: counts["reviews"]),
+        ("ingest_product_popularity",
+         [python, "ingest_product_popularity.py", "--input", popularity_path,
+          "--sink", sink, "--sink-path", sink_path],
+         lambda: popularity_product_count(popularity_path)),
+    ]
+
+
+def run_benchmark_stage(name, command, rows_for, log_file):
+    """Run one stage, logging its output to log_file; returns its result record"""
+    tail = deque(maxlen=ERROR_TAIL_LINES)
+
+    def emit(level, line):
+        log_file.write(f"[{name}] {line}\n")
+        tail.append(line)
+
+    returncode, usage = run_command(command, emit, cwd=SCRIPT_DIR)
+    result = {
+        "stage": name,
+        "status": "ok" if returncode == 0 else "failed",
+        "wall_seconds": round(usage.wall_seconds, 3),
+        "cpu_seconds": round(usage.cpu_seconds, 3) if usage.cpu_seconds is not None else None,
+        "peak_rss_mb": round(usage.peak_rss_mb, 1) if usage.peak_rss_mb is not None else None,
+        "rows": None,
+        "rows_per_second": None,
+    }
+    if returncode == 0:
+        rows = rows_for()
+        result["rows"] = rows
+        result["rows_per_second"] = round(rows / usage.wall_seconds, 1) if usage.wall_seconds else None
+    else:
+        result["error"] = "\n".join(tail)
+    return result
+
+
+def run_benchmark(scales, seed, sink, work_dir, log_path, keep_data=False):
+    results = []
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        for scale in scales:
+            data_dir = os.path.join(work_dir, f"scale-{scale:g}")
+            os.makedirs(data_dir, exist_ok=True)
+            print(f"\nScale {scale:g}x ({data_dir})")
+            print("-" * 100)
+            for name, command, rows_for in benchmark_stages(data_dir, scale, seed, sink):
+                result = run_benchmark_stage(name, command, rows_for, log_file)
+                result["scale"] = scale
+                results.append(result)
+                print_result(result)
+            if not keep_data:
+                shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def print_result(result):
+    if result["status"] != "ok":
+        print(f"  {result['stage']:<28} FAILED after {result['wall_seconds']:.1f}s")
+        for line in result["error"].splitlines()[-3:]:
+            print(f"      {line}")
+        return
+    rss = f"{result['peak_rss_mb']:8.0f} MB" if result["peak_rss_mb"] is not None else "       n/a"
+    print(f"  {result['stage']:<28} {result['rows']:>12,} rows  "
+          f"{result['wall_seconds']:8.2f}s  {result['rows_per_second']:>12,.0f} rows/s  {rss}")
+
+
+# --------------------------------------------------
+def result_key(result):
+    return f"{result['stage']}@{result['scale']:g}x"
+
+
+def find_regressions(results, baseline,
+                     throughput_threshold=THROUGHPUT_REGRESSION,
+                     memory_threshold=MEMORY_REGRESSION):
+    """Human-readable regressions of results against a baseline results list"""
+    expected = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        key = result_key(result)
+        base = expected.get(key)
+        if not base or base["status"] != "ok":
+            continue
+        if result["status"] != "ok":
+            regressions.append(f"{key}: failed (passed in the baseline)")
+            continue
+        if base["rows_per_second"] and result["rows_per_second"] is not None:
+            change = result["rows_per_second"] / base["rows_per_second"] - 1
+            if change < -throughput_threshold:
+                regressions.append(
+                    f"{key}: throughput {result['rows_per_second']:,.0f} rows/s, "
+                    f"{-change:.0%} below baseline {base['rows_per_second']:,.0f}"
+                )
+        if base["peak_rss_mb"] and result["peak_rss_mb"] is not None:
+            change = result["peak_rss_mb"] / base["peak_rss_mb"] - 1
+            if change > memory_threshold:
+                regressions.append(
+                    f"{key}: peak RSS {result['peak_rss_mb']:,.0f} MB, "
+                    f"{change:.0%} above baseline {base['peak_rss_mb']:,.0f}"
+                )
+    return regressions
+
+
+def write_results(path, results, scales, sink, seed):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "generated_at": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "scales": list(scales),
+            "sink": sink,
+            "seed": seed,
+            "results": results,
+        }, f, indent=2)
+
+
+def main(scales=DEFAULT_SCALES, seed=42, sink=DEFAULT_SINK, output_path=None,
+         baseline_path=DEFAULT_BASELINE, save_baseline=False, work_dir=None, keep_data=False):
+    print("=" * 80)
+    print("Pipeline Benchmark")
+    print("=" * 80)
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    os.makedirs(work_dir, exist_ok=True)
+    output_path = output_path or os.path.join(work_dir, "benchmark_results.json")
+    log_path = os.path.join(work_dir, "benchmark.log")
+    print(f"Scales: {', '.join(f'{scale:g}x' for scale in scales)} | Sink: {sink} | Seed: {seed}")
+    print(f"Stage output: {log_path}")
+
+    results = run_benchmark(scales, seed, sink, work_dir, log_path, keep_data)
+    write_results(output_path, results, scales, sink, seed)
+    print(f"\nResults saved to: {output_path}")
+
+    regressions = []
+    if save_baseline:
+        write_results(baseline_path, results, scales, sink, seed)
+        print(f"Baseline saved to: {baseline_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline["results"])
+        print(f"\nCompared against baseline: {baseline_path} ({baseline['generated_at']})")
+        print("-" * 100)
+        for regression in regressions:
+            print(f"  REGRESSION {regression}")
+        if not regressions:
+            print("  No regressions")
+    else:
+        print(f"No baseline at {baseline_path}; run with --save-baseline to record one")
+
+    failed = [result_key(result) for result in results if result["status"] != "ok"]
+    if failed:
+        print(f"\nFailed stages: {', '.join(failed)}")
+
+    print("\n" + "=" * 80)
+    print("Benchmark complete!")
+    print("=" * 80)
+    return 1 if regressions or failed else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the generators and ingest stages on synthetic data")
+    parser.add_argument(
+        "--scales", type=float, nargs="+", default=list(DEFAULT_SCALES),
+        help="Scale factors to run (default: 1 10 100)"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic data")
+    parser.add_argument(
+        "--sink", choices=sorted(SINK_EXTENSIONS), default=DEFAULT_SINK,
+        help="Local sink the ingest stages write to"
+    )
+    parser.add_argument("--output", help="Results JSON (default: in the work directory)")
+    parser.add_argument(
+        "--baseline", default=DEFAULT_BASELINE,
+        help="Baseline results JSON to compare against"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="Record this run as the new baseline instead of comparing"
+    )
+    parser.add_argument("--work-dir", help="Directory for data, logs and results")
+    parser.add_argument(
+        "--keep-data", action="store_true",
+        help="Keep each scale's generated data instead of deleting it"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(main(
+        args.scales, args.seed, args.sink, args.output, args.baseline,
+        args.save_baseline, args.work_dir, args.keep_data
+    ))
@@ -0,0 +1,69 @@
+from datetime import date, time
+
+# --------------------------------------------------
+# COPY TEXT FORMAT
+# --------------------------------------------------
+# Bytes handed to psycopg2 per read() call on a COPY stream
+COPY_BUFFER_SIZE = 64 * 1024
+
+# Escapes required by the COPY text format
+COPY_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+})
+
+# --------------------------------------------------
+def format_copy_value(value):
+    """Render one value in PostgreSQL COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea hex format; the backslash itself needs COPY escaping
+        return "\\\\x" + bytes(value).hex()
+    return str(value).translate(COPY_ESCAPES)
+
+
+def format_copy_row(values):
+    return "\t".join(format_copy_value(v) for v in values) + "\n"
+
+# --------------------------------------------------
+class CopyStream:
+    """
+    Read-only file-like object over an iterator of row tuples.
+
+    Rows are rendered lazily as psycopg2 asks for more data, so only
+    about one read() worth of COPY text is held in memory at a time.
+    """
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._parts = []
+        self._buffered = 0
+
+    def _fill(self, size):
+        while size < 0 or self._buffered < size:
+            values = next(self._rows, None)
+            if values is None:
+                break
+            text = format_copy_row(values)
+            self._parts.append(text)
+            self._buffered += len(text)
+
+    def read(self, size=-1):
+        self._fill(size)
+        data = "".join(self._parts)
+        if 0 <= size < len(data):
+            data, rest = data[:size], data[size:]
+            self._parts = [rest]
+            self._buffered = len(rest)
+        else:
+            self._parts = []
+            self._buffered = 0
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
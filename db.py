@@ -0,0 +1,121 @@
+import configparser
+import os
+
+# --------------------------------------------------
+# SHARED DATABASE ACCESS
+# --------------------------------------------------
+# Defaults match the values the ingest scripts used to hardcode.
+DEFAULT_DB_CONFIG = {
+    "host": "localhost",
+    "port": 5432,
+    "database": "postgres",
+    "user": "postgres",
+    "password": "sajal"
+}
+
+# Standard libpq environment variables override everything else
+ENV_VARS = {
+    "host": "PGHOST",
+    "port": "PGPORT",
+    "database": "PGDATABASE",
+    "user": "PGUSER",
+    "password": "PGPASSWORD",
+}
+
+# INI file with a [postgresql] section; path can be set with PIPELINE_DB_CONFIG
+CONFIG_FILE_ENV = "PIPELINE_DB_CONFIG"
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.ini")
+CONFIG_SECTION = "postgresql"
+
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = int(os.environ.get("PIPELINE_DB_POOL_SIZE", 8))
+
+_pool = None
+_pool_config = None
+
+# --------------------------------------------------
+def load_db_config(config_file=None):
+    """Build connection settings: defaults < config file < environment"""
+    config = dict(DEFAULT_DB_CONFIG)
+
+    config_file = config_file or os.environ.get(CONFIG_FILE_ENV, DEFAULT_CONFIG_FILE)
+    if os.path.exists(config_file):
+        parser = configparser.ConfigParser()
+        parser.read(config_file)
+        if parser.has_section(CONFIG_SECTION):
+            config.update(parser.items(CONFIG_SECTION))
+
+    for key, env_var in ENV_VARS.items():
+        if os.environ.get(env_var):
+            config[key] = os.environ[env_var]
+
+    config["port"] = int(config["port"])
+    return config
+
+# --------------------------------------------------
+def get_pool(db_config=None):
+    """Process-wide connection pool, created on first use"""
+    global _pool, _pool_config
+    db_config = db_config or load_db_config()
+
+    if _pool is not None and _pool_config != db_config:
+        close_pool()
+    if _pool is None:
+        # psycopg2 is only needed once PostgreSQL is used, so the local
+        # sinks run without it
+        from psycopg2.pool import ThreadedConnectionPool
+
+        _pool = ThreadedConnectionPool(POOL_MIN_CONN, POOL_MAX_CONN, **db_config)
+        _pool_config = db_config
+    return _pool
+
+
+def get_connection(db_config=None):
+    """Take a connection from the pool; hand it back with release_connection"""
+    return get_pool(db_config).getconn()
+
+
+def release_connection(conn):
+    """Return a connection to the pool, discarding any open transaction"""
+    if _pool is None:
+        conn.close()
+        return
+    if not conn.closed:
+        conn.rollback()
+    _pool.putconn(conn, close=bool(conn.closed))
+
+
+def get_pipeline_connection(db_config=None):
+    """
+    Unpooled psycopg 3 connection for PipelineExecutor; close it when done.
+
+    psycopg 3 is optional and only needed for pipeline mode.
+    """
+    try:
+        import psycopg
+    except ImportError as e:
+        raise ImportError("Pipeline mode needs psycopg 3: pip install 'psycopg[binary]'") from e
+
+    config = dict(db_config or load_db_config())
+    config["dbname"] = config.pop("database")
+    return psycopg.connect(**config)
+
+
+def close_pool():
+    global _pool, _pool_config
+    if _pool is not None:
+        _pool.closeall()
+    _pool = None
+    _pool_config = None
+
+
+def _forget_pool():
+    """Drop the parent's pool in a forked child without closing its sockets"""
+    global _pool, _pool_config
+    _pool = None
+    _pool_config = None
+
+
+# A forked child inherits the pool's connections, which still belong
+# to the parent; it must open its own
+os.register_at_fork(after_in_child=_forget_pool)
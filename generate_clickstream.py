@@ -1,7 +1,43 @@
+import argparse
 import csv
+import hashlib
+import heapq
+import math
 import os
 import random
-from datetime import datetime, timedelta
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import islice
+
+DEVICE_TYPES = ['web', 'mobile']
+
+EVENT_FIELDNAMES = ['event_id', 'user_id', 'product_id', 'event_type',
+                    'event_time', 'event_timestamp', 'device_type']
+
+# Compact row kept by the streaming samplers
+SampledTransaction = namedtuple(
+    'SampledTransaction', ['user_id', 'product_id', 'transaction_time'])
+
+CLUSTER_COLUMNS = {'user': 'user_id', 'product': 'product_id'}
+
+# Rows formatted into CSV lines at once by the vectorized engine
+WRITE_BLOCK_ROWS = 500000
+
+# Events per sorted run in the external engine (bounds peak memory)
+DEFAULT_RUN_ROWS = 2000000
+
+# A transaction produces at most 1 + 5 + 1 + 1 + 1 events
+MAX_EVENTS_PER_TRANSACTION = 9
+
+# Runs merged at once; more runs are merged in several passes
+MERGE_FAN_IN = 64
+
+# Transactions per shard in the sharded engine. Shards (and so the
+# output for a given seed) do not depend on the number of workers.
+SHARD_TRANSACTIONS = 250000
 
 
 def load_purchase_history(transactions_path):
@@ -18,6 +54,104 @@ def load_purchase_history(transactions_path):
     return transactions
 
 
+def reservoir_sample(items, k, rng):
+    """
+    Uniform sample of k items from an iterable in one pass (Algorithm L).
+
+    Instead of drawing a random number per item, the number of items
+    to skip before the next replacement is drawn directly, so most
+    items are only iterated over.
+    """
+    reservoir = list(islice(items, k))
+    if len(reservoir) < k:
+        return reservoir
+
+    # 1 - random() is in (0, 1], so log() is always defined
+    w = math.exp(math.log(1 - rng.random()) / k)
+    while True:
+        skip = math.floor(math.log(1 - rng.random()) / math.log(1 - w))
+        item = next(islice(items, skip, skip + 1), None)
+        if item is None:
+            return reservoir
+        reservoir[rng.randrange(k)] = item
+        w *= math.exp(math.log(1 - rng.random()) / k)
+
+
+def cluster_priority(key, seed):
+    """Deterministic pseudo-random priority in [0, 1) for a user or product."""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8,
+                             key=str(seed).encode('utf-8')).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+def cluster_sample(rows, k, column, seed):
+    """
+    Cluster sample: whole users or products, in one pass.
+
+    Clusters are ranked by a seeded hash, and those with the lowest
+    priority are kept with all their rows, up to k rows in total. When
+    the budget is exceeded, the highest-priority cluster is dropped
+    and later rows of any cluster ranked above it are skipped, so
+    memory stays at k rows. Unlike a stratified sample, most users or
+    products contribute no rows at all.
+    """
+    kept = {}
+    heap = []
+    total = 0
+    threshold = float('inf')
+    for row in rows:
+        key = row[column]
+        if key not in kept:
+            priority = cluster_priority(key, seed)
+            if priority >= threshold:
+                continue
+            kept[key] = []
+            heapq.heappush(heap, (-priority, key))
+        kept[key].append(row)
+        total += 1
+
+        while total > k:
+            negative_priority, dropped = heapq.heappop(heap)
+            threshold = -negative_priority
+            total -= len(kept.pop(dropped))
+
+    return [row for cluster_rows in kept.values() for row in cluster_rows]
+
+
+def sample_purchase_history(transactions_path, sample_size, cluster_by=None, seed=None):
+    """
+    Stream a sample of the purchase history without loading all of it.
+
+    Returns up to sample_size SampledTransaction tuples. A plain sample
+    keeps raw lines in a reservoir and only parses the chosen ones;
+    cluster_by ('user' or 'product') keeps every transaction of a
+    random subset of users or products instead. Blank lines, such as
+    a trailing empty line, are skipped.
+    """
+    print(f"Sampling {sample_size} transactions from: {transactions_path}")
+
+    with open(transactions_path, 'r', encoding='utf-8', newline='') as f:
+        header = next(csv.reader([f.readline()]))
+        columns = [header.index(name) for name in SampledTransaction._fields]
+
+        if cluster_by:
+            # Lines are parsed here: the cluster key is needed for every row
+            cluster = columns[SampledTransaction._fields.index(CLUSTER_COLUMNS[cluster_by])]
+            rows = cluster_sample(filter(None, csv.reader(f)), sample_size, cluster, seed)
+        else:
+            # purchase_history.csv never quotes a field across lines
+            lines = filter(str.strip, f)
+            rows = csv.reader(reservoir_sample(lines, sample_size, random.Random(seed)))
+
+        transactions = [
+            SampledTransaction(row[columns[0]], row[columns[1]], int(row[columns[2]]))
+            for row in rows
+        ]
+
+    print(f"Sampled {len(transactions)} transactions")
+    return transactions
+
+
 def generate_clickstream_events(transactions, output_path, sample_size=None):
     """
     Generate synthetic clickstream events based on transactions.
@@ -37,8 +171,6 @@ def generate_clickstream_events(transactions, output_path, sample_size=None):
 
     events = []
     event_id = 1
-    device_types = ['web', 'mobile']
-    event_types = ['product_view', 'add_to_cart', 'wishlist', 'purchase_click']
 
     for txn in transactions:
         user_id = txn['user_id']
@@ -47,7 +179,7 @@ def generate_clickstream_events(transactions, output_path, sample_size=None):
 
         # Convert unix timestamp to datetime
         purchase_time = datetime.fromtimestamp(purchase_timestamp)
-        device = random.choice(device_types)
+        device = random.choice(DEVICE_TYPES)
 
         # Generate events leading up to purchase
         # 1. Initial product view (1-24 hours before purchase)
@@ -127,11 +259,8 @@ def generate_clickstream_events(transactions, output_path, sample_size=None):
     events.sort(key=lambda x: x['event_timestamp'])
 
     # Write to CSV
-    fieldnames = ['event_id', 'user_id', 'product_id', 'event_type',
-                  'event_time', 'event_timestamp', 'device_type']
-
     with open(output_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=EVENT_FIELDNAMES)
         writer.writeheader()
         writer.writerows(events)
 
@@ -147,6 +276,11 @@ def generate_clickstream_events(transactions, output_path, sample_size=None):
         event_counts[event_type] = event_counts.get(event_type, 0) + 1
         device_counts[device] = device_counts.get(device, 0) + 1
 
+    print_event_statistics(event_counts, device_counts, events[:5])
+
+
+def print_event_statistics(event_counts, device_counts, sample_events):
+    """Print per-type and per-device counts and a few sample events."""
     print("\nEvent Statistics:")
     print("-" * 60)
     for event_type, count in sorted(event_counts.items()):
@@ -160,13 +294,411 @@ def generate_clickstream_events(transactions, output_path, sample_size=None):
     # Print sample
     print("\nSample events:")
     print("-" * 100)
-    for i, evt in enumerate(events[:5], 1):
+    for i, evt in enumerate(sample_events, 1):
         print(f"{i}. {evt['event_id']} | User: {evt['user_id']} | "
               f"Product: {evt['product_id']} | Type: {evt['event_type']:15s} | "
               f"Device: {evt['device_type']:6s} | Time: {evt['event_time']}")
 
 
-def main():
+def transactions_to_arrays(transactions):
+    """Split transaction dicts (or SampledTransaction tuples) into arrays."""
+    import numpy as np
+
+    if transactions and isinstance(transactions[0], SampledTransaction):
+        user_ids, product_ids, purchase_timestamps = zip(*transactions)
+        return (np.array(user_ids, dtype=object), np.array(product_ids, dtype=object),
+                np.array(purchase_timestamps, dtype=np.int64))
+
+    user_ids = np.array([txn['user_id'] for txn in transactions], dtype=object)
+    product_ids = np.array([txn['product_id'] for txn in transactions], dtype=object)
+    purchase_timestamps = np.array(
+        [int(txn['transaction_time']) for txn in transactions], dtype=np.int64)
+    return user_ids, product_ids, purchase_timestamps
+
+
+def draw_event_counts(rng, n):
+    """
+    Draw the browsing view count and wishlist flag of n transactions.
+
+    These are always the first draws from a block's generator, so the
+    number of events a block yields can be known without building it.
+    """
+    num_views = rng.integers(2, 6, size=n)
+    has_wishlist = rng.random(n) < 0.3
+    return num_views, has_wishlist
+
+
+def build_event_columns(user_ids, product_ids, purchase_timestamps, rng,
+                        first_event_id=1):
+    """
+    Build the clickstream events for a block of transactions as columns.
+
+    Same events as generate_clickstream_events, drawn as whole arrays:
+    per transaction an initial view, 2-5 browsing views, add to cart,
+    an optional wishlist and the purchase click. Rows come back in
+    generation order (event IDs ascending), not sorted by time.
+    """
+    import numpy as np
+
+    n = len(purchase_timestamps)
+
+    num_views, has_wishlist = draw_event_counts(rng, n)
+    devices = np.array(DEVICE_TYPES, dtype=object)[rng.integers(0, 2, size=n)]
+
+    counts = 3 + num_views + has_wishlist
+    starts = np.zeros(n, dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    total = int(counts.sum())
+
+    txn_index = np.repeat(np.arange(n), counts)
+    timestamps = purchase_timestamps[txn_index].copy()
+    event_types = np.empty(total, dtype=object)
+    event_products = product_ids[txn_index].copy()
+
+    # 1. Initial product view (1-24 hours before purchase)
+    timestamps[starts] -= rng.integers(1, 25, size=n) * 3600
+    event_types[starts] = 'product_view'
+
+    # 2. Additional product views (browsing behavior - 2-5 views)
+    view_slots = np.repeat(starts + 1, num_views) + (
+        np.arange(num_views.sum()) - np.repeat(np.cumsum(num_views) - num_views, num_views))
+    timestamps[view_slots] -= rng.integers(10, 301, size=len(view_slots)) * 60
+    event_types[view_slots] = 'product_view'
+    # Sometimes view the same product, sometimes browse others
+    browsing = rng.random(len(view_slots)) <= 0.3
+    browse_ids = rng.integers(1000, 10000, size=int(browsing.sum()))
+    event_products[view_slots[browsing]] = np.char.add(
+        'BROWSE', browse_ids.astype(str)).astype(object)
+
+    # 3. Add to cart (5-60 minutes before purchase)
+    cart_slots = starts + 1 + num_views
+    cart_offsets = rng.integers(5, 61, size=n) * 60
+    timestamps[cart_slots] -= cart_offsets
+    event_types[cart_slots] = 'add_to_cart'
+
+    # 4. Optional wishlist (30% chance, before add to cart)
+    wishlist_slots = cart_slots[has_wishlist] + 1
+    timestamps[wishlist_slots] -= cart_offsets[has_wishlist] + rng.integers(
+        10, 121, size=len(wishlist_slots)) * 60
+    event_types[wishlist_slots] = 'wishlist'
+
+    # 5. Purchase click (at transaction time)
+    event_types[starts + counts - 1] = 'purchase_click'
+
+    return {
+        'event_id': np.arange(first_event_id, first_event_id + total, dtype=np.int64),
+        'user_id': user_ids[txn_index],
+        'product_id': event_products,
+        'event_type': event_types,
+        'event_timestamp': timestamps,
+        'device_type': devices[txn_index],
+    }
+
+
+def sort_event_columns(columns):
+    """Order event columns by timestamp, keeping generation order for ties."""
+    import numpy as np
+
+    order = np.argsort(columns['event_timestamp'], kind='stable')
+    return {name: column[order] for name, column in columns.items()}
+
+
+def local_time_parts(timestamps):
+    """
+    Split unix timestamps into local day and second-of-day indexes.
+
+    Returns (day_strings, day_index, seconds_of_day) so that
+    day_strings[day_index[i]] + time of seconds_of_day[i] equals
+    datetime.fromtimestamp(timestamps[i]).strftime('%Y-%m-%d %H:%M:%S').
+    """
+    import numpy as np
+
+    # Local UTC offset per hour, so each distinct hour is converted once
+    hours, hour_index = np.unique(timestamps // 3600, return_inverse=True)
+    offsets = np.array([
+        datetime.fromtimestamp(int(hour) * 3600, timezone.utc).astimezone().utcoffset()
+        for hour in hours
+    ], dtype='timedelta64[s]').astype(np.int64)
+    local = timestamps + offsets[hour_index.reshape(-1)]
+
+    days, day_index = np.unique(local // 86400, return_inverse=True)
+    day_strings = np.datetime_as_string(days.astype('datetime64[D]')).tolist()
+    return day_strings, day_index.reshape(-1), local % 86400
+
+
+@lru_cache(maxsize=None)
+def clock_strings():
+    """'HH:MM:SS' for every second of the day."""
+    return [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)]
+
+
+def csv_safe(values):
+    """Quote values containing CSV special characters (IDs normally have none)."""
+    special = [value for value in set(values) if any(c in value for c in ',"\r\n')]
+    if not special:
+        return values
+    quoted = {value: '"' + value.replace('"', '""') + '"' for value in special}
+    return [quoted.get(value, value) for value in values]
+
+
+def format_event_lines(columns):
+    """Format event columns as CSV lines in EVENT_FIELDNAMES order."""
+    import numpy as np
+
+    event_ids = np.char.add('EVT', np.char.zfill(columns['event_id'].astype(str), 10))
+    day_strings, day_index, seconds_of_day = local_time_parts(columns['event_timestamp'])
+    clock = clock_strings()
+    return [
+        f"{event_id},{user_id},{product_id},{event_type},"
+        f"{day_strings[day]} {clock[second]},{timestamp},{device}\n"
+        for event_id, user_id, product_id, event_type, day, second, timestamp, device in zip(
+            event_ids.tolist(),
+            csv_safe(columns['user_id'].tolist()),
+            csv_safe(columns['product_id'].tolist()),
+            columns['event_type'].tolist(),
+            day_index.tolist(),
+            seconds_of_day.tolist(),
+            columns['event_timestamp'].tolist(),
+            columns['device_type'].tolist(),
+        )
+    ]
+
+
+def write_event_columns(f, columns):
+    """Write event columns as CSV rows, formatting WRITE_BLOCK_ROWS at a time."""
+    total = len(columns['event_id'])
+    for start in range(0, total, WRITE_BLOCK_ROWS):
+        block = {name: column[start:start + WRITE_BLOCK_ROWS]
+                 for name, column in columns.items()}
+        f.writelines(format_event_lines(block))
+
+
+def generate_clickstream_events_vectorized(transactions, output_path, sample_size=None,
+                                           seed=None):
+    """
+    Vectorized generate_clickstream_events.
+
+    Builds the event table column by column with NumPy instead of one
+    dict per event, so the full purchase history can be used.
+    """
+    import numpy as np
+
+    print("\nGenerating clickstream events (vectorized)...")
+    rng = np.random.default_rng(seed)
+
+    user_ids, product_ids, purchase_timestamps = transactions_to_arrays(transactions)
+    if sample_size and sample_size < len(purchase_timestamps):
+        picked = rng.choice(len(purchase_timestamps), size=sample_size, replace=False)
+        user_ids, product_ids, purchase_timestamps = (
+            user_ids[picked], product_ids[picked], purchase_timestamps[picked])
+        print(f"Using sample of {sample_size} transactions")
+
+    columns = sort_event_columns(
+        build_event_columns(user_ids, product_ids, purchase_timestamps, rng))
+
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        f.write(','.join(EVENT_FIELDNAMES) + '\n')
+        write_event_columns(f, columns)
+
+    total = len(columns['event_id'])
+    print(f"Created clickstream_events.csv with {total} events")
+    print(f"Saved to: {output_path}")
+
+    head = {name: column[:5] for name, column in columns.items()}
+    sample_events = [
+        dict(zip(EVENT_FIELDNAMES, line.rstrip('\n').split(',')))
+        for line in format_event_lines(head)
+    ]
+    print_event_statistics(
+        Counter(columns['event_type'].tolist()),
+        Counter(columns['device_type'].tolist()),
+        sample_events
+    )
+
+
+def iter_transaction_blocks(transactions_path, block_rows):
+    """Stream the purchase history CSV as (user, product, timestamp) array blocks."""
+    with open(transactions_path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        while True:
+            block = list(islice(reader, block_rows))
+            if not block:
+                return
+            yield transactions_to_arrays(block)
+
+
+def event_line_timestamp(line):
+    # event_timestamp is the second to last field; device_type never needs quoting
+    return int(line.rsplit(',', 2)[1])
+
+
+def merge_runs(run_paths, out):
+    """K-way merge time-sorted run files into out; ties keep run order."""
+    files = [open(path, 'r', encoding='utf-8', newline='') for path in run_paths]
+    try:
+        out.writelines(heapq.merge(*files, key=event_line_timestamp))
+    finally:
+        for f in files:
+            f.close()
+
+
+def merge_run_files(run_paths, output_path, tmp):
+    """Merge sorted runs into output_path (with header), in passes of MERGE_FAN_IN."""
+    # Merge in passes of MERGE_FAN_IN runs to stay under open file limits
+    merge_pass = 0
+    while len(run_paths) > MERGE_FAN_IN:
+        merged_paths = []
+        for start in range(0, len(run_paths), MERGE_FAN_IN):
+            merged_path = os.path.join(tmp, f"merge-{merge_pass}-{len(merged_paths):06d}.csv")
+            with open(merged_path, 'w', newline='', encoding='utf-8') as out:
+                merge_runs(run_paths[start:start + MERGE_FAN_IN], out)
+            for path in run_paths[start:start + MERGE_FAN_IN]:
+                os.remove(path)
+            merged_paths.append(merged_path)
+        run_paths = merged_paths
+        merge_pass += 1
+
+    with open(output_path, 'w', newline='', encoding='utf-8') as out:
+        out.write(','.join(EVENT_FIELDNAMES) + '\n')
+        merge_runs(run_paths, out)
+
+
+def generate_clickstream_events_external(transactions_path, output_path,
+                                         run_rows=DEFAULT_RUN_ROWS, seed=None):
+    """
+    Bounded-memory generate_clickstream_events_vectorized.
+
+    Transactions are streamed in blocks that yield at most run_rows
+    events; each block is generated, sorted and written to a temporary
+    run file. The runs are then k-way merged into output_path, so the
+    output is still globally ordered by event_timestamp while memory
+    stays proportional to run_rows.
+    """
+    import numpy as np
+
+    print("\nGenerating clickstream events (external sort)...")
+    rng = np.random.default_rng(seed)
+    block_rows = max(1, run_rows // MAX_EVENTS_PER_TRANSACTION)
+
+    event_counts = Counter()
+    device_counts = Counter()
+    next_event_id = 1
+
+    # Runs live next to the output, which has room for the same data
+    run_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(prefix='clickstream-runs-', dir=run_dir) as tmp:
+        run_paths = []
+        for user_ids, product_ids, purchase_timestamps in iter_transaction_blocks(
+                transactions_path, block_rows):
+            columns = sort_event_columns(build_event_columns(
+                user_ids, product_ids, purchase_timestamps, rng, next_event_id))
+            next_event_id += len(columns['event_id'])
+            event_counts.update(columns['event_type'].tolist())
+            device_counts.update(columns['device_type'].tolist())
+
+            run_path = os.path.join(tmp, f"run-{len(run_paths):06d}.csv")
+            with open(run_path, 'w', newline='', encoding='utf-8') as f:
+                write_event_columns(f, columns)
+            run_paths.append(run_path)
+            print(f"  Wrote run {len(run_paths)} ({next_event_id - 1:,} events so far)")
+
+        merge_run_files(run_paths, output_path, tmp)
+
+    print(f"Created clickstream_events.csv with {next_event_id - 1} events")
+    print(f"Saved to: {output_path}")
+
+    with open(output_path, 'r', encoding='utf-8', newline='') as f:
+        sample_events = list(islice(csv.DictReader(f), 5))
+    print_event_statistics(event_counts, device_counts, sample_events)
+
+
+def shard_rng(master_seed, shard_index):
+    """Independent, reproducible generator for one shard."""
+    import numpy as np
+
+    return np.random.default_rng(np.random.SeedSequence([master_seed, shard_index]))
+
+
+def generate_shard(shard_index, master_seed, first_event_id, user_ids, product_ids,
+                   purchase_timestamps, run_path):
+    """Worker entry point: generate one shard and write it as a sorted run."""
+    columns = sort_event_columns(build_event_columns(
+        user_ids, product_ids, purchase_timestamps,
+        shard_rng(master_seed, shard_index), first_event_id))
+    with open(run_path, 'w', newline='', encoding='utf-8') as f:
+        write_event_columns(f, columns)
+    return (Counter(columns['event_type'].tolist()),
+            Counter(columns['device_type'].tolist()))
+
+
+def generate_clickstream_events_sharded(transactions_path, output_path, workers=None,
+                                        seed=None):
+    """
+    Multi-process generate_clickstream_events_external.
+
+    The purchase history is cut into shards of SHARD_TRANSACTIONS and
+    each shard is generated in a worker process with its own generator,
+    seeded from (seed, shard index). Before a shard is submitted, its
+    event count is drawn in the parent from the same generator, which
+    reserves the shard a gap-free range of event IDs. Shard runs are
+    merged by timestamp in shard order, so a given seed produces the
+    same bytes whatever the number of workers.
+    """
+    import numpy as np
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    workers = workers or os.cpu_count() or 1
+    print(f"\nGenerating clickstream events ({workers} workers, seed {seed})...")
+
+    event_counts = Counter()
+    device_counts = Counter()
+    next_event_id = 1
+
+    run_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(prefix='clickstream-shards-', dir=run_dir) as tmp, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        run_paths = []
+        futures = []
+        pending = set()
+        for shard_index, (user_ids, product_ids, purchase_timestamps) in enumerate(
+                iter_transaction_blocks(transactions_path, SHARD_TRANSACTIONS)):
+            num_views, has_wishlist = draw_event_counts(
+                shard_rng(seed, shard_index), len(purchase_timestamps))
+            shard_events = 3 * len(purchase_timestamps) + int(num_views.sum()) + int(
+                has_wishlist.sum())
+
+            run_path = os.path.join(tmp, f"shard-{shard_index:06d}.csv")
+            future = pool.submit(
+                generate_shard, shard_index, seed, next_event_id,
+                user_ids, product_ids, purchase_timestamps, run_path)
+            futures.append(future)
+            pending.add(future)
+            run_paths.append(run_path)
+            next_event_id += shard_events
+
+            # Keep a bounded number of shards (and their inputs) in flight
+            if len(pending) >= 2 * workers:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+        for future in futures:
+            shard_event_counts, shard_device_counts = future.result()
+            event_counts.update(shard_event_counts)
+            device_counts.update(shard_device_counts)
+        print(f"  Generated {len(futures)} shards")
+
+        merge_run_files(run_paths, output_path, tmp)
+
+    print(f"Created clickstream_events.csv with {next_event_id - 1} events")
+    print(f"Saved to: {output_path}")
+
+    with open(output_path, 'r', encoding='utf-8', newline='') as f:
+        sample_events = list(islice(csv.DictReader(f), 5))
+    print_event_statistics(event_counts, device_counts, sample_events)
+
+
+def main(engine='vectorized', sample_size=None, seed=None, run_rows=DEFAULT_RUN_ROWS,
+         workers=None, cluster_by=None, data_dir=None):
     """Main function to generate clickstream events."""
     print("=" * 80)
     print("Clickstream Events Generator")
@@ -174,27 +706,87 @@ def main():
 
     # Set paths
     script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = data_dir or os.path.join(script_dir, "data")
     transactions_path = os.path.join(
-        script_dir, "data", "raw", "transactions", "purchase_history.csv")
+        data_dir, "raw", "transactions", "purchase_history.csv")
     output_path = os.path.join(
-        script_dir, "data", "raw", "clickstream", "clickstream_events.csv")
+        data_dir, "raw", "clickstream", "clickstream_events.csv")
 
     # Check if transactions file exists
     if not os.path.exists(transactions_path):
         print(f"ERROR: Transactions file not found at {transactions_path}")
         return
 
-    # Load transactions
-    transactions = load_purchase_history(transactions_path)
-
     # Generate clickstream events
-    # Use a sample for faster generation (remove sample_size parameter to use all)
-    generate_clickstream_events(transactions, output_path, sample_size=100000)
+    if engine == 'external':
+        # Streams the purchase history itself; nothing is loaded up front
+        generate_clickstream_events_external(
+            transactions_path, output_path, run_rows=run_rows, seed=seed)
+    elif engine == 'sharded':
+        generate_clickstream_events_sharded(
+            transactions_path, output_path, workers=workers, seed=seed)
+    else:
+        if engine == 'python':
+            # The per-event engine is slow; sample unless told otherwise
+            sample_size = sample_size or 100000
+            if seed is not None:
+                random.seed(seed)
+
+        # Load transactions (only the sample when sampling)
+        if sample_size:
+            transactions = sample_purchase_history(
+                transactions_path, sample_size, cluster_by=cluster_by, seed=seed)
+        else:
+            transactions = load_purchase_history(transactions_path)
+
+        if engine == 'vectorized':
+            generate_clickstream_events_vectorized(transactions, output_path, seed=seed)
+        else:
+            generate_clickstream_events(
+                [txn._asdict() for txn in transactions], output_path)
 
     print("\n" + "=" * 80)
     print("Clickstream events generation complete!")
     print("=" * 80)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic clickstream events")
+    parser.add_argument(
+        "--engine", choices=["vectorized", "external", "sharded", "python"],
+        default="vectorized",
+        help="vectorized: NumPy column-wise generation (default), "
+             "external: vectorized in bounded memory via sorted runs and a k-way merge, "
+             "sharded: external across worker processes, reproducible for a given --seed, "
+             "python: one dict per event (samples 100000 transactions by default)"
+    )
+    parser.add_argument(
+        "--sample-size", type=int,
+        help="Generate events for a random sample of this many transactions "
+             "(vectorized and python engines; sampled while streaming the CSV)"
+    )
+    parser.add_argument(
+        "--cluster-by", choices=sorted(CLUSTER_COLUMNS),
+        help="Cluster sample: whole users or products (all of their transactions) "
+             "instead of individual transactions"
+    )
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible output")
+    parser.add_argument(
+        "--run-rows", type=int, default=DEFAULT_RUN_ROWS,
+        help="Events per sorted run in the external engine; caps peak memory"
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help="Worker processes for the sharded engine (default: CPU count)"
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="Data directory holding raw/ (default: data next to this script)"
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(args.engine, args.sample_size, args.seed, args.run_rows, args.workers,
+         args.cluster_by, args.data_dir)
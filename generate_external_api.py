@@ -1,119 +1,449 @@
+import argparse
 import csv
+import gzip
+import hashlib
 import json
 import os
+import time
+from array import array
 from datetime import datetime
-from collections import defaultdict
-import math
 
+import numpy as np
 
-def load_metadata(metadata_path):
-    """Load product metadata from CSV."""
-    print(f"Loading metadata from: {metadata_path}")
+from popularity_stats import PopularitySummary, top_k_indices
 
-    # Structure: reviewer_id, product_id (asin), rating, timestamp
-    product_data = defaultdict(lambda: {'ratings': [], 'review_count': 0})
 
-    with open(metadata_path, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        for row in reader:
+# Ratings buffered before they are folded into the per-product arrays
+AGGREGATE_CHUNK_ROWS = 1000000
+
+# Output formats and the file name each one is written to
+EXPORT_FILENAMES = {
+    'json': 'product_popularity.json',
+    'ndjson': 'product_popularity.ndjson',
+    'ndjson.gz': 'product_popularity.ndjson.gz',
+    'ndjson.zst': 'product_popularity.ndjson.zst',
+    'parquet': 'product_popularity.parquet',
+}
+
+# Products per write; compressed NDJSON gets one gzip member / zstd
+# frame per chunk, so files can be split or appended to at chunk bounds
+EXPORT_CHUNK_ROWS = 50000
+EXPORT_BUFFER_BYTES = 1024 * 1024
+
+
+class ProductRatingAggregates:
+    """
+    Per-product rating count and sum in dense NumPy arrays.
+
+    Each ASIN is interned to an integer code on first sight; counts[code]
+    and sums[code] hold its running aggregates. Ratings are buffered as
+    (code, rating) pairs in compact arrays and folded in with bincount.
+    """
+
+    def __init__(self):
+        self.product_ids = []
+        self.codes = {}
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0, dtype=np.float64)
+        # Scores last computed from these aggregates (see calculate_popularity_score)
+        self.popularity_score = None
+        # Unix time each product's score or ratings last changed
+        self.last_updated = None
+        # Delta files folded into these aggregates: sha256 -> file name
+        self.applied_deltas = {}
+        self._pending_codes = array('q')
+        self._pending_ratings = array('d')
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def add_rows(self, rows):
+        """Aggregate (reviewer_id, asin, rating, ...) CSV rows, skipping bad ratings."""
+        codes = self.codes
+        product_ids = self.product_ids
+        pending_codes = self._pending_codes
+        pending_ratings = self._pending_ratings
+        for row in rows:
             if len(row) >= 3:
-                product_id = row[1]  # ASIN
                 try:
                     rating = float(row[2])
-                    product_data[product_id]['ratings'].append(rating)
-                    product_data[product_id]['review_count'] += 1
                 except ValueError:
                     continue
+                product_id = row[1]  # ASIN
+                code = codes.get(product_id)
+                if code is None:
+                    code = codes[product_id] = len(product_ids)
+                    product_ids.append(product_id)
+                pending_codes.append(code)
+                pending_ratings.append(rating)
+                if len(pending_codes) >= AGGREGATE_CHUNK_ROWS:
+                    self.flush()
+                    pending_codes = self._pending_codes
+                    pending_ratings = self._pending_ratings
+        self.flush()
+
+    def flush(self):
+        """Fold buffered ratings into counts and sums."""
+        size = len(self.product_ids)
+        if len(self.counts) < size:
+            self.counts = np.concatenate(
+                [self.counts, np.zeros(size - len(self.counts), dtype=np.int64)])
+            self.sums = np.concatenate(
+                [self.sums, np.zeros(size - len(self.sums), dtype=np.float64)])
+        if self._pending_codes:
+            codes = np.frombuffer(self._pending_codes, dtype=np.int64)
+            ratings = np.frombuffer(self._pending_ratings, dtype=np.float64)
+            self.counts += np.bincount(codes, minlength=size)
+            self.sums += np.bincount(codes, weights=ratings, minlength=size)
+            self._pending_codes = array('q')
+            self._pending_ratings = array('d')
 
-    print(f"Loaded data for {len(product_data)} products")
-    return product_data
 
+def load_metadata(metadata_path):
+    """Load product metadata from CSV into ProductRatingAggregates."""
+    print(f"Loading metadata from: {metadata_path}")
 
-def calculate_popularity_score(product_data):
-    """
-    Calculate popularity score using multiple signals:
-    - Average rating (weighted)
-    - Review count (log-scaled)
-    - Normalized composite score
-    """
-    print("\nCalculating popularity scores...")
+    # Structure: reviewer_id, product_id (asin), rating, timestamp
+    product_data = ProductRatingAggregates()
 
-    popularity_data = []
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        product_data.add_rows(csv.reader(f))
 
-    # Find max review count for normalization
-    max_reviews = max([data['review_count'] for data in product_data.values()])
+    print(f"Loaded data for {len(product_data)} products")
+    return product_data
 
-    for product_id, data in product_data.items():
-        ratings = data['ratings']
-        review_count = data['review_count']
 
-        # Calculate average rating
-        avg_rating = sum(ratings) / len(ratings) if ratings else 0
+def average_ratings(product_data):
+    counts = product_data.counts
+    return np.divide(product_data.sums, counts, out=np.zeros(len(counts)), where=counts > 0)
+
+
+def popularity_scores(counts, avg_rating, max_reviews):
+    """Composite 0-100 popularity score for the given products."""
+    # Calculate review count score (log-scaled)
+    review_score = np.log10(counts + 1) / np.log10(max_reviews + 1)
+
+    # Composite popularity score
+    # Formula: (avg_rating / 5.0) * 0.4 + review_score * 0.6
+    # Gives more weight to review count as it indicates engagement
+    popularity_score = (avg_rating / 5.0) * 0.4 + review_score * 0.6
+
+    # Scale to 0-100
+    return np.round(popularity_score * 100, 2)
+
+
+def iter_popularity_records(product_data, popularity_score, avg_rating, order):
+    """Yield product records for the product codes in order."""
+    product_ids = product_data.product_ids
+    # Most products share a handful of update times; format each once
+    formatted = {}
+    for code, score, rating, count, updated in zip(
+            order.tolist(),
+            popularity_score[order].tolist(),
+            np.round(avg_rating[order], 2).tolist(),
+            product_data.counts[order].tolist(),
+            product_data.last_updated[order].tolist()):
+        last_updated = formatted.get(updated)
+        if last_updated is None:
+            last_updated = formatted[updated] = datetime.fromtimestamp(updated).strftime(
+                '%Y-%m-%d %H:%M:%S')
+        yield {
+            'product_id': product_ids[code],
+            'popularity_score': score,
+            'avg_rating': rating,
+            'review_count': count,
+            'last_updated': last_updated
+        }
+
+
+def popularity_records(product_data, popularity_score, avg_rating, top_n=None):
+    """
+    Product records sorted by popularity score (descending); ties keep load order.
 
-        # Calculate review count score (log-scaled)
-        review_score = math.log10(review_count + 1) / \
-            math.log10(max_reviews + 1)
+    With top_n only the best top_n products are selected (np.partition),
+    without sorting the rest.
+    """
+    if top_n:
+        order = top_k_indices(popularity_score, top_n)
+    else:
+        order = np.argsort(-popularity_score, kind='stable')
+    return list(iter_popularity_records(product_data, popularity_score, avg_rating, order))
 
-        # Composite popularity score
-        # Formula: (avg_rating / 5.0) * 0.4 + review_score * 0.6
-        # Gives more weight to review count as it indicates engagement
-        popularity_score = (avg_rating / 5.0) * 0.4 + review_score * 0.6
 
-        # Scale to 0-100
-        popularity_score = round(popularity_score * 100, 2)
+def summarize_popularity(product_data, popularity_score, avg_rating):
+    """PopularitySummary over every product's score, in load order."""
+    def records_for(order):
+        return list(iter_popularity_records(product_data, popularity_score, avg_rating, order))
 
-        popularity_data.append({
-            'product_id': product_id,
-            'popularity_score': popularity_score,
-            'avg_rating': round(avg_rating, 2),
-            'review_count': review_count,
-            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        })
+    return PopularitySummary().add_scores(popularity_score, records_for)
 
-    # Sort by popularity score (descending)
-    popularity_data.sort(key=lambda x: x['popularity_score'], reverse=True)
 
-    return popularity_data
+def calculate_popularity_score(product_data, top_n=None):
+    """
+    Calculate popularity score using multiple signals:
+    - Average rating (weighted)
+    - Review count (log-scaled)
+    - Normalized composite score
 
+    Scores are computed for all products at once from the aggregate
+    arrays; the result is sorted by popularity score (descending) and
+    limited to the best top_n products if given.
+    """
+    print("\nCalculating popularity scores...")
 
-def generate_external_api_data(metadata_path, output_path):
+    avg_rating = average_ratings(product_data)
+    product_data.popularity_score = popularity_scores(
+        product_data.counts, avg_rating, product_data.counts.max())
+    product_data.last_updated = np.full(len(product_data), int(time.time()), dtype=np.int64)
+    return popularity_records(product_data, product_data.popularity_score, avg_rating, top_n)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_popularity_store(store_path, product_data):
+    """Persist aggregates, scores and max_reviews for incremental updates."""
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    temp_path = store_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez(
+            f,
+            product_ids=np.array(product_data.product_ids, dtype=str),
+            counts=product_data.counts,
+            sums=product_data.sums,
+            popularity_score=product_data.popularity_score,
+            last_updated=product_data.last_updated,
+            max_reviews=np.int64(product_data.counts.max()),
+            applied_delta_hashes=np.array(list(product_data.applied_deltas), dtype=str),
+            applied_delta_ids=np.array(list(product_data.applied_deltas.values()), dtype=str),
+        )
+    # Replace in one step so a crash never leaves a half-written store
+    os.replace(temp_path, store_path)
+    print(f"Saved rating aggregates to: {store_path}")
+
+
+def load_popularity_store(store_path):
+    """Return (ProductRatingAggregates with its scores, max_reviews) from a store."""
+    with np.load(store_path) as store:
+        product_data = ProductRatingAggregates()
+        product_data.product_ids = store['product_ids'].tolist()
+        product_data.codes = {
+            product_id: code for code, product_id in enumerate(product_data.product_ids)}
+        product_data.counts = store['counts']
+        product_data.sums = store['sums']
+        product_data.popularity_score = store['popularity_score']
+        if 'last_updated' in store.files:
+            product_data.last_updated = store['last_updated']
+        else:
+            # Older stores: the scores date from when the store was saved
+            product_data.last_updated = np.full(
+                len(product_data), int(os.path.getmtime(store_path)), dtype=np.int64)
+        # Stores written before deltas were tracked have no delta arrays
+        if 'applied_delta_hashes' in store.files:
+            product_data.applied_deltas = dict(zip(
+                store['applied_delta_hashes'].tolist(), store['applied_delta_ids'].tolist()))
+        return product_data, int(store['max_reviews'])
+
+
+def generate_external_api_data(metadata_path, output_path, store_path=None, top_n=None,
+                               output_format='json'):
     """Generate external API data with product popularity scores."""
 
     # Load metadata
     product_data = load_metadata(metadata_path)
 
     # Calculate popularity scores
-    popularity_data = calculate_popularity_score(product_data)
-
-    # Write to JSON file
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'metadata': {
-                'total_products': len(popularity_data),
-                'generated_at': datetime.now().isoformat(),
-                'source': 'Amazon Electronics Reviews',
-                'popularity_algorithm': 'Composite: (avg_rating/5 * 0.4) + (log_review_count * 0.6) * 100'
-            },
-            'products': popularity_data
-        }, f, indent=2)
+    popularity_data = calculate_popularity_score(product_data, top_n)
+
+    summary = summarize_popularity(
+        product_data, product_data.popularity_score, average_ratings(product_data))
+    write_popularity_output(popularity_data, output_path, summary, len(product_data), output_format)
+
+    if store_path:
+        save_popularity_store(store_path, product_data)
+
+
+def update_external_api_data(delta_path, output_path, store_path, top_n=None, output_format='json'):
+    """
+    Apply a delta file of new ratings to the stored aggregates.
+
+    Only products that received ratings are rescored, unless the delta
+    moves max_reviews: that changes every product's log-scaled review
+    score, so all products are rescored. Only products whose ratings or
+    score changed get a new last_updated. The store records the sha256
+    of every delta applied, so applying the same file twice is a no-op.
+    """
+    product_data, max_reviews = load_popularity_store(store_path)
+    delta_hash = file_sha256(delta_path)
+    if delta_hash in product_data.applied_deltas:
+        print(f"Delta {delta_path} was already applied "
+              f"(as {product_data.applied_deltas[delta_hash]}); nothing to update")
+        return
+    known_products = len(product_data)
+    counts_before = product_data.counts.copy()
+
+    print(f"Applying rating delta from: {delta_path}")
+    with open(delta_path, 'r', encoding='utf-8') as f:
+        product_data.add_rows(csv.reader(f))
+
+    counts = product_data.counts
+    changed = np.concatenate([
+        np.flatnonzero(counts[:known_products] != counts_before),
+        np.arange(known_products, len(counts))
+    ])
+    # New products start from a score of 0; they are all in changed
+    previous_score = np.concatenate(
+        [product_data.popularity_score, np.zeros(len(counts) - known_products)])
+    popularity_score = previous_score.copy()
+    avg_rating = average_ratings(product_data)
+
+    new_max_reviews = int(counts.max())
+    if new_max_reviews != max_reviews:
+        print(f"max_reviews moved from {max_reviews} to {new_max_reviews}; "
+              f"rescoring all {len(counts)} products")
+        popularity_score = popularity_scores(counts, avg_rating, new_max_reviews)
+    else:
+        print(f"Rescoring {len(changed)} changed products")
+        popularity_score[changed] = popularity_scores(
+            counts[changed], avg_rating[changed], max_reviews)
+
+    now = int(time.time())
+    last_updated = np.concatenate([
+        product_data.last_updated, np.full(len(counts) - known_products, now, dtype=np.int64)])
+    last_updated[changed] = now
+    last_updated[popularity_score != previous_score] = now
+
+    product_data.popularity_score = popularity_score
+    product_data.last_updated = last_updated
+    product_data.applied_deltas[delta_hash] = os.path.basename(delta_path)
+    popularity_data = popularity_records(product_data, popularity_score, avg_rating, top_n)
+    summary = summarize_popularity(product_data, popularity_score, avg_rating)
+    write_popularity_output(popularity_data, output_path, summary, len(product_data), output_format)
+    save_popularity_store(store_path, product_data)
+
+
+class NdjsonPopularityWriter:
+    """
+    Writes the metadata as a {"metadata": {...}} header line, then one
+    product per line. With compression ('gzip' or 'zstd') every chunk
+    is compressed on its own and the members are concatenated, which
+    standard gzip / zstd readers decode as one stream.
+    """
+
+    def __init__(self, output_path, metadata, compression=None):
+        self._encoder = json.JSONEncoder(separators=(',', ':'))
+        if compression == 'gzip':
+            self._compress = lambda data: gzip.compress(data, mtime=0)
+        elif compression == 'zstd':
+            # zstandard is only needed for .ndjson.zst output
+            import zstandard
+            self._compress = zstandard.ZstdCompressor().compress
+        else:
+            self._compress = None
+        self._file = open(output_path, 'wb', buffering=EXPORT_BUFFER_BYTES)
+        self._write_lines([{'metadata': metadata}])
+
+    def _write_lines(self, records):
+        encode = self._encoder.encode
+        data = ''.join([encode(record) + '\n' for record in records]).encode('utf-8')
+        self._file.write(self._compress(data) if self._compress else data)
+
+    def write(self, records):
+        if records:
+            self._write_lines(records)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetPopularityWriter:
+    """Writes typed product columns, one row group per chunk; metadata goes in the file footer."""
+
+    def __init__(self, output_path, metadata):
+        # pyarrow is only needed for Parquet output
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ('product_id', pa.string()),
+            ('popularity_score', pa.float64()),
+            ('avg_rating', pa.float64()),
+            ('review_count', pa.int64()),
+            ('last_updated', pa.string()),
+        ], metadata={'popularity_metadata': json.dumps(metadata)})
+        self._writer = pq.ParquetWriter(output_path, self._schema, compression='zstd')
+
+    def write(self, records):
+        if not records:
+            return
+        columns = [self._pa.array([record[field.name] for record in records], type=field.type)
+                   for field in self._schema]
+        self._writer.write_table(self._pa.Table.from_arrays(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_popularity_writer(output_path, metadata, output_format):
+    if output_format == 'parquet':
+        return ParquetPopularityWriter(output_path, metadata)
+    if output_format == 'ndjson.gz':
+        return NdjsonPopularityWriter(output_path, metadata, 'gzip')
+    if output_format == 'ndjson.zst':
+        return NdjsonPopularityWriter(output_path, metadata, 'zstd')
+    return NdjsonPopularityWriter(output_path, metadata)
+
+
+def write_popularity_output(popularity_data, output_path, summary, total_products,
+                            output_format='json'):
+    """Write the popularity feed in output_format and print summary statistics."""
+    metadata = {
+        'total_products': total_products,
+        'exported_products': len(popularity_data),
+        'generated_at': datetime.now().isoformat(),
+        'source': 'Amazon Electronics Reviews',
+        'popularity_algorithm': 'Composite: (avg_rating/5 * 0.4) + (log_review_count * 0.6) * 100'
+    }
+    if output_format == 'json':
+        # Write to JSON file
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'metadata': metadata,
+                'products': popularity_data
+            }, f, indent=2)
+    else:
+        writer = open_popularity_writer(output_path, metadata, output_format)
+        try:
+            for start in range(0, len(popularity_data), EXPORT_CHUNK_ROWS):
+                writer.write(popularity_data[start:start + EXPORT_CHUNK_ROWS])
+        finally:
+            writer.close()
 
     print(
-        f"\nCreated product_popularity.json with {len(popularity_data)} products")
+        f"\nCreated {os.path.basename(output_path)} with {len(popularity_data)} products")
     print(f"Saved to: {output_path}")
 
     # Print statistics
-    scores = [p['popularity_score'] for p in popularity_data]
-    print("\nPopularity Score Statistics:")
+    histogram = summary.histogram
+    print(f"\nPopularity Score Statistics ({histogram.count:,} products):")
     print("-" * 60)
-    print(f"  Min Score:     {min(scores):.2f}")
-    print(f"  Max Score:     {max(scores):.2f}")
-    print(f"  Avg Score:     {sum(scores)/len(scores):.2f}")
-    print(f"  Median Score:  {sorted(scores)[len(scores)//2]:.2f}")
+    print(f"  Min Score:     {histogram.min:.2f}")
+    print(f"  Max Score:     {histogram.max:.2f}")
+    print(f"  Avg Score:     {histogram.mean:.2f}")
+    for q, score in histogram.quantiles().items():
+        label = 'Median' if q == 0.5 else f'P{q * 100:g}'
+        print(f"  {label + ' Score:':<15}{score:.2f}")
 
     # Print top products
     print("\nTop 10 Most Popular Products:")
     print("-" * 100)
-    for i, product in enumerate(popularity_data[:10], 1):
+    for i, product in enumerate(summary.top_products(), 1):
         print(f"{i:2d}. Product: {product['product_id']} | "
               f"Popularity: {product['popularity_score']:6.2f} | "
               f"Avg Rating: {product['avg_rating']:.2f} | "
@@ -122,14 +452,14 @@ def generate_external_api_data(metadata_path, output_path):
     # Print sample of least popular
     print("\nSample of Lower Popularity Products:")
     print("-" * 100)
-    for i, product in enumerate(popularity_data[-5:], 1):
+    for i, product in enumerate(summary.bottom_products(), 1):
         print(f"{i}. Product: {product['product_id']} | "
               f"Popularity: {product['popularity_score']:6.2f} | "
               f"Avg Rating: {product['avg_rating']:.2f} | "
               f"Reviews: {product['review_count']:,}")
 
 
-def main():
+def main(delta_path=None, store_path=None, top_n=None, output_format='json', data_dir=None):
     """Main function to generate external API data."""
     print("=" * 80)
     print("External API Data Generator - Product Popularity")
@@ -137,10 +467,24 @@ def main():
 
     # Set paths
     script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = data_dir or os.path.join(script_dir, "data")
     metadata_path = os.path.join(
-        script_dir, "data", "raw", "products", "metadata", "ratings_Electronics (1).csv")
+        data_dir, "raw", "products", "metadata", "ratings_Electronics (1).csv")
     output_path = os.path.join(
-        script_dir, "data", "raw", "external_api", "product_popularity.json")
+        data_dir, "raw", "external_api", EXPORT_FILENAMES[output_format])
+    # Sidecar store with per-product aggregates for incremental updates
+    store_path = store_path or os.path.join(
+        data_dir, "raw", "external_api", "product_popularity_aggregates.npz")
+
+    if delta_path:
+        if not os.path.exists(store_path):
+            print(f"ERROR: No aggregate store at {store_path}; run a full generation first")
+            return
+        update_external_api_data(delta_path, output_path, store_path, top_n, output_format)
+        print("\n" + "=" * 80)
+        print("External API data update complete!")
+        print("=" * 80)
+        return
 
     # Check if metadata file exists
     if not os.path.exists(metadata_path):
@@ -148,12 +492,39 @@ def main():
         return
 
     # Generate external API data
-    generate_external_api_data(metadata_path, output_path)
+    generate_external_api_data(metadata_path, output_path, store_path, top_n, output_format)
 
     print("\n" + "=" * 80)
     print("External API data generation complete!")
     print("=" * 80)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate product popularity data")
+    parser.add_argument(
+        "--delta",
+        help="CSV of new ratings to apply to the stored aggregates instead of a full rescan"
+    )
+    parser.add_argument(
+        "--store",
+        help="Aggregate store path (default: product_popularity_aggregates.npz next to the output)"
+    )
+    parser.add_argument(
+        "--top-n", type=int,
+        help="Export only the N most popular products (statistics still cover all of them)"
+    )
+    parser.add_argument(
+        "--format", choices=list(EXPORT_FILENAMES), default="json",
+        help="json (default), line-delimited ndjson, gzip / zstd compressed ndjson, "
+             "or parquet (needs pyarrow; zstd needs zstandard)"
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="Data directory holding raw/ (default: data next to this script)"
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(args.delta, args.store, args.top_n, args.format, args.data_dir)
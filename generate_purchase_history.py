@@ -1,9 +1,16 @@
+import argparse
 import json
 import csv
 import os
-from datetime import datetime
+from itertools import islice
 import random
 
+TRANSACTION_FIELDNAMES = ['transaction_id', 'user_id', 'product_id', 'transaction_date',
+                          'transaction_time', 'quantity', 'price', 'rating']
+
+# Transactions written per csv writerows call / Parquet row group
+WRITE_CHUNK_ROWS = 50000
+
 
 def load_reviews(reviews_path):
     """Load reviews from JSON file."""
@@ -42,11 +49,8 @@ def generate_purchase_history(reviews, output_path):
         transactions.append(transaction)
 
     # Write to CSV
-    fieldnames = ['transaction_id', 'user_id', 'product_id', 'transaction_date',
-                  'transaction_time', 'quantity', 'price', 'rating']
-
     with open(output_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=TRANSACTION_FIELDNAMES)
         writer.writeheader()
         writer.writerows(transactions)
 
@@ -63,7 +67,134 @@ def generate_purchase_history(reviews, output_path):
               f"Qty: {txn['quantity']} | Price: ${txn['price']}")
 
 
-def main():
+def iter_review_fields(reviews_path):
+    """
+    Stream the reviews file, keeping only the fields a transaction needs.
+
+    Yields (reviewerID, asin, reviewTime, unixReviewTime, overall)
+    tuples; reviewText and the rest of each review are dropped as soon
+    as the line is parsed.
+    """
+    with open(reviews_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                review = json.loads(line.strip())
+            except json.JSONDecodeError:
+                continue
+            yield (
+                review.get('reviewerID', 'UNKNOWN'),
+                review.get('asin', 'UNKNOWN'),
+                review.get('reviewTime', 'Unknown'),
+                review.get('unixReviewTime', 0),
+                review.get('overall', 0.0),
+            )
+
+
+def iter_transactions(review_fields):
+    """Turn projected reviews into transaction rows (TRANSACTION_FIELDNAMES order)."""
+    for idx, (user_id, product_id, review_time, unix_time, rating) in enumerate(
+            review_fields, start=1):
+        yield (
+            f"TXN{idx:08d}",
+            user_id,
+            product_id,
+            review_time,
+            unix_time,
+            random.randint(1, 3),  # Simulate quantity (1-3 items)
+            round(random.uniform(10.0, 500.0), 2),  # Simulate price
+            rating,
+        )
+
+
+class CsvTransactionWriter:
+    """Writes transaction row chunks to a CSV file."""
+
+    def __init__(self, output_path):
+        self._file = open(output_path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(TRANSACTION_FIELDNAMES)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetTransactionWriter:
+    """Writes transaction row chunks to a Parquet file, one row group per chunk."""
+
+    def __init__(self, output_path):
+        # pyarrow is only needed for Parquet output
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ('transaction_id', pa.string()),
+            ('user_id', pa.string()),
+            ('product_id', pa.string()),
+            ('transaction_date', pa.string()),
+            ('transaction_time', pa.int64()),
+            ('quantity', pa.int32()),
+            ('price', pa.float64()),
+            ('rating', pa.float64()),
+        ])
+        self._writer = pq.ParquetWriter(output_path, self._schema, compression='zstd')
+
+    def write(self, rows):
+        columns = [self._pa.array(column, type=field.type)
+                   for column, field in zip(zip(*rows), self._schema)]
+        self._writer.write_table(self._pa.Table.from_arrays(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def generate_purchase_history_streaming(reviews_path, output_path, output_format='csv',
+                                        chunk_rows=WRITE_CHUNK_ROWS):
+    """
+    Generate purchase history straight from the reviews file.
+
+    Reads the reviews once and writes transactions in chunks of
+    chunk_rows, so memory stays at one chunk regardless of file size.
+    """
+    print(f"\nGenerating purchase history from: {reviews_path}")
+
+    if output_format == 'parquet':
+        writer = ParquetTransactionWriter(output_path)
+    else:
+        writer = CsvTransactionWriter(output_path)
+
+    transactions = iter_transactions(iter_review_fields(reviews_path))
+    sample = []
+    total = 0
+    try:
+        while True:
+            chunk = list(islice(transactions, chunk_rows))
+            if not chunk:
+                break
+            writer.write(chunk)
+            if len(sample) < 3:
+                sample.extend(chunk[:3 - len(sample)])
+            total += len(chunk)
+    finally:
+        writer.close()
+
+    print(f"Created {os.path.basename(output_path)} with {total} transactions")
+    print(f"Saved to: {output_path}")
+
+    # Print sample
+    print("\nSample transactions:")
+    print("-" * 100)
+    for i, txn in enumerate(sample, 1):
+        txn = dict(zip(TRANSACTION_FIELDNAMES, txn))
+        print(f"{i}. TXN: {txn['transaction_id']} | User: {txn['user_id']} | "
+              f"Product: {txn['product_id']} | Date: {txn['transaction_date']} | "
+              f"Qty: {txn['quantity']} | Price: ${txn['price']}")
+
+
+def main(output_format='csv', in_memory=False, data_dir=None):
     """Main function to generate purchase history."""
     print("=" * 80)
     print("Purchase History Generator")
@@ -71,26 +202,50 @@ def main():
 
     # Set paths
     script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = data_dir or os.path.join(script_dir, "data")
     reviews_path = os.path.join(
-        script_dir, "data", "raw", "reviews", "electronics_reviews.json")
+        data_dir, "raw", "reviews", "electronics_reviews.json")
     output_path = os.path.join(
-        script_dir, "data", "raw", "transactions", "purchase_history.csv")
+        data_dir, "raw", "transactions", "purchase_history.csv")
 
     # Check if reviews file exists
     if not os.path.exists(reviews_path):
         print(f"ERROR: Reviews file not found at {reviews_path}")
         return
 
-    # Load reviews
-    reviews = load_reviews(reviews_path)
+    if in_memory:
+        # Load reviews
+        reviews = load_reviews(reviews_path)
 
-    # Generate purchase history
-    generate_purchase_history(reviews, output_path)
+        # Generate purchase history
+        generate_purchase_history(reviews, output_path)
+    else:
+        if output_format == 'parquet':
+            output_path = os.path.splitext(output_path)[0] + '.parquet'
+        generate_purchase_history_streaming(reviews_path, output_path, output_format)
 
     print("\n" + "=" * 80)
     print("Purchase history generation complete!")
     print("=" * 80)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate purchase history from reviews")
+    parser.add_argument(
+        "--format", choices=["csv", "parquet"], default="csv",
+        help="Output format; parquet writes purchase_history.parquet (needs pyarrow)"
+    )
+    parser.add_argument(
+        "--in-memory", action="store_true",
+        help="Load every review before writing (the original path; CSV only)"
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="Data directory holding raw/ (default: data next to this script)"
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(args.format, args.in_memory, args.data_dir)
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Rows at scale factor 1; --scale multiplies every count
+BASE_REVIEWS = 100000
+BASE_REVIEW_USERS = 12000
+BASE_REVIEW_PRODUCTS = 4000
+BASE_RATINGS = 500000
+BASE_RATING_USERS = 270000
+BASE_RATING_PRODUCTS = 30000
+
+# Zipf-like exponents for how activity is spread over users / products;
+# a few heavy reviewers and best sellers, a long tail of one-off ones
+USER_SKEW = 0.9
+PRODUCT_SKEW = 1.1
+
+# Star rating distribution of Amazon Electronics reviews
+RATING_VALUES = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+RATING_WEIGHTS = np.array([0.10, 0.05, 0.08, 0.20, 0.57])
+
+# Review dates span the original dataset
+START_TIME = int(datetime(2000, 1, 1, tzinfo=timezone.utc).timestamp())
+END_TIME = int(datetime(2014, 7, 23, tzinfo=timezone.utc).timestamp())
+
+WRITE_CHUNK_ROWS = 100000
+
+# Kept apart from data/raw, which holds the real (DVC-tracked) dataset
+DEFAULT_DATA_DIR = os.path.join("data", "synthetic")
+
+REVIEW_WORDS = (
+    'battery life sound quality screen cable works great price charger fast easy setup '
+    'case fits perfectly broke after month return remote signal picture sharp bright '
+    'headphones bass comfortable volume speaker wireless connection drops keyboard mouse '
+    'button laptop camera lens memory card storage adapter plug power warranty support '
+    'recommend excellent cheap sturdy flimsy disappointed love exactly described'
+).split()
+
+
+class SkewedSampler:
+    """
+    Draws ids in [0, n) with Zipf-like popularity.
+
+    Popular ranks are mapped to random ids, so the best sellers are not
+    simply the lowest numbers.
+    """
+
+    def __init__(self, n, exponent, rng):
+        weights = 1.0 / np.arange(1, n + 1) ** exponent
+        self.cdf = np.cumsum(weights / weights.sum())
+        self.order = rng.permutation(n)
+        self.rng = rng
+
+    def sample(self, size):
+        ranks = np.searchsorted(self.cdf, self.rng.random(size), side='right')
+        return self.order[np.minimum(ranks, len(self.order) - 1)]
+
+
+def draw_ratings(rng, size):
+    return rng.choice(RATING_VALUES, size=size, p=RATING_WEIGHTS)
+
+
+def make_sentences(rng, count=500):
+    """A pool of short pseudo-review sentences to build review texts from."""
+    sentences = []
+    for _ in range(count):
+        words = rng.choice(REVIEW_WORDS, size=rng.integers(4, 14))
+        sentences.append(' '.join(words).capitalize() + '.')
+    return sentences
+
+
+def generate_reviews(output_path, scale, rng):
+    """
+    Write electronics_reviews.json: one JSON review per line, with the
+    fields of the Amazon Electronics 5-core file.
+    """
+    n_reviews = int(BASE_REVIEWS * scale)
+    n_users = max(1, int(BASE_REVIEW_USERS * scale))
+    n_products = max(1, int(BASE_REVIEW_PRODUCTS * scale))
+    print(f"\nGenerating {n_reviews:,} reviews "
+          f"({n_users:,} users, {n_products:,} products)...")
+
+    sentences = make_sentences(rng)
+    users_sampler = SkewedSampler(n_users, USER_SKEW, rng)
+    products_sampler = SkewedSampler(n_products, PRODUCT_SKEW, rng)
+
+    written = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        while written < n_reviews:
+            size = min(WRITE_CHUNK_ROWS, n_reviews - written)
+            users = users_sampler.sample(size)
+            products = products_sampler.sample(size)
+            ratings = draw_ratings(rng, size)
+            times = rng.integers(START_TIME, END_TIME, size=size)
+            helpful_total = rng.geometric(0.3, size=size) - 1
+            helpful_yes = rng.binomial(helpful_total, 0.7)
+            text_lengths = rng.integers(1, 8, size=size)
+            text_starts = rng.integers(0, len(sentences), size=size)
+
+            lines = []
+            for i in range(size):
+                start = text_starts[i]
+                text = ' '.join(
+                    sentences[(start + j) % len(sentences)] for j in range(text_lengths[i]))
+                review_time = datetime.fromtimestamp(int(times[i]), timezone.utc)
+                lines.append(json.dumps({
+                    'reviewerID': f"A{users[i]:013d}",
+                    'asin': f"B{products[i]:09d}",
+                    'reviewerName': f"User {users[i]}",
+                    'helpful': [int(helpful_yes[i]), int(helpful_total[i])],
+                    'reviewText': text,
+                    'overall': float(ratings[i]),
+                    'summary': sentences[start],
+                    'unixReviewTime': int(times[i]),
+                    'reviewTime': review_time.strftime('%m %d, %Y'),
+                }))
+            f.write('\n'.join(lines) + '\n')
+            written += size
+
+    print(f"Saved to: {output_path}")
+    return n_reviews
+
+
+def generate_ratings(output_path, scale, rng):
+    """Write the ratings CSV (reviewer_id, asin, rating, timestamp; no header)."""
+    n_ratings = int(BASE_RATINGS * scale)
+    n_users = max(1, int(BASE_RATING_USERS * scale))
+    n_products = max(1, int(BASE_RATING_PRODUCTS * scale))
+    print(f"\nGenerating {n_ratings:,} ratings "
+          f"({n_users:,} users, {n_products:,} products)...")
+
+    users_sampler = SkewedSampler(n_users, USER_SKEW, rng)
+    products_sampler = SkewedSampler(n_products, PRODUCT_SKEW, rng)
+
+    written = 0
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        while written < n_ratings:
+            size = min(WRITE_CHUNK_ROWS * 5, n_ratings - written)
+            users = users_sampler.sample(size)
+            products = products_sampler.sample(size)
+            ratings = draw_ratings(rng, size)
+            times = rng.integers(START_TIME, END_TIME, size=size)
+            f.write(''.join([
+                f"A{user:013d},B{product:09d},{rating},{ts}\n"
+                for user, product, rating, ts in zip(
+                    users.tolist(), products.tolist(), ratings.tolist(), times.tolist())
+            ]))
+            written += size
+
+    print(f"Saved to: {output_path}")
+    return n_ratings
+
+
+def generate_synthetic_data(data_dir, scale=1.0, seed=42, force=False):
+    """
+    Create the raw/ tree download_dataset.py would, filled with synthetic data.
+
+    Existing review or rating files are only replaced with force=True.
+    """
+    raw_dir = os.path.join(data_dir, 'raw')
+    reviews_path = os.path.join(raw_dir, 'reviews', 'electronics_reviews.json')
+    ratings_path = os.path.join(raw_dir, 'products', 'metadata', 'ratings_Electronics (1).csv')
+    existing = [path for path in (reviews_path, ratings_path) if os.path.exists(path)]
+    if existing and not force:
+        raise FileExistsError(f"Would overwrite {', '.join(existing)}")
+
+    rng = np.random.default_rng(seed)
+    for folder in ('reviews', 'clickstream', 'transactions',
+                   os.path.join('products', 'metadata'), 'external_api'):
+        os.makedirs(os.path.join(raw_dir, folder), exist_ok=True)
+
+    reviews = generate_reviews(reviews_path, scale, rng)
+    ratings = generate_ratings(ratings_path, scale, rng)
+    return {'reviews': reviews, 'ratings': ratings}
+
+
+def main(data_dir=None, scale=1.0, seed=42, force=False):
+    """Main function to generate a synthetic dataset."""
+    print("=" * 80)
+    print(f"Synthetic Dataset Generator - scale {scale:g}x")
+    print("=" * 80)
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = data_dir or os.path.join(script_dir, DEFAULT_DATA_DIR)
+    try:
+        generate_synthetic_data(data_dir, scale, seed, force)
+    except FileExistsError as e:
+        print(f"\n{e}; use --force to replace them")
+        return 1
+
+    print("\n" + "=" * 80)
+    print("Synthetic dataset generation complete!")
+    print("=" * 80)
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic electronics reviews and ratings at a chosen scale")
+    parser.add_argument(
+        "--scale", type=float, default=1.0,
+        help=f"Scale factor; 1 = {BASE_REVIEWS:,} reviews and {BASE_RATINGS:,} ratings"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument(
+        "--data-dir",
+        help="Data directory to create raw/ in (default: data/synthetic next to this script)"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Replace review and rating files that already exist in the data directory"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(main(args.data_dir, args.scale, args.seed, args.force))
@@ -0,0 +1,319 @@
+import hashlib
+import logging
+import os
+
+from partitioned_ingest import RangeLineReader, split_line_ranges
+
+# --------------------------------------------------
+# INGESTION CHECKPOINTS
+# --------------------------------------------------
+# One row per source file: how far it has been committed and the
+# highest event time seen, so reruns only load the appended tail.
+# Partitioned runs also keep one row per byte range, so an interrupted
+# run resumes every partition where its last commit left off.
+
+# Bytes of the file head hashed to recognise a replaced file
+HEAD_HASH_BYTES = 64 * 1024
+
+# Bytes read per step when looking back for the last complete line
+TAIL_SCAN_BYTES = 64 * 1024
+
+CREATE_CHECKPOINT_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    source_file TEXT PRIMARY KEY,
+    file_size BIGINT NOT NULL,
+    file_mtime DOUBLE PRECISION NOT NULL,
+    head_length INTEGER NOT NULL,
+    head_hash TEXT NOT NULL,
+    committed_offset BIGINT NOT NULL,
+    watermark BIGINT,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+SELECT_CHECKPOINT_SQL = """
+SELECT head_length, head_hash, committed_offset, watermark
+FROM ingest_checkpoints
+WHERE source_file = %s;
+"""
+
+UPSERT_CHECKPOINT_SQL = """
+INSERT INTO ingest_checkpoints (
+    source_file,
+    file_size,
+    file_mtime,
+    head_length,
+    head_hash,
+    committed_offset,
+    watermark,
+    updated_at
+)
+VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+ON CONFLICT (source_file) DO UPDATE SET
+    file_size = EXCLUDED.file_size,
+    file_mtime = EXCLUDED.file_mtime,
+    head_length = EXCLUDED.head_length,
+    head_hash = EXCLUDED.head_hash,
+    committed_offset = EXCLUDED.committed_offset,
+    watermark = EXCLUDED.watermark,
+    updated_at = NOW();
+"""
+
+CREATE_PARTITION_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_partition_checkpoints (
+    source_file TEXT NOT NULL,
+    range_start BIGINT NOT NULL,
+    range_end BIGINT NOT NULL,
+    committed_offset BIGINT NOT NULL,
+    watermark BIGINT,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (source_file, range_start)
+);
+"""
+
+SELECT_PARTITIONS_SQL = """
+SELECT range_start, range_end, committed_offset, watermark
+FROM ingest_partition_checkpoints
+WHERE source_file = %s
+ORDER BY range_start;
+"""
+
+UPSERT_PARTITION_SQL = """
+INSERT INTO ingest_partition_checkpoints (
+    source_file,
+    range_start,
+    range_end,
+    committed_offset,
+    watermark,
+    updated_at
+)
+VALUES (%s, %s, %s, %s, %s, NOW())
+ON CONFLICT (source_file, range_start) DO UPDATE SET
+    range_end = EXCLUDED.range_end,
+    committed_offset = EXCLUDED.committed_offset,
+    watermark = EXCLUDED.watermark,
+    updated_at = NOW();
+"""
+
+DELETE_PARTITIONS_SQL = """
+DELETE FROM ingest_partition_checkpoints
+WHERE source_file = %s;
+"""
+
+# --------------------------------------------------
+def file_head_hash(path, length):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(length)).hexdigest()
+
+
+def header_end_offset(path):
+    with open(path, "rb") as f:
+        f.readline()
+        return f.tell()
+
+
+def complete_lines_end(path, size):
+    """
+    Offset just past the last newline in the first size bytes of path.
+
+    A writer still appending may have left a torn last line; it is left
+    for the next run instead of being read, rejected and skipped.
+    """
+    with open(path, "rb") as f:
+        end = size
+        while end > 0:
+            start = max(0, end - TAIL_SCAN_BYTES)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+# --------------------------------------------------
+class WatermarkTracker:
+    """Keeps the highest event time seen in a stream of records"""
+
+    def __init__(self, watermark=None):
+        self.watermark = watermark
+        self.reader = None
+
+    def observe(self, value):
+        if value is not None and (self.watermark is None or value > self.watermark):
+            self.watermark = value
+
+    def track(self, items, watermark_fn):
+        """Pass items through, updating the watermark from watermark_fn(item)"""
+        for item in items:
+            try:
+                self.observe(int(watermark_fn(item)))
+            except (KeyError, TypeError, ValueError):
+                pass
+            yield item
+
+    def save(self, cursor, offset=None):
+        """Nothing to persist; see FileCheckpoint"""
+
+
+class PartitionCheckpoint(WatermarkTracker):
+    """
+    Resume point for one byte range of a partitioned run.
+
+    The worker saves it in the transaction of every chunk it commits,
+    as FileCheckpoint does for a sequential run. The file checkpoint
+    only advances once every partition has finished.
+    """
+
+    def __init__(self, path, range_start, range_end, committed_offset=None, watermark=None):
+        super().__init__(watermark)
+        self.source_file = os.path.abspath(path)
+        self.range_start = range_start
+        self.range_end = range_end
+        self.committed_offset = range_start if committed_offset is None else committed_offset
+
+    @property
+    def is_done(self):
+        return self.committed_offset >= self.range_end
+
+    def save(self, cursor, offset=None):
+        if offset is None:
+            offset = self.reader.position if self.reader else self.committed_offset
+        cursor.execute(UPSERT_PARTITION_SQL, (
+            self.source_file,
+            self.range_start,
+            self.range_end,
+            offset,
+            self.watermark
+        ))
+
+
+class FileCheckpoint(WatermarkTracker):
+    """
+    Resume point for one source file.
+
+    The file is identified by its path plus a hash of its head. If the
+    head no longer matches, or the file shrank below the committed
+    offset, it is treated as a new file and read from the start.
+    save() must run inside the transaction that commits the data so
+    the offset never gets ahead of (or behind) what is in the table.
+    """
+
+    def __init__(self, path, start_offset, end_offset, watermark=None, partitions=()):
+        super().__init__(watermark)
+        self.path = path
+        self.source_file = os.path.abspath(path)
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        # PartitionCheckpoints of an interrupted partitioned run
+        self.partitions = list(partitions)
+        self._head = None
+
+    @classmethod
+    def load(cls, conn, path, skip_header=False):
+        stat = os.stat(path)
+        # Only complete lines are loaded; a partial tail waits for the next run
+        size = complete_lines_end(path, stat.st_size)
+        base_offset = header_end_offset(path) if skip_header else 0
+        source_file = os.path.abspath(path)
+
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_CHECKPOINT_TABLE_SQL)
+            cursor.execute(CREATE_PARTITION_TABLE_SQL)
+            cursor.execute(SELECT_CHECKPOINT_SQL, (source_file,))
+            row = cursor.fetchone()
+            cursor.execute(SELECT_PARTITIONS_SQL, (source_file,))
+            partitions = [
+                PartitionCheckpoint(path, range_start, range_end, committed_offset, watermark)
+                for range_start, range_end, committed_offset, watermark in cursor.fetchall()
+            ]
+
+            if row is None:
+                logging.info(f"No checkpoint for {path}, reading from the start")
+                checkpoint = cls(path, base_offset, size)
+            else:
+                head_length, head_hash, committed_offset, watermark = row
+                if stat.st_size < committed_offset or file_head_hash(path, head_length) != head_hash:
+                    logging.warning(f"{path} changed since its last checkpoint, reading from the start")
+                    checkpoint = cls(path, base_offset, size)
+                else:
+                    logging.info(
+                        f"Resuming {path} at byte {committed_offset} of {size} "
+                        f"(watermark {watermark})"
+                    )
+                    checkpoint = cls(
+                        path, max(committed_offset, base_offset), size, watermark, partitions
+                    )
+
+            if partitions and not checkpoint.partitions:
+                # Ranges of a file that has since been replaced
+                cursor.execute(DELETE_PARTITIONS_SQL, (source_file,))
+        conn.commit()
+
+        # Rows of finished partitions are already committed
+        for partition in checkpoint.partitions:
+            checkpoint.observe(partition.watermark)
+        if checkpoint.partitions:
+            unfinished = sum(1 for partition in checkpoint.partitions if not partition.is_done)
+            logging.info(f"{unfinished} partitions of an interrupted run left to finish")
+        return checkpoint
+
+    @property
+    def is_up_to_date(self):
+        return self.start_offset >= self.end_offset
+
+    def lines(self):
+        """Lines between the checkpoint and the file size seen at load()"""
+        self.reader = RangeLineReader(self.path, self.start_offset, self.end_offset)
+        return self.reader
+
+    def partition_checkpoints(self, partitions):
+        """
+        Checkpoints of the byte ranges to load in a partitioned run.
+
+        Ranges an interrupted run left unfinished resume from their own
+        committed offsets; the rest of the file is split into up to
+        `partitions` new ranges.
+        """
+        checkpoints = [partition for partition in self.partitions if not partition.is_done]
+        covered = max((partition.range_end for partition in self.partitions), default=self.start_offset)
+        if covered < self.end_offset:
+            checkpoints += [
+                PartitionCheckpoint(self.path, start, end)
+                for start, end in split_line_ranges(
+                    self.path, partitions, start=covered, end=self.end_offset
+                )
+            ]
+        return checkpoints
+
+    def start_partitions(self, cursor, partitions):
+        """Record every range of the run and the file identity they belong to"""
+        self.save(cursor, self.start_offset)
+        for partition in partitions:
+            partition.save(cursor)
+
+    def finish_partitions(self, cursor):
+        """Advance to the end of the file and drop the partition checkpoints"""
+        self.save(cursor, self.end_offset)
+        cursor.execute(DELETE_PARTITIONS_SQL, (self.source_file,))
+        self.partitions = []
+
+    def save(self, cursor, offset=None):
+        if offset is None:
+            offset = self.reader.position if self.reader else self.start_offset
+
+        # The file already extends to end_offset and the head of an
+        # append-only file never changes, so it is hashed once
+        if self._head is None:
+            head_length = min(HEAD_HASH_BYTES, self.end_offset)
+            self._head = (head_length, file_head_hash(self.path, head_length))
+
+        stat = os.stat(self.path)
+        cursor.execute(UPSERT_CHECKPOINT_SQL, (
+            self.source_file,
+            stat.st_size,
+            stat.st_mtime,
+            self._head[0],
+            self._head[1],
+            offset,
+            self.watermark
+        ))
@@ -1,7 +1,14 @@
-import json
+import argparse
 import logging
-import psycopg2
 import time
+from contextlib import contextmanager
+
+from batch_executor import BatchExecutor, PipelineExecutor, make_quarantine
+from db import get_connection, get_pipeline_connection, load_db_config, release_connection
+from json_stream import iter_object_items
+from partitioned_ingest import run_batched, worker_connection
+from popularity_client import DEFAULT_CONCURRENCY, iter_api_records
+from sinks import SINK_KINDS, RejectLog, TableSpec, open_sink
 
 # -----------------------------
 # LOGGING
@@ -13,13 +20,7 @@ logging.basicConfig(
 
 INPUT_FILE = r"C:\Bits-Sems\Bits-Sem2\DMLL\Assignment\dmml\data\raw\external_api\product_popularity.json"
 
-DB_CONFIG = {
-    "host": "localhost",
-    "port": 5432,
-    "database": "postgres",
-    "user": "postgres",
-    "password": "sajal"
-}
+DB_CONFIG = load_db_config()
 
 INSERT_METADATA_SQL = """
 INSERT INTO product_popularity_metadata (
@@ -33,6 +34,22 @@ INSERT INTO product_popularity_metadata (
 VALUES (%s, %s, %s, %s, %s, NOW());
 """
 
+INSERT_PRODUCT_BATCH_SQL = """
+INSERT INTO product_popularity (
+    run_id,
+    product_id,
+    popularity_score,
+    avg_rating,
+    review_count,
+    last_updated,
+    created_at
+)
+VALUES %s;
+"""
+
+INSERT_PRODUCT_BATCH_TEMPLATE = "(%s, %s, %s, %s, %s, %s, NOW())"
+
+# One product per statement: pipeline mode sends them without waiting
 INSERT_PRODUCT_SQL = """
 INSERT INTO product_popularity (
     run_id,
@@ -46,71 +63,267 @@ INSERT INTO product_popularity (
 VALUES (%s, %s, %s, %s, %s, %s, NOW());
 """
 
-def main():
-    logging.info("Starting product popularity data ingestion")
+# Products per multi-row INSERT / commit
+BATCH_SIZE = 5000
 
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        logging.info("Connected to PostgreSQL")
-    except Exception as e:
-        logging.error(f"Database connection failed: {e}")
+# Batches in flight on the pipelined connection between syncs
+PIPELINE_IN_FLIGHT = 8
+
+_worker_quarantine = None
+
+# Table layouts for the local sinks
+METADATA_TABLE = TableSpec(
+    name="product_popularity_metadata",
+    columns=[
+        ("run_id", "BIGINT"),
+        ("total_products", "INTEGER"),
+        ("generated_at", "TEXT"),
+        ("source", "TEXT"),
+        ("popularity_algorithm", "TEXT"),
+    ],
+    key="run_id",
+    partition_by="run_id"
+)
+
+PRODUCTS_TABLE = TableSpec(
+    name="product_popularity",
+    columns=[
+        ("run_id", "BIGINT"),
+        ("product_id", "TEXT"),
+        ("popularity_score", "DOUBLE"),
+        ("avg_rating", "DOUBLE"),
+        ("review_count", "INTEGER"),
+        ("last_updated", "TEXT"),
+    ],
+    key="run_id, product_id",
+    partition_by="run_id"
+)
+
+
+def iter_popularity_records(file):
+    """
+    Stream product_popularity.json without loading it whole.
+
+    Yields ("metadata", dict) and then ("products", dict) once per
+    product, in the order they appear in the file.
+    """
+    for key, value in iter_object_items(file, stream_keys=("products",)):
+        if key in ("metadata", "products"):
+            yield key, value
+
+
+@contextmanager
+def open_popularity_records(input_file, api_url=None, api_concurrency=DEFAULT_CONCURRENCY):
+    """Record stream from product_popularity.json, or from the popularity API if api_url is set"""
+    if api_url:
+        yield iter_api_records(api_url, api_concurrency)
         return
+    with open(input_file, "r", encoding="utf-8") as f:
+        yield iter_popularity_records(f)
+
+
+def metadata_to_values(run_id, metadata):
+    return (
+        run_id,
+        metadata.get("total_products"),
+        metadata.get("generated_at"),
+        metadata.get("source"),
+        metadata.get("popularity_algorithm")
+    )
+
+
+def product_to_values(run_id, product):
+    return (
+        run_id,
+        product["product_id"],
+        product["popularity_score"],
+        product["avg_rating"],
+        product["review_count"],
+        product["last_updated"]
+    )
+
+
+def insert_product_batch(conn, cursor, run_id, batch, quarantine):
+    """Insert and commit one batch; bad products are bisected out and quarantined"""
+    # psycopg2 is only needed for the postgres sink
+    from psycopg2.extras import execute_values
+
+    def write_products(cursor, products):
+        values = [product_to_values(run_id, product) for product in products]
+        execute_values(
+            cursor, INSERT_PRODUCT_BATCH_SQL, values,
+            template=INSERT_PRODUCT_BATCH_TEMPLATE, page_size=len(values)
+        )
+
+    executor = BatchExecutor(cursor, write_products, quarantine, "product_popularity")
+    inserted, failed = executor.execute(batch)
+    conn.commit()
+    return inserted, failed
 
+
+def insert_batches_pipelined(run_id, batches, quarantine_file):
+    """Send batches over one psycopg 3 pipelined connection; returns (inserted, failed)"""
+    def write_products(cursor, products):
+        cursor.executemany(
+            INSERT_PRODUCT_SQL, [product_to_values(run_id, product) for product in products]
+        )
+
+    conn = get_pipeline_connection(DB_CONFIG)
     try:
-        with open(INPUT_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception as e:
-        logging.error(f"Failed to load JSON file: {e}")
+        executor = PipelineExecutor(
+            conn, write_products, make_quarantine(conn, quarantine_file), "product_popularity",
+            PIPELINE_IN_FLIGHT
+        )
+        return executor.execute(batches)
+    finally:
+        conn.close()
+
+
+def iter_product_batches(records, on_metadata, batch_size):
+    """
+    Group streamed products into batches, handing metadata to on_metadata.
+
+    on_metadata only receives the metadata; callers write it once the
+    products are in, so a failed or empty run leaves no metadata row.
+    """
+    metadata = None
+    batch = []
+    for key, value in records:
+        if key == "metadata":
+            metadata = value
+            on_metadata(metadata)
+            continue
+
+        if not metadata:
+            raise ValueError("Products found before metadata in JSON")
+
+        batch.append(value)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if not metadata:
+        raise ValueError("Missing metadata in JSON")
+    if batch:
+        yield batch
+
+
+def worker_quarantine(quarantine_file):
+    """Per-process quarantine, created with the first batch a worker runs"""
+    global _worker_quarantine
+    if _worker_quarantine is None:
+        _worker_quarantine = make_quarantine(worker_connection(), quarantine_file)
+    return _worker_quarantine
+
+
+def ingest_batch(run_id, batch, quarantine_file):
+    """Worker entry point: insert one product batch on this process's connection"""
+    conn = worker_connection()
+    quarantine = worker_quarantine(quarantine_file)
+    with conn.cursor() as cursor:
+        inserted, failed = insert_product_batch(conn, cursor, run_id, batch, quarantine)
+    return {"inserted": inserted, "failed": failed}
+
+
+def ingest_to_sink(input_file, sink, sink_path=None, batch_size=BATCH_SIZE, quarantine_file=None,
+                   api_url=None, api_concurrency=DEFAULT_CONCURRENCY):
+    """Load one popularity run into a local sink instead of PostgreSQL"""
+    run_id = int(time.time())
+    rejects = RejectLog("product_popularity", quarantine_file)
+    stats = {"inserted": 0, "failed": 0}
+
+    run_metadata = {}
+
+    with open_popularity_records(input_file, api_url, api_concurrency) as records, \
+            open_sink(sink, PRODUCTS_TABLE, sink_path) as target:
+        for batch in iter_product_batches(records, run_metadata.update, batch_size):
+            values = []
+            for product in batch:
+                try:
+                    values.append(product_to_values(run_id, product))
+                except Exception as e:
+                    stats["failed"] += 1
+                    logging.error(f"Rejected product {product.get('product_id')}: {e}")
+                    rejects.reject(product, e)
+            stats["inserted"] += target.write(values)
+            logging.info(f"{stats['inserted']} products inserted")
+
+    if stats["inserted"]:
+        with open_sink(sink, METADATA_TABLE, sink_path) as target:
+            target.write([metadata_to_values(run_id, run_metadata)])
+        logging.info(f"Metadata written with run_id: {run_id}")
+
+    return stats
+
+
+def main(input_file=INPUT_FILE, batch_size=BATCH_SIZE, workers=1, quarantine_file=None,
+         sink="postgres", sink_path=None, api_url=None, api_concurrency=DEFAULT_CONCURRENCY,
+         pipeline=False):
+    if sink != "postgres":
+        logging.info(f"Starting product popularity data ingestion ({sink} sink)")
+        stats = ingest_to_sink(
+            input_file, sink, sink_path, batch_size, quarantine_file, api_url, api_concurrency
+        )
+        logging.info(
+            f"Ingestion complete. Total products inserted: {stats['inserted']}, "
+            f"failed: {stats['failed']}"
+        )
         return
 
-    metadata = data.get("metadata", {})
-    products = data.get("products", [])
+    logging.info("Starting product popularity data ingestion")
 
-    if not metadata or not products:
-        logging.error("Missing metadata or products in JSON")
+    try:
+        conn = get_connection(DB_CONFIG)
+        cursor = conn.cursor()
+        logging.info("Connected to PostgreSQL")
+    except Exception as e:
+        logging.error(f"Database connection failed: {e}")
         return
 
     # ✅ Generate run_id manually (Unix timestamp)
     run_id = int(time.time())
 
+    run_metadata = {}
     inserted_products = 0
     failed_products = 0
 
     try:
-        # Insert metadata WITH run_id
-        cursor.execute(INSERT_METADATA_SQL, (
-            run_id,
-            metadata.get("total_products"),
-            metadata.get("generated_at"),
-            metadata.get("source"),
-            metadata.get("popularity_algorithm")
-        ))
-        logging.info(f"Metadata inserted with run_id: {run_id}")
-
-        # Insert products
-        for product in products:
-            try:
-                cursor.execute(INSERT_PRODUCT_SQL, (
-                    run_id,
-                    product["product_id"],
-                    product["popularity_score"],
-                    product["avg_rating"],
-                    product["review_count"],
-                    product["last_updated"]
-                ))
-                inserted_products += 1
-
-                if inserted_products % 1000 == 0:
-                    conn.commit()
+        with open_popularity_records(input_file, api_url, api_concurrency) as records:
+            batches = iter_product_batches(records, run_metadata.update, batch_size)
+
+            if workers > 1:
+                totals = run_batched(
+                    ingest_batch,
+                    ((run_id, batch, quarantine_file) for batch in batches),
+                    DB_CONFIG,
+                    workers
+                )
+                inserted_products = totals.get("inserted", 0)
+                failed_products = totals.get("failed", 0)
+                if totals.get("failed_batches"):
+                    logging.error(f"{totals['failed_batches']} batches failed")
+            elif pipeline:
+                inserted_products, failed_products = insert_batches_pipelined(
+                    run_id, batches, quarantine_file
+                )
+            else:
+                quarantine = make_quarantine(conn, quarantine_file)
+                for batch in batches:
+                    inserted, failed = insert_product_batch(conn, cursor, run_id, batch, quarantine)
+                    inserted_products += inserted
+                    failed_products += failed
                     logging.info(f"{inserted_products} products inserted")
 
-            except Exception as prod_error:
-                failed_products += 1
-                logging.error(f"Failed product {product.get('product_id')}: {prod_error}")
-                conn.rollback()
+        if inserted_products + failed_products == 0:
+            logging.error("Missing metadata or products in JSON")
+            return
+
+        # Metadata goes in last: a run that failed or inserted nothing leaves no row
+        if inserted_products:
+            cursor.execute(INSERT_METADATA_SQL, metadata_to_values(run_id, run_metadata))
+            conn.commit()
+            logging.info(f"Metadata inserted with run_id: {run_id}")
 
-        conn.commit()
         logging.info(f"Ingestion complete. Total products inserted: {inserted_products}, failed: {failed_products}")
 
     except Exception as e:
@@ -118,7 +331,52 @@ def main():
         conn.rollback()
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingest product popularity into PostgreSQL")
+    parser.add_argument(
+        "--input", "--input-file", default=INPUT_FILE, help="Path to product_popularity.json"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=BATCH_SIZE,
+        help="Products per multi-row INSERT"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Worker processes inserting product batches in parallel"
+    )
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="Keep several batches in flight on one psycopg 3 pipelined connection"
+    )
+    parser.add_argument(
+        "--quarantine-file",
+        help="Write rejected products to this JSONL file instead of the ingest_quarantine table"
+    )
+    parser.add_argument(
+        "--sink", choices=SINK_KINDS, default="postgres",
+        help="postgres (default), or a local parquet / sqlite / duckdb target"
+    )
+    parser.add_argument(
+        "--sink-path",
+        help="Parquet root directory or SQLite / DuckDB file for local sinks"
+    )
+    parser.add_argument(
+        "--api-url",
+        help="Fetch products from this popularity API (e.g. popularity_api.py) instead of --input"
+    )
+    parser.add_argument(
+        "--api-concurrency", type=int, default=DEFAULT_CONCURRENCY,
+        help="API requests in flight, each on its own keep-alive connection"
+    )
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    main(
+        args.input, args.batch_size, args.workers, args.quarantine_file,
+        args.sink, args.sink_path, args.api_url, args.api_concurrency, args.pipeline
+    )
@@ -1,7 +1,19 @@
+import argparse
 import csv
 import logging
-from datetime import datetime
-import psycopg2
+import os
+from datetime import datetime, time
+from functools import lru_cache
+from itertools import islice
+
+from batch_executor import BatchExecutor, make_quarantine
+from copy_stream import COPY_BUFFER_SIZE, CopyStream
+from db import get_connection, load_db_config, release_connection
+from ingest_checkpoints import FileCheckpoint, WatermarkTracker, header_end_offset
+from partitioned_ingest import (
+    RangeLineReader, read_header, run_partitioned, split_line_ranges, worker_connection
+)
+from sinks import SINK_KINDS, RejectLog, TableSpec, open_sink
 
 # -----------------------------
 # LOGGING
@@ -19,13 +31,7 @@ INPUT_FILE = r"C:\Bits-Sems\Bits-Sem2\DMLL\Assignment\dmml\data\raw\transactions
 # -----------------------------
 # DB CONFIG
 # -----------------------------
-DB_CONFIG = {
-    "host": "localhost",
-    "port": 5432,
-    "database": "postgres",
-    "user": "postgres",
-    "password": "sajal"
-}
+DB_CONFIG = load_db_config()
 
 # -----------------------------
 # INSERT SQL
@@ -46,67 +52,501 @@ ON CONFLICT (transaction_id) DO NOTHING;
 """
 
 # -----------------------------
-def main():
-    logging.info("Starting transaction ingestion")
+# STAGING SQL (batched upsert)
+# -----------------------------
+# Temp tables are never WAL-logged; rows vanish at every commit
+CREATE_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS purchase_history_staging (
+    transaction_id TEXT,
+    user_id TEXT,
+    product_id TEXT,
+    transaction_date DATE,
+    transaction_time TIME,
+    quantity INTEGER,
+    price DOUBLE PRECISION,
+    rating DOUBLE PRECISION
+) ON COMMIT DELETE ROWS;
+"""
+
+COPY_STAGING_CSV_SQL = """
+COPY purchase_history_staging (
+    transaction_id,
+    user_id,
+    product_id,
+    transaction_date,
+    transaction_time,
+    quantity,
+    price,
+    rating
+)
+FROM STDIN WITH (FORMAT csv);
+"""
+
+COPY_STAGING_SQL = """
+COPY purchase_history_staging (
+    transaction_id,
+    user_id,
+    product_id,
+    transaction_date,
+    transaction_time,
+    quantity,
+    price,
+    rating
+)
+FROM STDIN;
+"""
+
+MERGE_STAGING_SQL = """
+WITH inserted AS (
+    INSERT INTO purchase_history (
+        transaction_id,
+        user_id,
+        product_id,
+        transaction_date,
+        transaction_time,
+        quantity,
+        price,
+        rating
+    )
+    SELECT
+        transaction_id,
+        user_id,
+        product_id,
+        transaction_date,
+        transaction_time,
+        quantity,
+        price,
+        rating
+    FROM purchase_history_staging
+    ON CONFLICT (transaction_id) DO NOTHING
+    RETURNING 1
+)
+SELECT COUNT(*) FROM inserted;
+"""
+
+# Rows bulk-loaded into staging per merge / transaction
+STAGING_CHUNK_ROWS = 50000
+
+# Rows per transaction in row mode
+ROW_BATCH_ROWS = 1000
+
+SECONDS_PER_DAY = 86400
+
+# purchase_history layout for the local sinks
+PURCHASES_TABLE = TableSpec(
+    name="purchase_history",
+    columns=[
+        ("transaction_id", "TEXT"),
+        ("user_id", "TEXT"),
+        ("product_id", "TEXT"),
+        ("transaction_date", "DATE"),
+        ("transaction_time", "TIME"),
+        ("quantity", "INTEGER"),
+        ("price", "DOUBLE"),
+        ("rating", "DOUBLE"),
+    ],
+    key="transaction_id",
+    partition_by="transaction_date"
+)
+
+# -----------------------------
+@lru_cache(maxsize=None)
+def parse_transaction_date(value):
+    # A few thousand distinct days cover the whole file
+    return datetime.strptime(value, "%m %d, %Y").date()
+
+
+@lru_cache(maxsize=SECONDS_PER_DAY)
+def seconds_to_time(seconds_of_day):
+    return time(seconds_of_day // 3600, seconds_of_day // 60 % 60, seconds_of_day % 60)
+
+
+def row_to_values(row):
+    """Parse one CSV row into the purchase_history column tuple"""
+    # Parse date
+    transaction_date = parse_transaction_date(row["transaction_date"])
+
+    # Parse time from Unix timestamp (UTC time of day)
+    unix_time = int(row["transaction_time"])
+    transaction_time = seconds_to_time(unix_time % SECONDS_PER_DAY)
+
+    # Prepare values
+    return (
+        row["transaction_id"],           # TEXT (or VARCHAR)
+        row["user_id"],
+        row["product_id"],
+        transaction_date,
+        transaction_time,                # time without time zone
+        int(row["quantity"]),
+        float(row["price"]),
+        float(row["rating"])
+    )
+
+# -----------------------------
+def iter_parsed_rows(reader, reject):
+    """Yield parsed value tuples, rejecting rows that cannot be parsed"""
+    for row in reader:
+        try:
+            yield row_to_values(row)
+        except Exception as row_error:
+            reject(row, row_error)
+
+
+def parsed_row_chunks(reader, chunk_rows, checkpoint=None):
+    """Chunk source for load_transactions: csv rows parsed one by one"""
+    def chunks(reject):
+        rows = reader
+        if checkpoint:
+            rows = checkpoint.track(rows, transaction_watermark)
+        rows = iter_parsed_rows(rows, reject)
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                return
+            yield chunk
+    return chunks
+
+
+class ColumnarBlocks:
+    """
+    Typed Arrow batches for bytes [start, end) of the CSV, read in
+    line-aligned blocks of about READ_BLOCK_SIZE bytes.
+
+    `position` stays at the start of the current block until its last
+    batch has been handed out and then moves to the block end, so a
+    checkpoint saved with a batch never skips rows not yet merged.
+    """
+
+    def __init__(self, input_file, start, end, fieldnames, chunk_rows, tracker=None):
+        self.input_file = input_file
+        self.start = start
+        self.end = end
+        self.fieldnames = fieldnames
+        self.chunk_rows = chunk_rows
+        self.tracker = tracker
+        self.position = start
+
+    def batches(self, reject):
+        # pyarrow is only needed for the columnar transform
+        from purchase_columnar import READ_BLOCK_SIZE, iter_typed_batches
+
+        blocks = max(1, -(-(self.end - self.start) // READ_BLOCK_SIZE))
+        for block_start, block_end in split_line_ranges(
+                self.input_file, blocks, start=self.start, end=self.end):
+            batches = iter_typed_batches(
+                self.input_file, block_start, block_end, self.fieldnames,
+                self.chunk_rows, reject, self.tracker
+            )
+            # Hold back one batch to know which is the block's last
+            pending = next(batches, None)
+            for batch in batches:
+                yield pending
+                pending = batch
+            self.position = block_end
+            if pending is not None:
+                yield pending
+
+
+def columnar_chunks(input_file, start, end, fieldnames, chunk_rows, tracker=None):
+    """Chunk source for load_transactions: typed Arrow batches"""
+    blocks = ColumnarBlocks(input_file, start, end, fieldnames, chunk_rows, tracker)
+    if tracker:
+        tracker.reader = blocks
+    return blocks.batches
+
+# -----------------------------
+def transaction_watermark(row):
+    return row["transaction_time"]
+
+
+def merge_staging(cursor):
+    cursor.execute(MERGE_STAGING_SQL)
+    inserted = cursor.fetchone()[0]
+    # Bisection may merge several sub-batches before the commit empties it
+    cursor.execute("TRUNCATE purchase_history_staging")
+    return inserted
+
+
+def write_staging(cursor, rows):
+    """Stage rows with COPY and merge them; returns the number of new rows"""
+    cursor.copy_expert(COPY_STAGING_SQL, CopyStream(rows), size=COPY_BUFFER_SIZE)
+    return merge_staging(cursor)
+
+
+def write_staging_columnar(cursor, batch):
+    """Stage a typed Arrow batch as CSV and merge it; returns the number of new rows"""
+    from purchase_columnar import batch_to_csv
+
+    cursor.copy_expert(COPY_STAGING_CSV_SQL, batch_to_csv(batch), size=COPY_BUFFER_SIZE)
+    return merge_staging(cursor)
+
+
+def write_inserts(cursor, rows):
+    cursor.executemany(INSERT_SQL, rows)
+    return cursor.rowcount
+
+
+def load_transactions(conn, chunks, write_batch, checkpoint=None, quarantine_file=None):
+    """
+    Load chunks produced by chunks(reject), one transaction per chunk.
+
+    Bad rows are isolated by BatchExecutor and quarantined; the rest of
+    the chunk is kept. If a checkpoint is given it is saved in the same
+    transaction as each chunk.
+    """
+    stats = {"inserted": 0, "duplicates": 0, "rejected": 0}
+    cursor = conn.cursor()
+    cursor.execute(CREATE_STAGING_SQL)
+    conn.commit()
+
+    executor = BatchExecutor(
+        cursor, write_batch, make_quarantine(conn, quarantine_file), "purchase_history"
+    )
+
+    def reject(row, row_error):
+        stats["rejected"] += 1
+        logging.error(f"Rejected row {row.get('transaction_id')}: {row_error}")
+        executor.reject(row, row_error)
+
+    for chunk in chunks(reject):
+        inserted, quarantined = executor.execute(chunk)
+        if checkpoint:
+            checkpoint.save(cursor)
+        conn.commit()
+
+        stats["inserted"] += inserted
+        stats["duplicates"] += len(chunk) - quarantined - inserted
+        stats["rejected"] += quarantined
+        logging.info(
+            f"{stats['inserted']} inserted, {stats['duplicates']} duplicates, "
+            f"{stats['rejected']} rejected so far"
+        )
+
+    cursor.close()
+    return stats
+
+# -----------------------------
+def ingest_range(conn, input_file, start, end, fieldnames, mode, transform, chunk_rows,
+                 checkpoint=None, quarantine_file=None):
+    """
+    Ingest bytes [start, end) of the CSV; returns counters for the run report.
+
+    staging mode bulk-loads chunks through the temp staging table, row
+    mode runs one INSERT per row committed every ROW_BATCH_ROWS rows.
+    The columnar transform (staging mode only) checkpoints at block
+    boundaries: batches from a block that was not finished are merged
+    again after a crash, which ON CONFLICT makes harmless.
+    """
+    if transform == "columnar":
+        chunks = columnar_chunks(input_file, start, end, fieldnames, chunk_rows, checkpoint)
+        stats = load_transactions(conn, chunks, write_staging_columnar, checkpoint, quarantine_file)
+        if checkpoint:
+            # Trailing blocks whose rows were all rejected yield no chunk to save with
+            with conn.cursor() as cursor:
+                checkpoint.save(cursor, end)
+            conn.commit()
+        return stats
+
+    lines = RangeLineReader(input_file, start, end)
+    if checkpoint:
+        checkpoint.reader = lines
+    reader = csv.DictReader(lines, fieldnames=fieldnames)
+
+    if mode == "staging":
+        chunks = parsed_row_chunks(reader, chunk_rows, checkpoint)
+        return load_transactions(conn, chunks, write_staging, checkpoint, quarantine_file)
+    chunks = parsed_row_chunks(reader, ROW_BATCH_ROWS, checkpoint)
+    return load_transactions(conn, chunks, write_inserts, checkpoint, quarantine_file)
+
+
+def ingest_partition(input_file, start, end, fieldnames, mode, transform, chunk_rows,
+                     quarantine_file, checkpoint=None):
+    """
+    Worker entry point: ingest one line-aligned byte range of the CSV.
+
+    With a PartitionCheckpoint the range's progress is committed with
+    its chunks, so an interrupted run resumes from there.
+    """
+    tracker = checkpoint or WatermarkTracker()
+    stats = ingest_range(
+        worker_connection(), input_file, start, end, fieldnames,
+        mode, transform, chunk_rows, tracker, quarantine_file
+    )
+    stats["watermark"] = tracker.watermark
+    return stats
+
+# -----------------------------
+def ingest_to_sink(input_file, sink, sink_path=None, transform="rows",
+                   chunk_rows=STAGING_CHUNK_ROWS, quarantine_file=None):
+    """
+    Load the whole CSV into a local sink instead of PostgreSQL.
+
+    Not resumable: every run reads the whole file. SQLite and DuckDB
+    ignore transactions already stored, but the append-only Parquet
+    sink stores them again, so rerun into a fresh Parquet directory.
+    """
+    fieldnames = next(csv.reader([read_header(input_file)]))
+    start, end = header_end_offset(input_file), os.path.getsize(input_file)
+
+    stats = {"inserted": 0, "duplicates": 0, "rejected": 0}
+    rejects = RejectLog("purchase_history", quarantine_file)
+
+    def reject(row, row_error):
+        stats["rejected"] += 1
+        logging.error(f"Rejected row {row.get('transaction_id')}: {row_error}")
+        rejects.reject(row, row_error)
+
+    if transform == "columnar":
+        chunks = columnar_chunks(input_file, start, end, fieldnames, chunk_rows)
+    else:
+        reader = csv.DictReader(RangeLineReader(input_file, start, end), fieldnames=fieldnames)
+        chunks = parsed_row_chunks(reader, chunk_rows)
+
+    with open_sink(sink, PURCHASES_TABLE, sink_path) as target:
+        for chunk in chunks(reject):
+            inserted = target.write(chunk)
+            stats["inserted"] += inserted
+            stats["duplicates"] += len(chunk) - inserted
+            logging.info(
+                f"{stats['inserted']} inserted, {stats['duplicates']} duplicates, "
+                f"{stats['rejected']} rejected so far"
+            )
+
+    return stats
+
+# -----------------------------
+def main(input_file=INPUT_FILE, mode="staging", chunk_rows=STAGING_CHUNK_ROWS, workers=1,
+         use_checkpoint=True, quarantine_file=None, transform="rows", sink="postgres",
+         sink_path=None):
+    if sink != "postgres":
+        logging.info(f"Starting transaction ingestion ({sink} sink, {transform} transform)")
+        stats = ingest_to_sink(input_file, sink, sink_path, transform, chunk_rows, quarantine_file)
+        logging.info(
+            f"Ingestion complete. Inserted: {stats['inserted']}, "
+            f"duplicates: {stats['duplicates']}, rejected: {stats['rejected']}"
+        )
+        return
+
+    logging.info(f"Starting transaction ingestion ({mode} mode, {transform} transform)")
+
+    if transform == "columnar" and mode != "staging":
+        logging.error("The columnar transform is only available in staging mode")
+        return
 
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+        conn = get_connection(DB_CONFIG)
         logging.info("Connected to PostgreSQL")
     except Exception as e:
         logging.error(f"Database connection failed: {e}")
         return
 
-    inserted = 0
-    failed = 0
-
-    with open(INPUT_FILE, "r", encoding="utf-8") as file:
-        reader = csv.DictReader(file)
-
-        for row in reader:
-            try:
-                # Parse date
-                transaction_date = datetime.strptime(
-                    row["transaction_date"], "%m %d, %Y"
-                ).date()
-
-                # Parse time from Unix timestamp
-                unix_time = int(row["transaction_time"])
-                dt = datetime.utcfromtimestamp(unix_time)
-                transaction_time = dt.time()
-
-                # Prepare values
-                values = (
-                    row["transaction_id"],           # TEXT (or VARCHAR)
-                    row["user_id"],
-                    row["product_id"],
-                    transaction_date,
-                    transaction_time,                # time without time zone
-                    int(row["quantity"]),
-                    float(row["price"]),
-                    float(row["rating"])
-                )
-
-                cursor.execute(INSERT_SQL, values)
-                inserted += 1
-
-                if inserted % 1000 == 0:
-                    conn.commit()
-                    logging.info(f"{inserted} records inserted")
-
-            except Exception as row_error:
-                failed += 1
-                logging.error(f"Failed row {row['transaction_id']}: {row_error}")
-                #Rollback the failed transaction to continue
-                conn.rollback()
-
-    # Final commit
-    conn.commit()
-    cursor.close()
-    conn.close()
+    checkpoint = None
+    if use_checkpoint:
+        checkpoint = FileCheckpoint.load(conn, input_file, skip_header=True)
+        if checkpoint.is_up_to_date:
+            logging.info("No new transactions since the last checkpoint")
+            release_connection(conn)
+            return
 
-    logging.info(f"Ingestion complete. Total records inserted: {inserted}, failed: {failed}")
+    # Fields are never quoted across lines in purchase_history.csv,
+    # so line-aligned byte ranges are also record-aligned
+    fieldnames = next(csv.reader([read_header(input_file)]))
+
+    if checkpoint:
+        start, end = checkpoint.start_offset, checkpoint.end_offset
+    else:
+        start, end = header_end_offset(input_file), os.path.getsize(input_file)
+
+    # Partitions left by an interrupted run are finished by the
+    # partitioned path, even when it now runs with one worker
+    if workers > 1 or (checkpoint and checkpoint.partitions):
+        if checkpoint:
+            partitions = checkpoint.partition_checkpoints(workers)
+            with conn.cursor() as cursor:
+                checkpoint.start_partitions(cursor, partitions)
+            conn.commit()
+            tasks = [
+                (input_file, partition.committed_offset, partition.range_end, fieldnames, mode,
+                 transform, chunk_rows, quarantine_file, partition)
+                for partition in partitions
+            ]
+        else:
+            tasks = [
+                (input_file, start, end, fieldnames, mode, transform, chunk_rows, quarantine_file)
+                for start, end in split_line_ranges(input_file, workers, start=start, end=end)
+            ]
+        stats = run_partitioned(ingest_partition, tasks, DB_CONFIG, workers)
+        if stats.get("failed_partitions"):
+            logging.error(f"{stats['failed_partitions']} partitions failed")
+            if checkpoint:
+                logging.warning("Checkpoint not advanced; failed partitions resume on the next run")
+        elif checkpoint:
+            checkpoint.observe(stats.get("watermark"))
+            with conn.cursor() as cursor:
+                checkpoint.finish_partitions(cursor)
+            conn.commit()
+    else:
+        stats = ingest_range(
+            conn, input_file, start, end, fieldnames,
+            mode, transform, chunk_rows, checkpoint, quarantine_file
+        )
+
+    release_connection(conn)
+
+    logging.info(
+        f"Ingestion complete. Inserted: {stats.get('inserted', 0)}, "
+        f"duplicates: {stats.get('duplicates', 0)}, rejected: {stats.get('rejected', 0)}"
+    )
+    if checkpoint:
+        logging.info(f"Transaction time watermark: {checkpoint.watermark}")
+
+# -----------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingest purchase history into PostgreSQL")
+    parser.add_argument(
+        "--input", "--input-file", default=INPUT_FILE, help="Path to purchase_history.csv"
+    )
+    parser.add_argument(
+        "--mode", choices=["staging", "row"], default="staging",
+        help="staging: batched upsert through a temp table (default), row: one INSERT per row"
+    )
+    parser.add_argument(
+        "--chunk-rows", type=int, default=STAGING_CHUNK_ROWS,
+        help="Rows staged per merge in staging mode"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Worker processes; >1 splits the CSV into line-aligned byte ranges"
+    )
+    parser.add_argument(
+        "--no-checkpoint", action="store_true",
+        help="Ignore and do not update the ingest_checkpoints entry for this file"
+    )
+    parser.add_argument(
+        "--quarantine-file",
+        help="Write rejected rows to this JSONL file instead of the ingest_quarantine table"
+    )
+    parser.add_argument(
+        "--transform", choices=["rows", "columnar"], default="rows",
+        help="rows: parse each CSV row in Python (default), "
+             "columnar: convert whole Arrow record batches (needs pyarrow)"
+    )
+    parser.add_argument(
+        "--sink", choices=SINK_KINDS, default="postgres",
+        help="postgres (default), or a local parquet / sqlite / duckdb target "
+             "(sequential, no checkpoint)"
+    )
+    parser.add_argument(
+        "--sink-path",
+        help="Parquet root directory or SQLite / DuckDB file for local sinks"
+    )
+    return parser.parse_args()
 
 # -----------------------------
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    main(
+        args.input, args.mode, args.chunk_rows, args.workers,
+        not args.no_checkpoint, args.quarantine_file, args.transform,
+        args.sink, args.sink_path
+    )
@@ -1,7 +1,19 @@
+import argparse
 import json
 import logging
-import psycopg2
+import os
 from datetime import datetime
+from itertools import islice
+
+from batch_executor import BatchExecutor, make_quarantine
+from copy_stream import COPY_BUFFER_SIZE, CopyStream
+from db import get_connection, load_db_config, release_connection
+from ingest_checkpoints import FileCheckpoint, WatermarkTracker
+from partitioned_ingest import (
+    RangeLineReader, run_partitioned, split_line_ranges, worker_connection
+)
+from review_dedup import ContentHashIndex, review_content_hash, setup_hash_column
+from sinks import SINK_KINDS, RejectLog, TableSpec, open_sink
 
 # --------------------------------------------------
 # LOGGING CONFIGURATION
@@ -19,13 +31,7 @@ INPUT_FILE = r"C:\Bits-Sems\Bits-Sem2\DMLL\Assignment\dmml\data\raw\reviews\elec
 # --------------------------------------------------
 # DB CONFIG
 # --------------------------------------------------
-DB_CONFIG = {
-    "host": "localhost",
-    "port": 5432,
-    "database": "postgres",
-    "user": "postgres",
-    "password": "sajal"
-}
+DB_CONFIG = load_db_config()
 
 # --------------------------------------------------
 # INSERT SQL
@@ -35,11 +41,95 @@ INSERT INTO product_reviews (
     user_id, product_id, reviewer_name,
     helpful_yes, helpful_total,
     rating, review_summary, review_text,
-    unix_review_time, review_date
+    unix_review_time, review_date,
+    content_hash
 )
-VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);
+VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+ON CONFLICT (content_hash) DO NOTHING;
 """
 
+# --------------------------------------------------
+# STAGING SQL (bulk mode)
+# --------------------------------------------------
+# COPY has no ON CONFLICT, so chunks are copied into a temp table and
+# merged from there; reviews already loaded are skipped, not rejected
+CREATE_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS product_reviews_staging (
+    user_id TEXT,
+    product_id TEXT,
+    reviewer_name TEXT,
+    helpful_yes INTEGER,
+    helpful_total INTEGER,
+    rating DOUBLE PRECISION,
+    review_summary TEXT,
+    review_text TEXT,
+    unix_review_time BIGINT,
+    review_date DATE,
+    content_hash BYTEA
+) ON COMMIT DELETE ROWS;
+"""
+
+COPY_STAGING_SQL = """
+COPY product_reviews_staging (
+    user_id, product_id, reviewer_name,
+    helpful_yes, helpful_total,
+    rating, review_summary, review_text,
+    unix_review_time, review_date,
+    content_hash
+)
+FROM STDIN;
+"""
+
+MERGE_STAGING_SQL = """
+WITH inserted AS (
+    INSERT INTO product_reviews (
+        user_id, product_id, reviewer_name,
+        helpful_yes, helpful_total,
+        rating, review_summary, review_text,
+        unix_review_time, review_date,
+        content_hash
+    )
+    SELECT
+        user_id, product_id, reviewer_name,
+        helpful_yes, helpful_total,
+        rating, review_summary, review_text,
+        unix_review_time, review_date,
+        content_hash
+    FROM product_reviews_staging
+    ON CONFLICT (content_hash) DO NOTHING
+    RETURNING 1
+)
+SELECT COUNT(*) FROM inserted;
+"""
+
+# Rows per COPY statement / transaction. Bounds memory to one chunk.
+COPY_CHUNK_ROWS = 50000
+
+# Rows per transaction in row mode
+ROW_BATCH_ROWS = 1000
+
+_worker_hash_index = None
+
+# product_reviews layout for the local sinks
+REVIEWS_TABLE = TableSpec(
+    name="product_reviews",
+    columns=[
+        ("user_id", "TEXT"),
+        ("product_id", "TEXT"),
+        ("reviewer_name", "TEXT"),
+        ("helpful_yes", "INTEGER"),
+        ("helpful_total", "INTEGER"),
+        ("rating", "DOUBLE"),
+        ("review_summary", "TEXT"),
+        ("review_text", "TEXT"),
+        ("unix_review_time", "BIGINT"),
+        ("review_date", "DATE"),
+        ("content_hash", "BLOB"),
+    ],
+    key="content_hash",
+    partition_by="review_date"
+)
+
 # --------------------------------------------------
 def parse_review_date(review_time):
     """Convert Amazon reviewTime to DATE"""
@@ -49,62 +139,330 @@ def parse_review_date(review_time):
         return None
 
 # --------------------------------------------------
-def main():
-    logging.info("Starting Amazon reviews ingestion")
+def review_to_values(review):
+    """Map a raw review dict to the product_reviews column tuple"""
+    return (
+        review.get("reviewerID"),
+        review.get("asin"),
+        review.get("reviewerName"),
+        review.get("helpful", [0, 0])[0],
+        review.get("helpful", [0, 0])[1],
+        review.get("overall"),
+        review.get("summary"),
+        review.get("reviewText"),
+        review.get("unixReviewTime"),
+        parse_review_date(review.get("reviewTime")),
+        review_content_hash(review)
+    )
+
+# --------------------------------------------------
+def iter_review_rows(lines, stats, executor):
+    """Yield (line_number, values) for every parseable line of the JSONL file"""
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            yield line_number, review_to_values(json.loads(line))
+        except Exception as e:
+            stats["skipped"] += 1
+            logging.warning(f"Skipped record at line {line_number}: {e}")
+            executor.reject({"line_number": line_number, "line": line}, e)
+
+# --------------------------------------------------
+def skip_known_reviews(rows, hash_index, stats):
+    """Drop rows whose content hash is already loaded (or seen earlier in this run)"""
+    for item in rows:
+        if hash_index.add_if_new(item[1][10]):
+            yield item
+        else:
+            stats["duplicates"] += 1
+
+# --------------------------------------------------
+def review_watermark(item):
+    return item[1][8]    # unix_review_time
+
+
+def write_copy(cursor, rows):
+    """Stage rows with COPY and merge them; returns the number of new reviews"""
+    cursor.copy_expert(
+        COPY_STAGING_SQL,
+        CopyStream(values for _, values in rows),
+        size=COPY_BUFFER_SIZE
+    )
+    cursor.execute(MERGE_STAGING_SQL)
+    inserted = cursor.fetchone()[0]
+    # Bisection may merge several sub-batches before the commit empties it
+    cursor.execute("TRUNCATE product_reviews_staging")
+    return inserted
+
+
+def write_inserts(cursor, rows):
+    cursor.executemany(INSERT_SQL, [values for _, values in rows])
+    return cursor.rowcount
+
+
+def load_reviews(conn, lines, write_batch, chunk_rows, checkpoint=None, quarantine_file=None,
+                 hash_index=None):
+    """
+    Load reviews in chunks of chunk_rows, one transaction per chunk.
+
+    Bad rows inside a chunk are isolated by BatchExecutor and written to
+    the quarantine; the rest of the chunk is kept. If a checkpoint is
+    given it tracks the unixReviewTime watermark and is saved in the
+    same transaction as each chunk. With a hash_index, reviews already
+    in the table never reach the database.
+    """
+    stats = {"inserted": 0, "skipped": 0, "duplicates": 0}
+    cursor = conn.cursor()
+    cursor.execute(CREATE_STAGING_SQL)
+    conn.commit()
+    executor = BatchExecutor(
+        cursor, write_batch, make_quarantine(conn, quarantine_file), "product_reviews"
+    )
+    rows = iter_review_rows(lines, stats, executor)
+    if checkpoint:
+        rows = checkpoint.track(rows, review_watermark)
+    if hash_index is not None:
+        rows = skip_known_reviews(rows, hash_index, stats)
+
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            break
+
+        inserted, quarantined = executor.execute(chunk)
+        if checkpoint:
+            checkpoint.save(cursor)
+        conn.commit()
+
+        stats["inserted"] += inserted
+        stats["duplicates"] += len(chunk) - quarantined - inserted
+        stats["skipped"] += quarantined
+        if quarantined:
+            logging.warning(
+                f"Quarantined {quarantined} records from lines {chunk[0][0]}-{chunk[-1][0]}"
+            )
+        logging.info(f"Inserted {stats['inserted']} reviews so far...")
+
+    cursor.close()
+    return stats
+
+
+def copy_reviews(conn, lines, chunk_rows=COPY_CHUNK_ROWS, checkpoint=None, quarantine_file=None,
+                 hash_index=None):
+    """Stream the reviews file into product_reviews with one staged COPY per chunk"""
+    return load_reviews(
+        conn, lines, write_copy, chunk_rows, checkpoint, quarantine_file, hash_index
+    )
+
+
+def insert_reviews(conn, lines, checkpoint=None, quarantine_file=None, hash_index=None):
+    """Row-by-row ingestion, one INSERT per review, committed every 1000 rows"""
+    return load_reviews(
+        conn, lines, write_inserts, ROW_BATCH_ROWS, checkpoint, quarantine_file, hash_index
+    )
+
+# --------------------------------------------------
+def ingest_lines(conn, lines, mode, chunk_rows, checkpoint=None, quarantine_file=None,
+                 hash_index=None):
+    if mode == "copy":
+        return copy_reviews(conn, lines, chunk_rows, checkpoint, quarantine_file, hash_index)
+    return insert_reviews(conn, lines, checkpoint, quarantine_file, hash_index)
+
+
+def worker_hash_index():
+    """Per-process hash index, loaded on the first partition a worker runs"""
+    global _worker_hash_index
+    if _worker_hash_index is None:
+        _worker_hash_index = ContentHashIndex.load(worker_connection())
+    return _worker_hash_index
+
+
+def ingest_partition(input_file, start, end, mode, chunk_rows, quarantine_file, dedup,
+                     checkpoint=None):
+    """
+    Worker entry point: ingest one line-aligned byte range.
+
+    With a PartitionCheckpoint every chunk also commits how far the
+    range has been loaded, so an interrupted run resumes from there.
+    """
+    tracker = checkpoint or WatermarkTracker()
+    tracker.reader = RangeLineReader(input_file, start, end)
+    stats = ingest_lines(
+        worker_connection(), tracker.reader, mode, chunk_rows, tracker, quarantine_file,
+        worker_hash_index() if dedup else None
+    )
+    stats["watermark"] = tracker.watermark
+    return stats
+
+# --------------------------------------------------
+def ingest_to_sink(input_file, sink, sink_path=None, chunk_rows=COPY_CHUNK_ROWS,
+                   quarantine_file=None, dedup=True):
+    """
+    Load the reviews file into a local sink instead of PostgreSQL.
+
+    There is no checkpoint, so every run reads the whole file. With
+    dedup the hash index is seeded from the sink, so a rerun skips the
+    reviews an earlier run wrote; without it a rerun into an
+    append-only sink (Parquet) duplicates them.
+    """
+    stats = {"inserted": 0, "skipped": 0, "duplicates": 0}
+    lines = RangeLineReader(input_file, 0, os.path.getsize(input_file))
+    rows = iter_review_rows(lines, stats, RejectLog("product_reviews", quarantine_file))
+
+    with open_sink(sink, REVIEWS_TABLE, sink_path) as target:
+        if dedup:
+            hash_index = ContentHashIndex.from_hashes(target.key_values())
+            logging.info(f"Loaded {len(hash_index)} review hashes from the {sink} sink")
+            rows = skip_known_reviews(rows, hash_index, stats)
+
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if not chunk:
+                break
+            inserted = target.write([values for _, values in chunk])
+            stats["inserted"] += inserted
+            stats["duplicates"] += len(chunk) - inserted
+            logging.info(f"Inserted {stats['inserted']} reviews so far...")
+
+    return stats
+
+# --------------------------------------------------
+def main(input_file=INPUT_FILE, mode="copy", chunk_rows=COPY_CHUNK_ROWS, workers=1,
+         use_checkpoint=True, quarantine_file=None, dedup=True, backfill_hashes=False,
+         sink="postgres", sink_path=None):
+    if sink != "postgres":
+        logging.info(f"Starting Amazon reviews ingestion ({sink} sink)")
+        stats = ingest_to_sink(input_file, sink, sink_path, chunk_rows, quarantine_file, dedup)
+        logging.info("Ingestion completed successfully")
+        logging.info(f"Total inserted: {stats['inserted']}")
+        logging.info(f"Total duplicates: {stats['duplicates']}")
+        logging.info(f"Total skipped: {stats['skipped']}")
+        return
+
+    logging.info(f"Starting Amazon reviews ingestion ({mode} mode)")
 
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+        conn = get_connection(DB_CONFIG)
         logging.info("Connected to PostgreSQL")
     except Exception as e:
         logging.error(f"Database connection failed: {e}")
         return
 
-    inserted_count = 0
-    skipped_count = 0
-
-    logging.info(f"Reading input file: {INPUT_FILE}")
-
-    with open(INPUT_FILE, "r", encoding="utf-8") as file:
-        for line_number, line in enumerate(file, start=1):
-            try:
-                review = json.loads(line)
-
-                values = (
-                    review.get("reviewerID"),
-                    review.get("asin"),
-                    review.get("reviewerName"),
-                    review.get("helpful", [0, 0])[0],
-                    review.get("helpful", [0, 0])[1],
-                    review.get("overall"),
-                    review.get("summary"),
-                    review.get("reviewText"),
-                    review.get("unixReviewTime"),
-                    parse_review_date(review.get("reviewTime"))
-                )
-
-                cursor.execute(INSERT_SQL, values)
-                inserted_count += 1
-
-                # Commit every 1000 rows (safe + faster)
-                if inserted_count % 1000 == 0:
-                    conn.commit()
-                    logging.info(f"Inserted {inserted_count} reviews so far...")
-
-            except Exception as e:
-                skipped_count += 1
-                logging.warning(
-                    f"Skipped record at line {line_number}: {e}"
-                )
+    logging.info(f"Reading input file: {input_file}")
+    setup_hash_column(conn, backfill_hashes)
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Every chunk commits its data together with its checkpoint: the
+    # file checkpoint, or with workers > 1 the checkpoint of its
+    # partition, so an interrupted run resumes after its last commit
+    checkpoint = None
+    if use_checkpoint:
+        checkpoint = FileCheckpoint.load(conn, input_file)
+        if checkpoint.is_up_to_date:
+            logging.info("No new reviews since the last checkpoint")
+            release_connection(conn)
+            return
+
+    # Partitions left by an interrupted run are finished by the
+    # partitioned path, even when it now runs with one worker
+    if workers > 1 or (checkpoint and checkpoint.partitions):
+        # Each worker loads its own hash index; reviews duplicated across
+        # partitions of the same run are skipped by the merge's ON CONFLICT
+        # and counted as duplicates
+        if checkpoint:
+            partitions = checkpoint.partition_checkpoints(workers)
+            with conn.cursor() as cursor:
+                checkpoint.start_partitions(cursor, partitions)
+            conn.commit()
+            tasks = [
+                (input_file, partition.committed_offset, partition.range_end, mode, chunk_rows,
+                 quarantine_file, dedup, partition)
+                for partition in partitions
+            ]
+        else:
+            tasks = [
+                (input_file, start, end, mode, chunk_rows, quarantine_file, dedup)
+                for start, end in split_line_ranges(input_file, workers)
+            ]
+        stats = run_partitioned(ingest_partition, tasks, DB_CONFIG, workers)
+
+        if stats.get("failed_partitions"):
+            logging.error(f"{stats['failed_partitions']} partitions failed")
+            if checkpoint:
+                logging.warning("Checkpoint not advanced; failed partitions resume on the next run")
+        elif checkpoint:
+            checkpoint.observe(stats.get("watermark"))
+            with conn.cursor() as cursor:
+                checkpoint.finish_partitions(cursor)
+            conn.commit()
+    else:
+        if checkpoint:
+            lines = checkpoint.lines()
+        else:
+            lines = RangeLineReader(input_file, 0, os.path.getsize(input_file))
+        hash_index = ContentHashIndex.load(conn) if dedup else None
+        stats = ingest_lines(
+            conn, lines, mode, chunk_rows, checkpoint, quarantine_file, hash_index
+        )
+
+    release_connection(conn)
 
     logging.info("Ingestion completed successfully")
-    logging.info(f"Total inserted: {inserted_count}")
-    logging.info(f"Total skipped: {skipped_count}")
+    logging.info(f"Total inserted: {stats.get('inserted', 0)}")
+    logging.info(f"Total duplicates: {stats.get('duplicates', 0)}")
+    logging.info(f"Total skipped: {stats.get('skipped', 0)}")
+    if checkpoint:
+        logging.info(f"Review time watermark: {checkpoint.watermark}")
+
+# --------------------------------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingest Amazon reviews into PostgreSQL")
+    parser.add_argument(
+        "--input", "--input-file", default=INPUT_FILE, help="Path to the reviews JSONL file"
+    )
+    parser.add_argument(
+        "--mode", choices=["copy", "row"], default="copy",
+        help="copy: chunked COPY FROM STDIN through a staging table (default), "
+             "row: one INSERT per review"
+    )
+    parser.add_argument(
+        "--chunk-rows", type=int, default=COPY_CHUNK_ROWS,
+        help="Reviews per COPY chunk in copy mode"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Worker processes; >1 splits the file into line-aligned byte ranges"
+    )
+    parser.add_argument(
+        "--no-checkpoint", action="store_true",
+        help="Ignore and do not update the ingest_checkpoints entry for this file"
+    )
+    parser.add_argument(
+        "--quarantine-file",
+        help="Write rejected records to this JSONL file instead of the ingest_quarantine table"
+    )
+    parser.add_argument(
+        "--no-dedup", action="store_true",
+        help="Do not preload content hashes; duplicates are then only skipped by the database"
+    )
+    parser.add_argument(
+        "--backfill-hashes", action="store_true",
+        help="Compute content_hash for existing rows that do not have one yet"
+    )
+    parser.add_argument(
+        "--sink", choices=SINK_KINDS, default="postgres",
+        help="postgres (default), or a local parquet / sqlite / duckdb target "
+             "(sequential, no checkpoint)"
+    )
+    parser.add_argument(
+        "--sink-path",
+        help="Parquet root directory or SQLite / DuckDB file for local sinks"
+    )
+    return parser.parse_args()
 
 # --------------------------------------------------
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(
+        args.input, args.mode, args.chunk_rows, args.workers,
+        not args.no_checkpoint, args.quarantine_file,
+        not args.no_dedup, args.backfill_hashes, args.sink, args.sink_path
+    )
@@ -0,0 +1,101 @@
+import json
+
+# --------------------------------------------------
+# INCREMENTAL JSON READER
+# --------------------------------------------------
+READ_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+class _BufferedDecoder:
+    """Decodes JSON values from a text file through a sliding buffer"""
+
+    def __init__(self, file, chunk_size=READ_CHUNK_SIZE):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self):
+        if self._eof:
+            return False
+        data = self._file.read(self._chunk_size)
+        if not data:
+            self._eof = True
+            return False
+        # Drop the consumed prefix so the buffer stays around one chunk
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read_more():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(
+                f"Expected one of {chars!r} but found {char or 'end of file'!r}"
+            )
+        self._pos += 1
+        return char
+
+    def decode(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._read_more():
+                    continue
+                raise
+            # A number at the buffer edge may continue in the next chunk
+            if end == len(self._buf) and self._read_more():
+                continue
+            self._pos = end
+            return value
+
+
+def iter_object_items(file, stream_keys=(), chunk_size=READ_CHUNK_SIZE):
+    """
+    Incrementally parse a top-level JSON object.
+
+    Yields (key, value) for each top-level member in document order.
+    For keys listed in stream_keys the value must be an array, and
+    (key, item) is yielded once per element instead, so the array is
+    never held in memory as a whole.
+    """
+    reader = _BufferedDecoder(file, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        key = reader.decode()
+        reader.expect(":")
+
+        if key in stream_keys:
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield key, reader.decode()
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            yield key, reader.decode()
+
+        if reader.expect(",}") == "}":
+            return
@@ -1,254 +1,368 @@
+import logging
+import time
+
 from prefect import flow, task
+from prefect.artifacts import create_markdown_artifact, create_table_artifact
 from prefect.logging import get_run_logger
-import subprocess
-import os
+
+from db import close_pool, get_connection, release_connection
+from stage_cache import TABLE_PREFIX, StageCache, is_file_artifact
+from stage_graph import Stage, StageGraph
+from stage_runner import LineClassifier, StageUsage, format_usage, run_command
+from stage_workers import (
+    artifact_path, close_worker_pool, make_artifact_dir, remove_artifact_dir, run_warm_stage
+)
+
+# ----------------------------
+# Define Stages
+# ----------------------------
+# Each stage declares the artifacts it reads and writes; the flow
+# derives the run order from them. "table:<name>" artifacts are PostgreSQL tables,
+# artifacts with a directory part are files, the rest are in-memory
+# artifacts of warm stages.
+
+# Raw inputs of the ingest stages, passed to the scripts so the files
+# they read are the ones the stage cache hashes
+REVIEWS_FILE = "data/raw/reviews/electronics_reviews.json"
+PURCHASE_HISTORY_FILE = "data/raw/transactions/purchase_history.csv"
+PRODUCT_POPULARITY_FILE = "data/raw/external_api/product_popularity.json"
+
+STAGES = [
+    Stage(
+        name="ingest_reviews",
+        task_name="Ingest Reviews",
+        script="ingest_reviews.py",
+        inputs=[REVIEWS_FILE],
+        outputs=["table:product_reviews"],
+        start_message="Ingesting reviews into PostgreSQL...",
+        done_message="Reviews ingested",
+        params={"input_file": REVIEWS_FILE}
+    ),
+    Stage(
+        name="ingest_purchase_history",
+        task_name="Ingest Purchase History",
+        script="ingest_purchase_history.py",
+        inputs=[PURCHASE_HISTORY_FILE],
+        outputs=["table:purchase_history"],
+        start_message="Ingesting purchase history into PostgreSQL...",
+        done_message="Purchase history ingested",
+        params={"input_file": PURCHASE_HISTORY_FILE}
+    ),
+    Stage(
+        name="ingest_product_popularity",
+        task_name="Ingest Product Popularity",
+        script="ingest_product_popularity.py",
+        inputs=[PRODUCT_POPULARITY_FILE],
+        outputs=["table:product_popularity"],
+        start_message="Ingesting product popularity into PostgreSQL...",
+        done_message="Product popularity ingested",
+        params={"input_file": PRODUCT_POPULARITY_FILE}
+    ),
+    Stage(
+        name="merge_data",
+        task_name="Merge Data",
+        script="src/merge_data.py",
+        inputs=["table:product_reviews", "table:purchase_history", "table:product_popularity"],
+        outputs=["merged_data"],
+        start_message="Merging data from PostgreSQL...",
+        done_message="Merged data saved"
+    ),
+    Stage(
+        name="data_validation",
+        task_name="Validate Data",
+        script="src/data_validation.py",
+        inputs=["merged_data"],
+        outputs=["validation_report"],
+        start_message="Validating merged data...",
+        done_message="Data validation passed"
+    ),
+    Stage(
+        name="data_profiling",
+        task_name="Profile Data",
+        script="src/data_profiling.py",
+        inputs=["merged_data"],
+        outputs=["profiling_report"],
+        start_message="Profiling merged data...",
+        done_message="Data profiling completed"
+    ),
+    Stage(
+        name="data_processing",
+        task_name="Preprocess Data",
+        script="src/data_processing.py",
+        # Only preprocess data that passed validation
+        inputs=["merged_data", "validation_report"],
+        outputs=["data/processed/final_interactions.csv"],
+        start_message="Preprocessing data...",
+        done_message="Data preprocessing completed"
+    ),
+    Stage(
+        name="feature_engineering",
+        task_name="Engineer Features",
+        script="src/feature_engineering.py",
+        inputs=["data/processed/final_interactions.csv"],
+        outputs=["data/processed/feature_engineered_data.csv"],
+        start_message="Engineering features...",
+        done_message="Features engineered"
+    ),
+    Stage(
+        name="feature_store_creation",
+        task_name="Create Feature Store",
+        script="src/feature_store_creation.py",
+        inputs=["data/processed/feature_engineered_data.csv"],
+        outputs=["feature_store"],
+        start_message="Creating versioned feature store...",
+        done_message="Feature store created"
+    ),
+    Stage(
+        name="train_model",
+        task_name="Train Model",
+        script="src/train_model.py",
+        inputs=["feature_store"],
+        outputs=["recommendation_model"],
+        start_message="Training recommendation model...",
+        done_message="Model trained and saved"
+    ),
+]
+
+PIPELINE_GRAPH = StageGraph(STAGES)
+
+# "subprocess": fresh python process per stage, fully isolated
+# "warm": stage entry functions run in long-lived worker processes
+EXECUTION_MODES = ("subprocess", "warm")
+
+# Enough warm workers for the widest level of the graph
+STAGE_WORKERS = max(len(names) for names in PIPELINE_GRAPH.levels())
 
 # ----------------------------
 # Define Tasks
 # ----------------------------
 
-@task(name="Ingest Reviews")
-def ingest_reviews():
-    logger = get_run_logger()
-    logger.info("Ingesting reviews into PostgreSQL...")
-    result = subprocess.run(
-        ["python", "ingest_reviews.py"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[ingest_reviews] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[ingest_reviews] {line}")
-    if result.returncode != 0:
-        raise Exception("Reviews ingestion failed")
-    logger.info("Reviews ingested")
-
-@task(name="Ingest Purchase History")
-def ingest_purchase_history():
-    logger = get_run_logger()
-    logger.info("Ingesting purchase history into PostgreSQL...")
-    result = subprocess.run(
-        ["python", "ingest_purchase_history.py"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[ingest_purchase_history] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[ingest_purchase_history] {line}")
-    if result.returncode != 0:
-        raise Exception("Purchase history ingestion failed")
-    logger.info("Purchase history ingested")
-
-@task(name="Ingest Product Popularity")
-def ingest_product_popularity():
-    logger = get_run_logger()
-    logger.info("Ingesting product popularity into PostgreSQL...")
-    result = subprocess.run(
-        ["python", "ingest_product_popularity.py"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[ingest_product_popularity] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[ingest_product_popularity] {line}")
-    if result.returncode != 0:
-        raise Exception("Product popularity ingestion failed")
-    logger.info("Product popularity ingested")
-
-@task(name="Merge Data")
-def merge_data():
-    logger = get_run_logger()
-    logger.info("Merging data from PostgreSQL...")
-    result = subprocess.run(
-        ["python", "src/merge_data.py"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[merge_data] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[merge_data] {line}")
-    if result.returncode != 0:
-        raise Exception("Data merge failed")
-    logger.info("Merged data saved")
-
-@task(name="Validate Data")
-def validate_data():
-    logger = get_run_logger()
-    logger.info("Validating merged data...")
-    result = subprocess.run(
-        ["python", "src/data_validation.py"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[data_validation] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[data_validation] {line}")
-    if result.returncode != 0:
-        raise Exception("Data validation failed")
-    logger.info("Data validation passed")
-
-@task(name="Profile Data")
-def profile_data():
-    logger = get_run_logger()
-    logger.info("Profiling merged and validated data...")
-    result = subprocess.run(
-        ["python", "src/data_profiling.py"],  # Make sure this script exists
-        capture_output=True,
-        text=True
-    )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[data_profiling] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[data_profiling] {line}")
-    if result.returncode != 0:
-        raise Exception("Data profiling failed")
-    logger.info("Data profiling completed")
-
-@task(name="Preprocess Data")
-def preprocess_data():
-    logger = get_run_logger()
-    logger.info("Preprocessing data...")
-    result = subprocess.run(
-        ["python", "src/data_processing.py"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[data_processing] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[data_processing] {line}")
-    if result.returncode != 0:
-        raise Exception("Data preprocessing failed")
-    logger.info("Data preprocessing completed")
-
-@task(name="Engineer Features")
-def engineer_features():
-    logger = get_run_logger()
-    logger.info("Engineering features...")
-    result = subprocess.run(
-        ["python", "src/feature_engineering.py"],
-        capture_output=True,
-        text=True
-    )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[feature_engineering] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[feature_engineering] {line}")
-    if result.returncode != 0:
-        raise Exception("Feature engineering failed")
-    logger.info("Features engineered")
-
-@task(name="Create Feature Store")
-def create_feature_store():
+def stage_arguments(params):
+    """Command-line options for a stage's entry keyword arguments"""
+    arguments = []
+    for name, value in (params or {}).items():
+        arguments += [f"--{name.replace('_', '-')}", str(value)]
+    return arguments
+
+
+def run_stage_subprocess(stage, logger):
+    # Output is logged line by line while the stage runs, at the level
+    # the stage's own log line carries
+    def emit(level, line):
+        logger.log(level, f"[{stage.name}] {line}")
+
+    returncode, usage = run_command(["python", stage.script] + stage_arguments(stage.params), emit)
+    if returncode != 0:
+        raise Exception(f"{stage.task_name} failed")
+    return usage
+
+
+def run_stage_warm(stage, logger, artifact_dir):
+    # Output is relayed from the worker and logged while the stage runs
+    classify = LineClassifier(logging.INFO)
+
+    def emit(line):
+        if line:
+            logger.log(classify(line), f"[{stage.name}] {line}")
+
+    started = time.perf_counter()
+    try:
+        cpu_seconds, peak_rss_mb = run_warm_stage(
+            STAGE_WORKERS, emit, stage.script, stage.entry, stage.inputs, stage.outputs,
+            artifact_dir, stage.params
+        )
+    except Exception as e:
+        logger.error(f"[{stage.name}] {e}")
+        raise Exception(f"{stage.task_name} failed") from e
+    return StageUsage(time.perf_counter() - started, cpu_seconds, peak_rss_mb)
+
+
+@task
+def run_stage(stage, execution="subprocess", artifact_dir=None):
+    """Run one stage; returns its StageUsage"""
     logger = get_run_logger()
-    logger.info("Creating versioned feature store...")
-    result = subprocess.run(
-        ["python", "src/feature_store_creation.py"],
-        capture_output=True,
-        text=True
+    logger.info(stage.start_message)
+    if execution == "warm":
+        usage = run_stage_warm(stage, logger, artifact_dir)
+    else:
+        usage = run_stage_subprocess(stage, logger)
+    logger.info(f"{stage.done_message} ({format_usage(usage)})")
+    return usage
+
+
+def output_path(artifact, artifact_dir):
+    """File holding an artifact, or None for database tables"""
+    if is_file_artifact(artifact):
+        return artifact
+    if artifact_dir and not artifact.startswith(TABLE_PREFIX):
+        return artifact_path(artifact_dir, artifact)
+    return None
+
+
+def table_exists(table):
+    """Whether a stage's output table is in PostgreSQL; False if it cannot be checked"""
+    try:
+        conn = get_connection()
+    except Exception as e:
+        logging.warning(f"Cannot check table {table}: {e}")
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", (table,))
+            return cursor.fetchone()[0] is not None
+    finally:
+        release_connection(conn)
+
+
+def plan_cached_stages(graph, cache, execution, artifact_dir, logger):
+    """Cache keys of every stage, and the stages restored from the cache instead of run"""
+    def path_for(artifact):
+        return output_path(artifact, artifact_dir)
+
+    keys = {}
+    cached = set()
+    for name in graph.order:
+        stage = graph.stages[name]
+        keys[name] = cache.stage_key(stage, keys, graph.producers, execution)
+        record = cache.lookup(name, keys[name], table_exists, path_for)
+        if record:
+            restored = cache.restore(record, path_for)
+            cached.add(name)
+            logger.info(
+                f"[{name}] unchanged, skipping"
+                + (f" (restored {', '.join(restored)})" if restored else "")
+            )
+    # Stages open their own connections
+    close_pool()
+    return keys, cached
+
+
+def publish_stage_report(graph, usages, cached, critical_path, wall_time):
+    """Per-stage resource usage and the critical path as Prefect artifacts"""
+    def rounded(value, digits):
+        return round(value, digits) if value is not None else None
+
+    rows = []
+    for name in graph.order:
+        usage = usages.get(name)
+        rows.append({
+            "stage": name,
+            "status": "cached" if name in cached else "ran",
+            "wall_seconds": rounded(usage.wall_seconds, 2) if usage else 0.0,
+            "cpu_seconds": rounded(usage.cpu_seconds, 2) if usage else None,
+            "peak_rss_mb": rounded(usage.peak_rss_mb, 1) if usage else None,
+            "critical_path": name in critical_path,
+        })
+    create_table_artifact(
+        key="pipeline-stage-resources",
+        table=rows,
+        description="Wall time, CPU time and peak RSS of each pipeline stage"
     )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[feature_store_creation] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[feature_store_creation] {line}")
-    if result.returncode != 0:
-        raise Exception("Feature store creation failed")
-    logger.info("Feature store created")
-
-@task(name="Train Model")
-def train_model():
-    logger = get_run_logger()
-    logger.info("Training recommendation model...")
-    result = subprocess.run(
-        ["python", "src/train_model.py"],
-        capture_output=True,
-        text=True
+    create_markdown_artifact(
+        key="pipeline-critical-path",
+        markdown=(
+            f"**Critical path:** {' -> '.join(critical_path)}\n\n"
+            f"**Pipeline wall time:** {wall_time:.1f}s"
+        ),
+        description="Longest chain of dependent stages in this run"
     )
-    if result.stdout:
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                logger.info(f"[train_model] {line}")
-    if result.stderr:
-        for line in result.stderr.strip().split('\n'):
-            if line:
-                logger.error(f"[train_model] {line}")
-    if result.returncode != 0:
-        raise Exception("Model training failed")
-    logger.info("Model trained and saved")
 
 # ----------------------------
-# Define Flow with Sequential Dependencies
+# Define Flow from the Stage Graph
 # ----------------------------
 
 @flow(name="Core Recommendation Pipeline", log_prints=True)
-def recommendation_pipeline():
+def recommendation_pipeline(execution: str = "subprocess", use_cache: bool = True):
     logger = get_run_logger()
+    if execution not in EXECUTION_MODES:
+        raise ValueError(f"execution must be one of {EXECUTION_MODES}")
     logger.info("============================================================")
     logger.info("Starting Core Recommendation Pipeline (Ingest -> Model)")
     logger.info("============================================================")
 
-    # Ingestion phase
-    reviews_task = ingest_reviews.submit()
-    purchase_task = ingest_purchase_history.submit()
-    popularity_task = ingest_product_popularity.submit()
+    graph = PIPELINE_GRAPH
+    for level, names in enumerate(graph.levels(), 1):
+        logger.info(f"Level {level}: {', '.join(names)}")
 
-    # Wait for all ingestion to complete before merging
-    merge_task = merge_data.submit(wait_for=[reviews_task, purchase_task, popularity_task])
+    # Warm stages hand in-memory artifacts over through this directory
+    artifact_dir = make_artifact_dir() if execution == "warm" else None
 
-    # Validation and preprocessing
-    validate_task = validate_data.submit()
-    profile_task = profile_data.submit()
-    preprocess_task = preprocess_data.submit()
-    engineer_task = engineer_features.submit()
-    feature_store_task = create_feature_store.submit()
-    train_task = train_model.submit()
+    cache = StageCache() if use_cache else None
+    started = time.perf_counter()
+    try:
+        # Stages whose code and inputs are unchanged since their last
+        # successful run are skipped
+        keys, cached = (
+            plan_cached_stages(graph, cache, execution, artifact_dir, logger) if cache else ({}, set())
+        )
+        usages = {}
 
+        # Every stage starts as soon as the producers of its inputs finish,
+        # so independent stages (the three ingests; validation and
+        # profiling) run side by side
+        futures = {}
+        for name in graph.order:
+            if name in cached:
+                continue
+            stage = graph.stages[name]
+            futures[name] = run_stage.with_options(name=stage.task_name).submit(
+                stage, execution, artifact_dir,
+                wait_for=[futures[dep] for dep in graph.dependencies[name] if dep in futures]
+            )
+        # Each successful stage is recorded (and the index written) as
+        # soon as its result is in, even if another stage failed
+        error = None
+        for name, future in futures.items():
+            try:
+                usages[name] = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if cache and keys[name]:
+                cache.save(name, keys[name], {
+                    artifact: output_path(artifact, artifact_dir)
+                    for artifact in graph.stages[name].outputs
+                })
+                cache.flush()
+        if error:
+            raise error
+    finally:
+        if cache:
+            cache.flush()
+            cache.close()
+        if execution == "warm":
+            close_worker_pool()
+        if artifact_dir:
+            remove_artifact_dir(artifact_dir)
+    wall_time = time.perf_counter() - started
+
+    durations = {name: usage.wall_seconds for name, usage in usages.items()}
+    path, critical_time = graph.critical_path(durations)
+    logger.info(
+        "Critical path: "
+        + " -> ".join(f"{name} ({durations.get(name, 0.0):.1f}s)" for name in path)
+    )
+    logger.info(f"Critical path time: {critical_time:.1f}s, pipeline wall time: {wall_time:.1f}s")
+    publish_stage_report(graph, usages, cached, path, wall_time)
     logger.info("Pipeline completed successfully!")
 
+
 # ----------------------------
 # Run
 # ----------------------------
 
 if __name__ == "__main__":
-    recommendation_pipeline()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the core recommendation pipeline")
+    parser.add_argument(
+        "--execution", choices=EXECUTION_MODES, default="subprocess",
+        help="subprocess (default): one python process per stage; "
+             "warm: stage entry functions in long-lived worker processes"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Run every stage even if its inputs are unchanged since the last successful run"
+    )
+    args = parser.parse_args()
+    recommendation_pipeline(args.execution, not args.no_cache)
@@ -0,0 +1,174 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from db import get_connection
+
+# --------------------------------------------------
+# PARTITIONED INGESTION DRIVER
+# --------------------------------------------------
+# Shared by ingest_reviews, ingest_purchase_history and
+# ingest_product_popularity. Each worker process owns one connection.
+
+_worker_conn = None
+_worker_db_config = None
+
+# --------------------------------------------------
+def split_line_ranges(path, partitions, skip_header=False, start=None, end=None):
+    """
+    Split a line-oriented file (JSONL / CSV) into byte ranges.
+
+    Every range starts at the beginning of a line and ends right after
+    a newline (or at EOF), so no record is split between partitions.
+    `start` / `end` restrict the split to part of the file, e.g. the
+    tail after a checkpoint; `start` must be a line start.
+    Returns a list of (start, end) offsets; the list may be shorter
+    than `partitions` for small files.
+    """
+    size = os.path.getsize(path) if end is None else end
+    with open(path, "rb") as f:
+        if start is None:
+            start = 0
+            if skip_header:
+                f.readline()
+                start = f.tell()
+
+        boundaries = [start]
+        for i in range(1, partitions):
+            target = start + (size - start) * i // partitions
+            if target <= boundaries[-1]:
+                continue
+            # Reading from target - 1 keeps a boundary that already
+            # sits on a line start instead of skipping that line
+            f.seek(target - 1)
+            f.readline()
+            offset = f.tell()
+            if boundaries[-1] < offset < size:
+                boundaries.append(offset)
+        boundaries.append(size)
+
+    return [
+        (boundaries[i], boundaries[i + 1])
+        for i in range(len(boundaries) - 1)
+        if boundaries[i] < boundaries[i + 1]
+    ]
+
+
+class RangeLineReader:
+    """
+    Iterates the decoded lines that start inside [start, end).
+
+    `position` is the byte offset just past the last line handed out,
+    which is what a checkpoint records as the committed offset.
+    """
+
+    def __init__(self, path, start, end, encoding="utf-8"):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.encoding = encoding
+        self.position = start
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            f.seek(self.start)
+            self.position = self.start
+            while self.position < self.end:
+                line = f.readline()
+                if not line:
+                    break
+                self.position += len(line)
+                yield line.decode(self.encoding)
+
+
+def read_header(path, encoding="utf-8"):
+    with open(path, "r", encoding=encoding, newline="") as f:
+        return f.readline()
+
+# --------------------------------------------------
+def init_worker(db_config):
+    """Process pool initializer: remember the DB config for this process"""
+    global _worker_db_config
+    _worker_db_config = db_config
+
+
+def worker_connection():
+    """Return this worker process's connection, opening it on first use"""
+    global _worker_conn
+    if _worker_conn is None or _worker_conn.closed:
+        _worker_conn = get_connection(_worker_db_config)
+    return _worker_conn
+
+# --------------------------------------------------
+def merge_counts(totals, counts):
+    """Add a task's counters into totals; "watermark" keeps the maximum"""
+    for key, value in counts.items():
+        if key == "watermark":
+            if value is not None and (totals.get(key) is None or value > totals[key]):
+                totals[key] = value
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def run_partitioned(task, partitions, db_config, workers):
+    """
+    Run task(*args) for every args tuple in `partitions` on a process pool.
+
+    Each task must return a dict of counters. Per-partition results are
+    logged as they complete and the summed counters are returned.
+    """
+    totals = {}
+    logging.info(f"Running {len(partitions)} partitions on {workers} workers")
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(db_config,)
+    ) as pool:
+        futures = {pool.submit(task, *args): index for index, args in enumerate(partitions)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                counts = future.result()
+            except Exception as e:
+                logging.error(f"Partition {index} failed: {e}")
+                totals["failed_partitions"] = totals.get("failed_partitions", 0) + 1
+                continue
+
+            logging.info(f"Partition {index} done: {counts}")
+            merge_counts(totals, counts)
+
+    return totals
+
+
+def run_batched(task, batches, db_config, workers, max_pending=None):
+    """
+    Like run_partitioned, but for a lazily produced stream of task args.
+
+    At most `max_pending` tasks are queued at once (default 2 per
+    worker), so a streaming producer never runs far ahead of the pool.
+    """
+    max_pending = max_pending or workers * 2
+    totals = {}
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            try:
+                counts = future.result()
+            except Exception as e:
+                logging.error(f"Batch failed: {e}")
+                totals["failed_batches"] = totals.get("failed_batches", 0) + 1
+                continue
+            merge_counts(totals, counts)
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(db_config,)
+    ) as pool:
+        for args in batches:
+            if len(pending) >= max_pending:
+                done = next(as_completed(pending))
+                pending.discard(done)
+                collect([done])
+            pending.add(pool.submit(task, *args))
+        collect(as_completed(pending))
+
+    return totals
@@ -0,0 +1,323 @@
+import argparse
+import base64
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import sys
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from json_stream import iter_object_items
+
+# --------------------------------------------------
+# LOCAL POPULARITY API
+# --------------------------------------------------
+# Serves a popularity export from generate_external_api.py (json,
+# ndjson, ndjson.gz, ndjson.zst or parquet) the way a remote popularity
+# API would, so the ingest can be measured and tuned against API
+# latency without network access:
+#   GET /v1/popularity/metadata
+#   GET /v1/popularity/products?cursor=<cursor>&limit=<n>
+# Responses carry ETags derived from the file contents and honour
+# If-None-Match. Connections are HTTP/1.1 keep-alive.
+
+DEFAULT_INPUT_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "data", "raw", "external_api", "product_popularity.json"
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+METADATA_PATH = "/v1/popularity/metadata"
+PRODUCTS_PATH = "/v1/popularity/products"
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Export formats by file suffix, as written by generate_external_api.py
+EXPORT_SUFFIXES = (".json", ".ndjson", ".ndjson.gz", ".ndjson.zst", ".parquet")
+
+
+# --------------------------------------------------
+def encode_cursor(offset):
+    """Cursor pointing at the product with this offset in the dataset"""
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        kind, offset = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":")
+        if kind != "offset" or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def etag_version(etag):
+    """Dataset version an ETag was issued for"""
+    return etag.strip('"').split("-")[0]
+
+
+def page_cursors(total_products, page_size):
+    """Cursors of every page, so clients can fetch pages concurrently"""
+    return [encode_cursor(offset) for offset in range(0, total_products, page_size)]
+
+
+# --------------------------------------------------
+def export_suffix(path):
+    """The EXPORT_SUFFIXES entry of path; ValueError for any other file"""
+    name = path.lower()
+    # Longest first, so .ndjson.gz is not taken for a plain suffix
+    for suffix in sorted(EXPORT_SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return suffix
+    raise ValueError(
+        f"Unsupported popularity export {path}: expected one of {', '.join(EXPORT_SUFFIXES)}"
+    )
+
+
+def open_ndjson(path, suffix):
+    if suffix == ".ndjson.gz":
+        # Reads every gzip member of a chunked export
+        return gzip.open(path, "rt", encoding="utf-8")
+    if suffix == ".ndjson.zst":
+        # zstandard is only needed for .ndjson.zst input
+        import zstandard
+
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True
+        )
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_export_records(path):
+    """
+    Stream ("metadata", dict) and ("products", product) pairs from an
+    export in any of the EXPORT_SUFFIXES formats.
+    """
+    suffix = export_suffix(path)
+    if suffix == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            yield from iter_object_items(f, stream_keys=("products",))
+    elif suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        metadata = (parquet.schema_arrow.metadata or {}).get(b"popularity_metadata")
+        yield "metadata", json.loads(metadata) if metadata else {}
+        for batch in parquet.iter_batches():
+            for product in batch.to_pylist():
+                yield "products", product
+    else:
+        with open_ndjson(path, suffix) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if list(record) == ["metadata"]:
+                    yield "metadata", record["metadata"]
+                else:
+                    yield "products", record
+
+
+class PopularityDataset:
+    """
+    A popularity export held in memory, with a content-derived version.
+
+    Products are kept as their encoded JSON, each followed by a comma,
+    in one buffer with an array of offsets: a page is a slice of that
+    buffer, and a product costs its JSON size instead of a dict.
+    """
+
+    def __init__(self, path):
+        export_suffix(path)
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        self.version = digest.hexdigest()[:16]
+
+        self.metadata = {}
+        self._data = bytearray()
+        self._offsets = array("q", [0])
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        for key, value in iter_export_records(path):
+            if key == "metadata":
+                self.metadata = value
+            elif key == "products":
+                self._data += encode(value).encode("utf-8") + b","
+                self._offsets.append(len(self._data))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def products_json(self, start, end):
+        """JSON array of the products in [start, end)"""
+        end = min(end, len(self))
+        if start >= end:
+            return b"[]"
+        # Drop the comma after the last product of the page
+        return b"[" + self._data[self._offsets[start]:self._offsets[end] - 1] + b"]"
+
+    def etag(self, *parts):
+        return '"' + "-".join([self.version, *map(str, parts)]) + '"'
+
+
+class PopularityAPIHandler(BaseHTTPRequestHandler):
+    # Keep-alive needs HTTP/1.1 and a Content-Length on every response
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.simulate_latency()
+
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == METADATA_PATH:
+                etag, body = self.metadata_response()
+            elif url.path == PRODUCTS_PATH:
+                etag, body = self.products_response(params)
+            else:
+                self.send_json(404, {"error": f"Unknown path: {url.path}"})
+                return
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_json(200, body, etag)
+
+    def metadata_response(self):
+        dataset = self.server.dataset
+        body = {
+            "metadata": dataset.metadata,
+            "total_products": len(dataset),
+            "max_page_size": MAX_PAGE_SIZE,
+        }
+        return dataset.etag("metadata"), body
+
+    def products_response(self, params):
+        dataset = self.server.dataset
+        offset = decode_cursor(params.get("cursor"))
+        limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+        end = min(offset + limit, len(dataset))
+        next_cursor = encode_cursor(end) if end < len(dataset) else None
+        # Products are already encoded; only the envelope is built here
+        body = (
+            b'{"products":' + dataset.products_json(offset, end)
+            + b',"next_cursor":' + json.dumps(next_cursor).encode("ascii") + b"}"
+        )
+        return dataset.etag(offset, limit), body
+
+    def send_json(self, status, body, etag=None):
+        """Send body, a JSON-serialisable object or already encoded JSON bytes"""
+        data = body if isinstance(body, (bytes, bytearray)) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            logging.info(f"{self.address_string()} {format % args}")
+
+
+class PopularityAPIServer(ThreadingHTTPServer):
+    """One thread per connection, so slow responses overlap like a real API"""
+
+    daemon_threads = True
+
+    def __init__(self, address, dataset, latency_ms=0, jitter_ms=0, verbose=False):
+        super().__init__(address, PopularityAPIHandler)
+        self.dataset = dataset
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.verbose = verbose
+
+    def simulate_latency(self):
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections mid-response are routine
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def make_server(input_file=DEFAULT_INPUT_FILE, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                latency_ms=0, jitter_ms=0, verbose=False):
+    dataset = PopularityDataset(input_file)
+    logging.info(f"Loaded {len(dataset)} products from {input_file} (version {dataset.version})")
+    return PopularityAPIServer((host, port), dataset, latency_ms, jitter_ms, verbose)
+
+
+# --------------------------------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve a product popularity export as a paginated HTTP API")
+    parser.add_argument(
+        "--input", default=DEFAULT_INPUT_FILE,
+        help="Popularity export: .json, .ndjson, .ndjson.gz, .ndjson.zst or .parquet"
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--latency-ms", type=float, default=0,
+        help="Delay added to every response"
+    )
+    parser.add_argument(
+        "--jitter-ms", type=float, default=0,
+        help="Extra random delay of up to this many milliseconds per response"
+    )
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s"
+    )
+    args = parse_args()
+    try:
+        server = make_server(
+            args.input, args.host, args.port, args.latency_ms, args.jitter_ms, args.verbose
+        )
+    except ValueError as e:
+        logging.error(e)
+        sys.exit(1)
+    logging.info(f"Serving popularity API on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+from collections import deque
+from urllib.parse import urlencode, urlsplit
+
+from popularity_api import DEFAULT_PAGE_SIZE, METADATA_PATH, PRODUCTS_PATH, etag_version, page_cursors
+
+# --------------------------------------------------
+# ASYNC POPULARITY API CLIENT
+# --------------------------------------------------
+# Fetches product pages from the popularity API (popularity_api.py or
+# a remote service with the same contract) with up to `concurrency`
+# requests in flight, each on its own keep-alive connection. Pages are
+# handed on in dataset order so the ingest sees the same record stream
+# as when it reads product_popularity.json.
+
+DEFAULT_CONCURRENCY = 8
+
+# Pages fetched ahead of the consumer, per connection
+PREFETCH_PER_CONNECTION = 2
+
+MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+REQUEST_TIMEOUT_SECONDS = 30
+
+
+class APIError(Exception):
+    pass
+
+
+# --------------------------------------------------
+class HTTPConnection:
+    """Minimal HTTP/1.1 GET over one keep-alive asyncio stream"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def get(self, path, headers=None):
+        """Returns (status, headers, body); reconnects if the server dropped the connection"""
+        for attempt in (1, 2):
+            if self.writer is None:
+                await self._connect()
+            try:
+                return await asyncio.wait_for(self._request(path, headers or {}), REQUEST_TIMEOUT_SECONDS)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Idle keep-alive connections may be closed server side
+                await self.close()
+                if attempt == 2:
+                    raise
+            except asyncio.TimeoutError:
+                # The response may still arrive later; never reuse the stream
+                await self.close()
+                raise
+
+    async def _request(self, path, headers):
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        length = int(response_headers.get("content-length", 0))
+        body = await self.reader.readexactly(length) if length else b""
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, body
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+class PopularityAPIClient:
+    """
+    Concurrent page fetcher with bounded parallelism:
+
+        async with PopularityAPIClient(url, concurrency=8) as client:
+            metadata = await client.fetch_metadata()
+            async for products in client.iter_pages(metadata["total_products"]):
+                ...
+    """
+
+    def __init__(self, base_url, concurrency=DEFAULT_CONCURRENCY, page_size=DEFAULT_PAGE_SIZE):
+        url = urlsplit(base_url)
+        if url.scheme != "http":
+            raise ValueError(f"Only http:// API URLs are supported: {base_url}")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip("/")
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.version_etag = None
+        self._connections = None
+        self._all_connections = []
+
+    async def __aenter__(self):
+        self._connections = asyncio.Queue()
+        for _ in range(self.concurrency):
+            connection = HTTPConnection(self.host, self.port)
+            self._all_connections.append(connection)
+            self._connections.put_nowait(connection)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        for connection in self._all_connections:
+            await connection.close()
+
+    async def get_json(self, path, params=None, etag=None):
+        """GET path; returns (etag, body), with body None when etag is still current"""
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        headers = {"If-None-Match": etag} if etag else {}
+
+        connection = await self._connections.get()
+        try:
+            for attempt in range(1, MAX_RETRIES + 1):
+                status, response_headers, body = await connection.get(self.prefix + path, headers)
+                if status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    break
+                logging.warning(f"GET {path} returned {status}, retrying")
+                await asyncio.sleep(RETRY_BACKOFF_SECONDS * attempt)
+        finally:
+            self._connections.put_nowait(connection)
+
+        if status == 304:
+            return etag, None
+        if status != 200:
+            raise APIError(f"GET {path} failed with {status}: {body[:200]!r}")
+        return response_headers.get("etag"), json.loads(body)
+
+    async def fetch_metadata(self, etag=None):
+        """Metadata response, or None when it still matches etag"""
+        response_etag, body = await self.get_json(METADATA_PATH, etag=etag)
+        self.version_etag = response_etag
+        return body
+
+    async def fetch_page(self, cursor):
+        etag, body = await self.get_json(PRODUCTS_PATH, {"cursor": cursor, "limit": self.page_size})
+        self._check_version(etag)
+        return body
+
+    def _check_version(self, etag):
+        # A different dataset version means the data changed between
+        # requests and the pages would mix two snapshots
+        if self.version_etag and etag and etag_version(etag) != etag_version(self.version_etag):
+            raise APIError("Popularity data changed while it was being fetched")
+
+    async def iter_pages(self, total_products):
+        """Yield product lists page by page, in order, fetching ahead concurrently"""
+        cursors = iter(page_cursors(total_products, self.page_size))
+        window = self.concurrency * PREFETCH_PER_CONNECTION
+        pending = deque()
+        try:
+            for cursor in cursors:
+                pending.append(asyncio.ensure_future(self.fetch_page(cursor)))
+                if len(pending) >= window:
+                    yield (await pending.popleft())["products"]
+            while pending:
+                yield (await pending.popleft())["products"]
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+# --------------------------------------------------
+async def fetch_popularity_records(base_url, put, concurrency, page_size):
+    """Fetch metadata and every page, passing them to put until it returns False"""
+    async with PopularityAPIClient(base_url, concurrency, page_size) as client:
+        response = await client.fetch_metadata()
+        logging.info(
+            f"Fetching {response['total_products']} products from {base_url} "
+            f"(ETag {client.version_etag}, {concurrency} connections)"
+        )
+        if not await asyncio.to_thread(put, ("metadata", response["metadata"])):
+            return
+        async for products in client.iter_pages(response["total_products"]):
+            if not await asyncio.to_thread(put, ("products", products)):
+                return
+
+
+def iter_api_records(base_url, concurrency=DEFAULT_CONCURRENCY, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Same ("metadata", dict) / ("products", dict) stream as reading
+    product_popularity.json, fetched from the API on a background event
+    loop. A bounded queue keeps the fetcher at most a few pages ahead
+    of the database writes.
+    """
+    pages = queue.Queue(maxsize=concurrency * PREFETCH_PER_CONNECTION)
+    done = object()
+    stop = threading.Event()
+    errors = []
+
+    def put(item):
+        # Give up once the consumer has stopped reading
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run():
+        try:
+            asyncio.run(fetch_popularity_records(base_url, put, concurrency, page_size))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(done)
+
+    fetcher = threading.Thread(target=run, name="popularity-api-fetcher", daemon=True)
+    fetcher.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                break
+            key, value = item
+            if key == "metadata":
+                yield key, value
+            else:
+                for product in value:
+                    yield key, product
+    finally:
+        stop.set()
+    fetcher.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,170 @@
+import heapq
+from itertools import count
+
+import numpy as np
+
+# --------------------------------------------------
+# POPULARITY OUTPUT STATISTICS
+# --------------------------------------------------
+# Top-K / bottom-K and quantiles without sorting every product.
+# Orderings match a stable sort by score (descending): ties keep
+# the order in which products were loaded or streamed.
+
+# popularity_score is rounded to 2 decimals on a 0-100 scale, so a
+# histogram with one bin per representable score gives exact quantiles
+SCORE_MIN = 0.0
+SCORE_MAX = 100.0
+SCORE_RESOLUTION = 0.01
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+# --------------------------------------------------
+def top_k_indices(values, k):
+    """Indices of the k largest values, best first (np.partition, no full sort)."""
+    values = np.asarray(values)
+    if k >= len(values):
+        return np.argsort(-values, kind='stable')
+    kth = np.partition(values, len(values) - k)[len(values) - k]
+    # Every value tied with the k-th is a candidate, so ties resolve by index
+    candidates = np.flatnonzero(values >= kth)
+    order = np.argsort(-values[candidates], kind='stable')
+    return candidates[order[:k]]
+
+
+def bottom_k_indices(values, k):
+    """Indices of the k smallest values, in the same best-first order as top_k_indices."""
+    values = np.asarray(values)
+    if k >= len(values):
+        return np.argsort(-values, kind='stable')
+    kth = np.partition(values, k - 1)[k - 1]
+    candidates = np.flatnonzero(values <= kth)
+    order = np.argsort(-values[candidates], kind='stable')
+    return candidates[order[-k:]]
+
+
+# --------------------------------------------------
+class StreamingTopK:
+    """
+    Keeps the k best (largest=True) or worst items of a stream in a heap.
+
+    items() returns them best first; among equal values the earlier
+    item ranks higher, as in a stable descending sort of the stream.
+    """
+
+    def __init__(self, k, largest=True):
+        self.k = k
+        self.largest = largest
+        self._heap = []
+        self._sequence = count()
+
+    def push(self, value, item):
+        position = next(self._sequence)
+        # The heap root is the entry to evict next
+        if self.largest:
+            entry = (value, -position, item)
+        else:
+            entry = (-value, position, item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self):
+        if self.largest:
+            ranked = sorted(self._heap, key=lambda entry: (-entry[0], -entry[1]))
+        else:
+            ranked = sorted(self._heap, key=lambda entry: (entry[0], entry[1]))
+        return [entry[2] for entry in ranked]
+
+
+# --------------------------------------------------
+class ScoreHistogram:
+    """
+    One-pass, fixed-memory score summary with exact quantiles.
+
+    Values are counted in bins of SCORE_RESOLUTION between SCORE_MIN
+    and SCORE_MAX. quantile(q) returns the value at sorted index
+    int(q * count), so quantile(0.5) is sorted(scores)[len(scores) // 2].
+    """
+
+    def __init__(self, low=SCORE_MIN, high=SCORE_MAX, resolution=SCORE_RESOLUTION):
+        self.low = low
+        self.resolution = resolution
+        self.bins = np.zeros(int(round((high - low) / resolution)) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        bins = np.clip(np.rint((values - self.low) / self.resolution), 0, len(self.bins) - 1)
+        self.bins += np.bincount(bins.astype(np.int64), minlength=len(self.bins))
+        self.count += len(values)
+        self.total += float(values.sum())
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = min(int(q * self.count), self.count - 1)
+        index = int(np.searchsorted(np.cumsum(self.bins), rank, side='right'))
+        return round(self.low + index * self.resolution, 2)
+
+    def quantiles(self, qs=DEFAULT_QUANTILES):
+        return {q: self.quantile(q) for q in qs}
+
+
+# --------------------------------------------------
+class PopularitySummary:
+    """
+    Statistics over product popularity scores, fed as NumPy arrays.
+
+    Arrays can be one chunk of a longer stream: the score distribution
+    goes into a ScoreHistogram, and only each chunk's top / bottom
+    candidates (np.partition) are turned into records and pushed into
+    the StreamingTopK heaps.
+    """
+
+    def __init__(self, top=10, bottom=5):
+        self.histogram = ScoreHistogram()
+        self._top = StreamingTopK(top, largest=True)
+        self._bottom = StreamingTopK(bottom, largest=False)
+
+    def add_scores(self, scores, records_for):
+        """
+        Add an array of scores in stream order.
+
+        records_for(indices) returns the records for those indices of
+        scores, in the order given.
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        if not len(scores):
+            return self
+        self.histogram.add_many(scores)
+
+        # Pushed in index order, so ties keep their stream order
+        top = np.sort(top_k_indices(scores, self._top.k))
+        bottom = np.sort(bottom_k_indices(scores, self._bottom.k))
+        candidates = np.union1d(top, bottom)
+        records = dict(zip(candidates.tolist(), records_for(candidates)))
+        for index in top.tolist():
+            self._top.push(scores[index], records[index])
+        for index in bottom.tolist():
+            self._bottom.push(scores[index], records[index])
+        return self
+
+    def top_products(self):
+        return self._top.items()
+
+    def bottom_products(self):
+        return self._bottom.items()
@@ -0,0 +1,172 @@
+import io
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+# --------------------------------------------------
+# COLUMNAR TRANSFORM FOR PURCHASE HISTORY
+# --------------------------------------------------
+# Reads purchase_history.csv in Arrow record batches and converts whole
+# columns at once instead of calling strptime / int() / float() per row.
+
+# Bytes of CSV parsed per Arrow block
+READ_BLOCK_SIZE = 16 * 1024 * 1024
+
+SECONDS_PER_DAY = 86400
+
+OUTPUT_SCHEMA = pa.schema([
+    ("transaction_id", pa.string()),
+    ("user_id", pa.string()),
+    ("product_id", pa.string()),
+    ("transaction_date", pa.date32()),
+    ("transaction_time", pa.time32("s")),
+    ("quantity", pa.int32()),
+    ("price", pa.float64()),
+    ("rating", pa.float64()),
+])
+
+# --------------------------------------------------
+class RangeBytesReader(io.RawIOBase):
+    """Raw binary stream over bytes [start, end) of a file"""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+# --------------------------------------------------
+class DateColumnParser:
+    """
+    Parses "%m %d, %Y" date strings column-wise.
+
+    Each batch is dictionary-encoded so only its distinct strings are
+    parsed, and parsed strings are remembered across batches; the
+    reviews span a few thousand distinct days.
+    """
+
+    def __init__(self, date_format="%m %d, %Y"):
+        self.date_format = date_format
+        self._cache = {}
+
+    def _parse(self, value):
+        try:
+            return self._cache[value]
+        except KeyError:
+            try:
+                parsed = datetime.strptime(value, self.date_format).date()
+            except (TypeError, ValueError):
+                parsed = None
+            self._cache[value] = parsed
+            return parsed
+
+    def parse(self, column):
+        encoded = pc.dictionary_encode(column)
+        parsed = pa.array([self._parse(v) for v in encoded.dictionary.to_pylist()], pa.date32())
+        return pc.take(parsed, encoded.indices)
+
+
+def cast_column(column, target_type):
+    """Cast a string column; values that do not convert become null"""
+    try:
+        return pc.cast(column, target_type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        convert = float if pa.types.is_floating(target_type) else int
+        values = []
+        for value in column.to_pylist():
+            try:
+                values.append(convert(value))
+            except (TypeError, ValueError):
+                values.append(None)
+        return pa.array(values, target_type)
+
+
+def time_of_day(unix_times):
+    """UTC time of day for int64 unix timestamps, like utcfromtimestamp().time()"""
+    seconds = np.mod(unix_times.fill_null(0).to_numpy(), SECONDS_PER_DAY).astype(np.int32)
+    mask = unix_times.is_null().to_numpy(zero_copy_only=False)
+    return pa.array(seconds, pa.int32(), mask=mask).cast(pa.time32("s"))
+
+# --------------------------------------------------
+def transform_batch(raw, date_parser):
+    """
+    Convert a batch of CSV strings into OUTPUT_SCHEMA.
+
+    Returns (typed batch, mask of fully converted rows, unix times).
+    """
+    unix_times = cast_column(raw.column("transaction_time"), pa.int64())
+    columns = [
+        raw.column("transaction_id"),
+        raw.column("user_id"),
+        raw.column("product_id"),
+        date_parser.parse(raw.column("transaction_date")),
+        time_of_day(unix_times),
+        cast_column(raw.column("quantity"), pa.int32()),
+        cast_column(raw.column("price"), pa.float64()),
+        cast_column(raw.column("rating"), pa.float64()),
+    ]
+    typed = pa.RecordBatch.from_arrays(columns, schema=OUTPUT_SCHEMA)
+
+    valid = pc.is_valid(columns[3])
+    for column in columns[4:]:
+        valid = pc.and_(valid, pc.is_valid(column))
+    return typed, valid, unix_times
+
+
+def iter_typed_batches(path, start, end, fieldnames, batch_rows, reject, tracker=None):
+    """
+    Yield typed RecordBatches of at most batch_rows rows for bytes
+    [start, end) of the CSV (start must be past the header line).
+
+    Rows that fail to convert are passed to reject(row_dict, error);
+    tracker, if given, observes the highest transaction_time.
+    """
+    reader = pacsv.open_csv(
+        RangeBytesReader(path, start, end),
+        read_options=pacsv.ReadOptions(column_names=fieldnames, block_size=READ_BLOCK_SIZE),
+        convert_options=pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in fieldnames},
+            strings_can_be_null=False,
+        ),
+    )
+    date_parser = DateColumnParser()
+
+    for raw in reader:
+        typed, valid, unix_times = transform_batch(raw, date_parser)
+
+        if tracker is not None:
+            tracker.observe(pc.max(unix_times).as_py())
+
+        if not pc.all(valid).as_py():
+            invalid = pc.invert(valid)
+            for row in raw.filter(invalid).to_pylist():
+                reject(row, "Could not convert one or more columns")
+            typed = typed.filter(valid)
+
+        for offset in range(0, typed.num_rows, batch_rows):
+            yield typed.slice(offset, batch_rows)
+
+# --------------------------------------------------
+def batch_to_csv(batch):
+    """Render a typed batch as headerless CSV for COPY ... (FORMAT csv)"""
+    buffer = io.BytesIO()
+    pacsv.write_csv(batch, buffer, pacsv.WriteOptions(include_header=False))
+    buffer.seek(0)
+    return buffer
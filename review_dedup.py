@@ -0,0 +1,124 @@
+import hashlib
+import logging
+
+# --------------------------------------------------
+# CONTENT-HASH DEDUPLICATION FOR product_reviews
+# --------------------------------------------------
+# content_hash = first 16 bytes of
+#   sha256(reviewerID \x1f asin \x1f unixReviewTime \x1f sha256_hex(reviewText))
+# sha256 is used (rather than a faster hash) so PostgreSQL can compute
+# the same value when backfilling rows loaded before this column existed.
+
+HASH_BYTES = 16
+FIELD_SEPARATOR = "\x1f"
+
+# Rows fetched per round-trip when loading existing hashes
+HASH_FETCH_SIZE = 100000
+
+SETUP_HASH_COLUMN_SQL = """
+ALTER TABLE product_reviews ADD COLUMN IF NOT EXISTS content_hash BYTEA;
+CREATE UNIQUE INDEX IF NOT EXISTS product_reviews_content_hash_key
+    ON product_reviews (content_hash);
+"""
+
+# Rows that duplicate an already hashed row keep a NULL hash
+BACKFILL_HASH_SQL = """
+WITH hashed AS (
+    SELECT
+        ctid,
+        substring(sha256(convert_to(concat_ws(E'\\x1f',
+            coalesce(user_id, ''),
+            coalesce(product_id, ''),
+            coalesce(unix_review_time::text, ''),
+            encode(sha256(convert_to(coalesce(review_text, ''), 'UTF8')), 'hex')
+        ), 'UTF8')) FROM 1 FOR 16) AS content_hash
+    FROM product_reviews
+    WHERE content_hash IS NULL
+),
+ranked AS (
+    SELECT ctid, content_hash,
+           row_number() OVER (PARTITION BY content_hash ORDER BY ctid) AS copy_number
+    FROM hashed
+)
+UPDATE product_reviews r
+SET content_hash = ranked.content_hash
+FROM ranked
+WHERE r.ctid = ranked.ctid
+  AND ranked.copy_number = 1
+  AND NOT EXISTS (
+      SELECT 1 FROM product_reviews e WHERE e.content_hash = ranked.content_hash
+  );
+"""
+
+SELECT_HASHES_SQL = """
+SELECT content_hash FROM product_reviews WHERE content_hash IS NOT NULL;
+"""
+
+# --------------------------------------------------
+def review_content_hash(review):
+    """Compact identity of a review: who, what, when and a digest of the text"""
+    text_digest = hashlib.sha256((review.get("reviewText") or "").encode("utf-8")).hexdigest()
+    key = FIELD_SEPARATOR.join((
+        review.get("reviewerID") or "",
+        review.get("asin") or "",
+        "" if review.get("unixReviewTime") is None else str(review.get("unixReviewTime")),
+        text_digest,
+    ))
+    return hashlib.sha256(key.encode("utf-8")).digest()[:HASH_BYTES]
+
+
+def setup_hash_column(conn, backfill=False):
+    """Add content_hash and its unique index; optionally hash existing rows"""
+    with conn.cursor() as cursor:
+        cursor.execute(SETUP_HASH_COLUMN_SQL)
+        if backfill:
+            cursor.execute(BACKFILL_HASH_SQL)
+            logging.info(f"Backfilled content_hash for {cursor.rowcount} existing reviews")
+    conn.commit()
+
+# --------------------------------------------------
+class ContentHashIndex:
+    """
+    In-memory set of review hashes already in product_reviews.
+
+    Keys are the first 8 bytes of the content hash as an int, which
+    keeps a membership check to one set lookup. A false positive needs
+    two different reviews to collide on 64 bits; the full 16-byte hash
+    is still what the unique index enforces.
+    """
+
+    def __init__(self):
+        self._keys = set()
+
+    @staticmethod
+    def _key(content_hash):
+        return int.from_bytes(content_hash[:8], "big")
+
+    @classmethod
+    def from_hashes(cls, hashes):
+        """Index of an iterable of content hashes (bytes-like)"""
+        index = cls()
+        index._keys.update(cls._key(bytes(content_hash)) for content_hash in hashes)
+        return index
+
+    @classmethod
+    def load(cls, conn):
+        # Named cursor: hashes are streamed, not fetched in one result set
+        with conn.cursor(name="review_hashes") as cursor:
+            cursor.itersize = HASH_FETCH_SIZE
+            cursor.execute(SELECT_HASHES_SQL)
+            index = cls.from_hashes(content_hash for (content_hash,) in cursor)
+        conn.commit()
+        logging.info(f"Loaded {len(index._keys)} review hashes for deduplication")
+        return index
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add_if_new(self, content_hash):
+        """Return True and remember the hash if it has not been seen before"""
+        key = self._key(content_hash)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        return True
@@ -0,0 +1,295 @@
+import logging
+import os
+import sqlite3
+import uuid
+from collections import namedtuple
+from datetime import date, time
+
+from batch_executor import FileQuarantine
+
+# --------------------------------------------------
+# LOCAL INGESTION SINKS
+# --------------------------------------------------
+# Alternatives to PostgreSQL for the ingest scripts, so the pipeline
+# can run and be load-tested without a database server:
+#   parquet - hive-partitioned, zstd-compressed Parquet dataset (DATE
+#             partition columns are partitioned by month)
+#   sqlite  - one embedded database file (standard library only)
+#   duckdb  - embedded DuckDB file (needs the duckdb package)
+# "postgres" stays the default and keeps each script's own load path.
+
+SINK_KINDS = ("postgres", "parquet", "sqlite", "duckdb")
+
+DEFAULT_SINK_PATHS = {
+    "parquet": os.path.join("data", "parquet"),
+    "sqlite": os.path.join("data", "pipeline.sqlite"),
+    "duckdb": os.path.join("data", "pipeline.duckdb"),
+}
+
+# Rows buffered per Parquet write; each write creates one file per
+# partition value, so small writes mean many tiny files
+PARQUET_FLUSH_ROWS = 500000
+
+# A DATE partition column is bucketed into <column>_month=YYYY-MM:
+# daily partitions spread every write over hundreds of tiny files
+PARQUET_MONTH_FORMAT = "%Y-%m"
+
+PARQUET_COMPRESSION = "zstd"
+
+# Keys fetched at a time by key_values() from the embedded databases
+KEY_FETCH_ROWS = 100000
+
+# columns: (name, sql type) pairs in the order of the row tuples.
+# Types are shared by SQLite and DuckDB and mapped to Arrow for Parquet.
+TableSpec = namedtuple("TableSpec", ["name", "columns", "key", "partition_by"])
+
+
+def column_names(spec):
+    return [name for name, _ in spec.columns]
+
+
+def default_sink_path(kind):
+    return DEFAULT_SINK_PATHS[kind]
+
+# --------------------------------------------------
+class Sink:
+    """
+    Destination for the rows of one table.
+
+    write(rows) takes a list of value tuples in spec.columns order (or
+    an Arrow record batch with those columns) and returns the number of
+    rows stored. close() flushes anything still buffered.
+    key_values() yields the spec.key values already stored, so a caller
+    can skip rows an earlier run wrote.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+
+    def write(self, rows):
+        raise NotImplementedError
+
+    def key_values(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def as_tuples(rows):
+    if hasattr(rows, "to_pylist"):
+        return [tuple(row.values()) for row in rows.to_pylist()]
+    return rows
+
+# --------------------------------------------------
+class ParquetSink(Sink):
+    """
+    Appends rows to <root>/<table>/<partition>=<value>/part-*.parquet.
+
+    The partition is spec.partition_by, or <partition_by>_month
+    (YYYY-MM) when that is a DATE column; the derived column is stored
+    as the hive partition key next to the original date.
+
+    Readers such as pyarrow.dataset or DuckDB prune partitions from the
+    directory names and skip row groups by their column statistics.
+    The dataset is append-only: spec.key is not enforced, so loading
+    the same file twice stores its rows twice unless the caller skips
+    the keys from key_values().
+    """
+
+    def __init__(self, spec, root, flush_rows=PARQUET_FLUSH_ROWS):
+        # pyarrow is only needed for the parquet sink
+        import pyarrow as pa
+
+        super().__init__(spec)
+        self.path = os.path.join(root, spec.name)
+        self.flush_rows = flush_rows
+        self.schema = pa.schema([
+            (name, self._arrow_type(pa, sql_type)) for name, sql_type in spec.columns
+        ])
+        self._buffer = []
+        self._buffered_rows = 0
+        self._run_id = uuid.uuid4().hex
+        self._files_written = 0
+        self.partition_column = spec.partition_by
+        if spec.partition_by and dict(spec.columns)[spec.partition_by] == "DATE":
+            self.partition_column = f"{spec.partition_by}_month"
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def _arrow_type(pa, sql_type):
+        return {
+            "TEXT": pa.string(),
+            "INTEGER": pa.int32(),
+            "BIGINT": pa.int64(),
+            "DOUBLE": pa.float64(),
+            "DATE": pa.date32(),
+            "TIME": pa.time64("us"),
+            "BLOB": pa.binary(),
+        }[sql_type]
+
+    def _to_table(self, rows):
+        import pyarrow as pa
+
+        if hasattr(rows, "schema"):
+            return pa.Table.from_batches([rows]).cast(self.schema)
+        columns = list(zip(*rows))
+        return pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        )
+
+    def write(self, rows):
+        if not len(rows):
+            return 0
+        self._buffer.append(self._to_table(rows))
+        self._buffered_rows += len(rows)
+        if self._buffered_rows >= self.flush_rows:
+            self.flush()
+        return len(rows)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        table = pa.concat_tables(self._buffer)
+        if self.partition_column != self.spec.partition_by:
+            months = pc.strftime(table.column(self.spec.partition_by), format=PARQUET_MONTH_FORMAT)
+            table = table.append_column(self.partition_column, months)
+        pq.write_to_dataset(
+            table,
+            root_path=self.path,
+            partition_cols=[self.partition_column] if self.partition_column else None,
+            basename_template=f"part-{self._run_id}-{self._files_written}-{{i}}.parquet",
+            compression=PARQUET_COMPRESSION,
+            existing_data_behavior="overwrite_or_ignore"
+        )
+        self._files_written += 1
+        logging.info(f"Wrote {table.num_rows} rows to {self.path}")
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def close(self):
+        self.flush()
+
+    def key_values(self):
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.path, format="parquet", partitioning="hive")
+        if self.spec.key not in dataset.schema.names:
+            return
+        for batch in dataset.to_batches(columns=[self.spec.key]):
+            yield from batch.column(0).to_pylist()
+
+# --------------------------------------------------
+class EmbeddedSink(Sink):
+    """
+    Shared logic for SQLite and DuckDB: create the table on first use
+    and INSERT OR IGNORE on its key, one transaction per write.
+    """
+
+    def __init__(self, spec, conn):
+        super().__init__(spec)
+        self.conn = conn
+        columns = [f"{name} {sql_type}" for name, sql_type in spec.columns]
+        if spec.key:
+            columns.append(f"PRIMARY KEY ({spec.key})")
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {spec.name} ({', '.join(columns)})")
+        self.insert_sql = (
+            f"INSERT OR IGNORE INTO {spec.name} ({', '.join(column_names(spec))}) "
+            f"VALUES ({', '.join('?' for _ in spec.columns)})"
+        )
+
+    def key_values(self):
+        cursor = self.conn.execute(f"SELECT {self.spec.key} FROM {self.spec.name}")
+        while True:
+            rows = cursor.fetchmany(KEY_FETCH_ROWS)
+            if not rows:
+                return
+            for (value,) in rows:
+                yield value
+
+    def close(self):
+        self.conn.close()
+
+
+class SQLiteSink(EmbeddedSink):
+
+    def __init__(self, spec, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(spec, sqlite3.connect(path))
+
+    @staticmethod
+    def _adapt(value):
+        # sqlite3's default date adapters are deprecated; store ISO text
+        if isinstance(value, (date, time)):
+            return value.isoformat()
+        return value
+
+    def write(self, rows):
+        rows = as_tuples(rows)
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                self.insert_sql, [tuple(map(self._adapt, row)) for row in rows]
+            )
+        return self.conn.total_changes - before
+
+
+class DuckDBSink(EmbeddedSink):
+
+    def __init__(self, spec, path):
+        # duckdb is only needed for the duckdb sink
+        import duckdb
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(spec, duckdb.connect(path))
+        # DuckDB reports no row count for executemany; the sink is the
+        # only writer, so counting once up front is enough
+        self._rows = self._count()
+
+    def _count(self):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {self.spec.name}").fetchone()[0]
+
+    def write(self, rows):
+        rows = as_tuples(rows)
+        self.conn.execute("BEGIN TRANSACTION")
+        self.conn.executemany(self.insert_sql, rows)
+        self.conn.execute("COMMIT")
+        before, self._rows = self._rows, self._count()
+        return self._rows - before
+
+# --------------------------------------------------
+class RejectLog:
+    """Stands in for BatchExecutor.reject when there is no database to quarantine to"""
+
+    def __init__(self, source, quarantine_file=None):
+        self.source = source
+        self.quarantine = FileQuarantine(quarantine_file) if quarantine_file else None
+
+    def reject(self, record, error):
+        if self.quarantine:
+            self.quarantine.write(None, self.source, record, error)
+
+
+def open_sink(kind, spec, path=None):
+    """Open a local sink; PostgreSQL is handled by the ingest scripts themselves"""
+    path = path or default_sink_path(kind)
+    if kind == "parquet":
+        return ParquetSink(spec, path)
+    if kind == "sqlite":
+        return SQLiteSink(spec, path)
+    if kind == "duckdb":
+        return DuckDBSink(spec, path)
+    raise ValueError(f"Unknown sink: {kind}")
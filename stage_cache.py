@@ -0,0 +1,248 @@
+import ast
+import hashlib
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# --------------------------------------------------
+# CONTENT-ADDRESSED STAGE CACHE
+# --------------------------------------------------
+# A stage's cache key hashes its code (the script plus the local
+# modules it imports), its parameters, the execution mode, the
+# contents of its external input files and the keys of the stages
+# producing its other inputs. Keys are known before anything runs:
+# when a stage's key matches its last successful run, the stage is
+# skipped and its recorded output files are restored from the object
+# store. Output tables cannot be restored, so they must still exist.
+# A stage whose external input file is missing has no key and always
+# runs, as does every stage downstream of it.
+#
+#   .pipeline_cache/index.json     keys, outputs and file digests
+#   .pipeline_cache/objects/<hex>  output file contents by digest
+
+DEFAULT_CACHE_DIR = ".pipeline_cache"
+
+# Bump to invalidate every existing key
+CACHE_VERSION = 1
+
+# Files are hashed in chunks on a thread pool (hashlib releases the
+# GIL), then the chunk digests are hashed together
+HASH_CHUNK_BYTES = 64 * 1024 * 1024
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+# "table:<name>" artifacts are PostgreSQL tables: they cannot be hashed
+# or restored, only checked for existence
+TABLE_PREFIX = "table:"
+
+
+# --------------------------------------------------
+def _hash_range(path, offset, length):
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while length > 0:
+            block = f.read(min(length, 1024 * 1024))
+            if not block:
+                break
+            digest.update(block)
+            length -= len(block)
+    return digest.digest()
+
+
+def file_digest(path, executor=None, chunk_bytes=HASH_CHUNK_BYTES):
+    """Content hash of a file; chunks are hashed in parallel when executor is given"""
+    size = os.path.getsize(path)
+    offsets = range(0, max(size, 1), chunk_bytes)
+    if executor is not None and len(offsets) > 1:
+        chunks = executor.map(lambda offset: _hash_range(path, offset, chunk_bytes), offsets)
+    else:
+        chunks = (_hash_range(path, offset, chunk_bytes) for offset in offsets)
+
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(str(size).encode("ascii"))
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def local_code_files(script, root=None):
+    """The script and every module it imports from root, transitively"""
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    seen = []
+    pending = [os.path.abspath(script)]
+    while pending:
+        path = pending.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.append(path)
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                for directory in (os.path.dirname(path), root):
+                    candidate = os.path.join(directory, *name.split(".")) + ".py"
+                    if os.path.exists(candidate):
+                        pending.append(os.path.abspath(candidate))
+                        break
+    return sorted(seen)
+
+
+def is_file_artifact(artifact):
+    return not artifact.startswith(TABLE_PREFIX) and os.path.sep in os.path.normpath(artifact)
+
+
+# --------------------------------------------------
+class StageCache:
+    """
+    Cache keys and recorded outputs of pipeline stages.
+
+    Not thread-safe: use it from the flow, not from concurrent tasks.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index = {"stages": {}, "files": {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        self._executor = ThreadPoolExecutor(max_workers=HASH_WORKERS)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def digest(self, path):
+        """File (or directory) digest; unchanged files are not re-read"""
+        if os.path.isdir(path):
+            digest = hashlib.blake2b(digest_size=32)
+            for directory, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    file_path = os.path.join(directory, filename)
+                    digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+                    digest.update(self.digest(file_path).encode("ascii"))
+            return digest.hexdigest()
+        if not os.path.exists(path):
+            return None
+
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        known = self.index["files"].get(os.path.abspath(path))
+        if known and known["signature"] == signature:
+            return known["digest"]
+        value = file_digest(path, self._executor)
+        self.index["files"][os.path.abspath(path)] = {"signature": signature, "digest": value}
+        return value
+
+    def stage_key(self, stage, upstream_keys, producers, execution="subprocess"):
+        """
+        Key for stage given the keys of the stages it depends on, or
+        None if it cannot be cached.
+
+        Inputs produced by another stage contribute that stage's key,
+        so a change anywhere upstream changes every key below it.
+        """
+        inputs = {}
+        for artifact in stage.inputs:
+            if artifact in producers:
+                inputs[artifact] = upstream_keys[producers[artifact]]
+            elif not artifact.startswith(TABLE_PREFIX):
+                inputs[artifact] = self.digest(artifact)
+            else:
+                continue
+            # Missing input file, or an upstream stage without a key
+            if inputs[artifact] is None:
+                return None
+
+        parts = {
+            "version": CACHE_VERSION,
+            "python": sys.version_info[:2],
+            "script": stage.script,
+            "entry": stage.entry,
+            "params": stage.params or {},
+            "execution": execution,
+            "code": {
+                os.path.relpath(path): self.digest(path) for path in local_code_files(stage.script)
+            },
+            "inputs": inputs,
+        }
+        encoded = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.blake2b(encoded, digest_size=32).hexdigest()
+
+    def lookup(self, name, key, table_exists=None, path_for=None):
+        """
+        The recorded run of stage name if its key matches and every
+        output can be restored.
+
+        table_exists(table) checks that an output table is still there;
+        without it table outputs are assumed to be present. path_for is
+        the one restore() gets: an output this run needs as a file
+        misses if the recorded run left no file for it.
+        """
+        record = self.index["stages"].get(name)
+        if not key or not record or record["key"] != key:
+            return None
+        for artifact, digest in record["outputs"].items():
+            if artifact.startswith(TABLE_PREFIX):
+                if table_exists and not table_exists(artifact[len(TABLE_PREFIX):]):
+                    return None
+            elif digest is None:
+                if (path_for(artifact) if path_for else artifact):
+                    return None
+            elif not os.path.exists(self._object_path(digest)):
+                return None
+        return record
+
+    def restore(self, record, path_for=None):
+        """Put recorded output files back where they are missing or changed"""
+        restored = []
+        for artifact, digest in record["outputs"].items():
+            path = path_for(artifact) if path_for else artifact
+            if not digest or not path or self.digest(path) == digest:
+                continue
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            shutil.copyfile(self._object_path(digest), path + ".tmp")
+            os.replace(path + ".tmp", path)
+            restored.append(artifact)
+        return restored
+
+    def save(self, name, key, output_paths):
+        """Record a successful run; output_paths maps artifact names to files (or None)"""
+        outputs = {}
+        for artifact, path in output_paths.items():
+            if not path or not os.path.isfile(path):
+                outputs[artifact] = None
+                continue
+            digest = self.digest(path)
+            object_path = self._object_path(digest)
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                shutil.copyfile(path, object_path + ".tmp")
+                os.replace(object_path + ".tmp", object_path)
+            outputs[artifact] = digest
+        self.index["stages"][name] = {"key": key, "outputs": outputs}
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def flush(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+        os.replace(self.index_path + ".tmp", self.index_path)
@@ -0,0 +1,104 @@
+from collections import namedtuple
+
+# --------------------------------------------------
+# DECLARATIVE PIPELINE STAGE GRAPH
+# --------------------------------------------------
+# Each stage names the artifacts it reads and writes. A stage depends
+# on the producers of its inputs; inputs nobody produces are external
+# (raw files). Stages with no path between them can run at the same time.
+
+# name:      stage id, unique in the graph
+# task_name: display name of the Prefect task
+# script:    script run for the stage
+# inputs / outputs: artifact names
+# entry:     function called when the stage runs in a warm worker
+# params:    keyword arguments of the entry function; a subprocess
+#            stage gets each one as a --name-with-dashes option
+Stage = namedtuple(
+    "Stage",
+    ["name", "task_name", "script", "inputs", "outputs", "start_message", "done_message",
+     "entry", "params"],
+    defaults=("main", None)
+)
+
+
+class StageGraph:
+
+    def __init__(self, stages):
+        self.stages = {}
+        self.producers = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+            for artifact in stage.outputs:
+                if artifact in self.producers:
+                    raise ValueError(
+                        f"Artifact {artifact} is written by both "
+                        f"{self.producers[artifact]} and {stage.name}"
+                    )
+                self.producers[artifact] = stage.name
+
+        self.dependencies = {
+            name: sorted({self.producers[artifact] for artifact in stage.inputs
+                          if artifact in self.producers})
+            for name, stage in self.stages.items()
+        }
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        """Stages ordered so every stage follows its dependencies; declaration order breaks ties"""
+        remaining = {name: set(deps) for name, deps in self.dependencies.items()}
+        order = []
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Stage graph has a cycle between: {', '.join(sorted(remaining))}")
+            for name in ready:
+                del remaining[name]
+                order.append(name)
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def external_inputs(self):
+        return sorted({
+            artifact for stage in self.stages.values() for artifact in stage.inputs
+            if artifact not in self.producers
+        })
+
+    def levels(self):
+        """Stages grouped by depth: each level only needs earlier levels"""
+        depth = {}
+        for name in self.order:
+            depth[name] = 1 + max((depth[dep] for dep in self.dependencies[name]), default=-1)
+        levels = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for name in self.order:
+            levels[depth[name]].append(name)
+        return levels
+
+    def critical_path(self, durations):
+        """
+        Longest chain of dependent stages by duration.
+
+        Returns (stage names, total seconds); with enough parallelism
+        this is the shortest possible wall time of the whole graph.
+        """
+        finish = {}
+        previous = {}
+        for name in self.order:
+            start, previous[name] = max(
+                ((finish[dep], dep) for dep in self.dependencies[name]),
+                default=(0.0, None)
+            )
+            finish[name] = start + durations.get(name, 0.0)
+        if not finish:
+            return [], 0.0
+
+        name = max(self.order, key=lambda stage: finish[stage])
+        total = finish[name]
+        path = []
+        while name is not None:
+            path.append(name)
+            name = previous[name]
+        return path[::-1], total
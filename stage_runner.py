@@ -0,0 +1,145 @@
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; CPU time and peak RSS are then unknown
+    resource = None
+
+# --------------------------------------------------
+# STREAMING STAGE RUNNER
+# --------------------------------------------------
+# Runs a stage command, passing each stdout / stderr line on as soon as
+# it is written, with a log level taken from the line itself, and
+# measures the child's wall time, CPU time and peak RSS.
+
+# "%(asctime)s | %(levelname)s | %(message)s" as used by the scripts,
+# and logging's default "%(levelname)s:%(name)s:%(message)s"
+LOG_LINE_PATTERNS = (
+    re.compile(r"^\d{4}-\d{2}-\d{2} [\d:,.]+ \| (?P<level>[A-Z]+) \| "),
+    re.compile(r"^(?P<level>DEBUG|INFO|WARNING|ERROR|CRITICAL):"),
+)
+
+LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+
+# wall / CPU in seconds, peak RSS in MB (None where unknown)
+StageUsage = namedtuple("StageUsage", ["wall_seconds", "cpu_seconds", "peak_rss_mb"])
+
+
+# --------------------------------------------------
+class LineClassifier:
+    """
+    Log level of each line of one output stream.
+
+    Lines in a known log format use their own level. Other lines
+    continue the previous record (tracebacks, multi-line messages);
+    a traceback is always an error. Before the first record, stdout
+    defaults to INFO and stderr to WARNING.
+    """
+
+    def __init__(self, default_level):
+        self.level = default_level
+
+    def __call__(self, line):
+        for pattern in LOG_LINE_PATTERNS:
+            match = pattern.match(line)
+            if match and match.group("level") in LEVELS:
+                self.level = LEVELS[match.group("level")]
+                return self.level
+        if line.startswith("Traceback (most recent call last)"):
+            self.level = logging.ERROR
+        return self.level
+
+
+def max_rss_mb(ru_maxrss):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if sys.platform == "darwin":
+        return ru_maxrss / (1024 * 1024)
+    return ru_maxrss / 1024
+
+
+def _pump(stream, classify, emit):
+    for line in stream:
+        line = line.rstrip("\r\n")
+        if line:
+            emit(classify(line), line)
+    stream.close()
+
+
+def _wait(process):
+    """Reap the child with wait4 to get its own rusage"""
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return None
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return usage
+
+
+def run_command(args, emit, cwd=None, env=None):
+    """
+    Run args, calling emit(level, line) for every output line as it arrives.
+
+    Returns (returncode, StageUsage). Memory use stays at one line per
+    stream however much the command prints.
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        bufsize=1,
+        cwd=cwd,
+        # Unbuffered child output, so lines arrive while the stage runs
+        env=dict(env or os.environ, PYTHONUNBUFFERED="1")
+    )
+    readers = [
+        threading.Thread(target=_pump, args=(process.stdout, LineClassifier(logging.INFO), emit)),
+        threading.Thread(target=_pump, args=(process.stderr, LineClassifier(logging.WARNING), emit)),
+    ]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    usage = _wait(process)
+    wall_seconds = time.perf_counter() - started
+
+    if usage is None:
+        return process.returncode, StageUsage(wall_seconds, None, None)
+    return process.returncode, StageUsage(
+        wall_seconds, usage.ru_utime + usage.ru_stime, max_rss_mb(usage.ru_maxrss)
+    )
+
+
+# --------------------------------------------------
+def process_usage():
+    """CPU seconds and peak RSS (MB) of the current process so far"""
+    if resource is None:
+        return None, None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime, max_rss_mb(usage.ru_maxrss)
+
+
+def format_usage(usage):
+    parts = [f"{usage.wall_seconds:.1f}s wall"]
+    if usage.cpu_seconds is not None:
+        parts.append(f"{usage.cpu_seconds:.1f}s CPU")
+    if usage.peak_rss_mb is not None:
+        parts.append(f"{usage.peak_rss_mb:.0f} MB peak RSS")
+    return ", ".join(parts)
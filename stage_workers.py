@@ -0,0 +1,283 @@
+import contextlib
+import importlib
+import importlib.util
+import inspect
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from stage_runner import process_usage
+
+# --------------------------------------------------
+# WARM IN-PROCESS STAGE EXECUTION
+# --------------------------------------------------
+# Runs stage scripts inside long-lived worker processes instead of a
+# fresh interpreter per stage: the heavy libraries are imported once
+# per worker, and a stage module is imported once and its entry
+# function called. Entry functions that take an `artifacts` argument
+# get their input artifacts in memory and may return output artifacts
+# (pandas DataFrames or Arrow tables) as a dict; these are handed
+# between processes as memory-mapped Arrow IPC files. Stage output is
+# sent to the parent line by line over a queue while the stage runs.
+
+# Imported when a worker starts; missing ones are skipped
+WARM_IMPORTS = ("numpy", "pandas", "pyarrow", "psycopg2", "sklearn", "mlflow")
+
+# Shared memory when available, so artifacts never touch the disk
+ARTIFACT_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None
+ARTIFACT_EXTENSION = ".arrow"
+
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+
+# How long to wait for a stage's last output lines after it returned
+# (or its worker died)
+OUTPUT_DRAIN_SECONDS = 5
+
+_pool = None
+_pool_workers = None
+_relay = None
+# Stages of one level start the pool from several threads at once
+_pool_lock = threading.Lock()
+
+# Worker side: queue the output lines are sent over
+_output_queue = None
+
+# Stage modules imported in this worker process, by script path
+_modules = {}
+
+
+# --------------------------------------------------
+def _warm_up(output_queue):
+    global _output_queue
+    _output_queue = output_queue
+    # Stage scripts call logging.basicConfig at import; configure the root
+    # logger first so their records reach the per-stage capture handler
+    # instead of the worker's stderr
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+    for name in WARM_IMPORTS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+class OutputRelay:
+    """
+    Parent side: hands the lines workers send to the emit callback of
+    the stage run they belong to, on a background thread.
+    """
+
+    def __init__(self):
+        self.queue = multiprocessing.Queue()
+        self._emitters = {}
+        self._finished = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def register(self, emit):
+        run_id = uuid.uuid4().hex
+        with self._lock:
+            self._emitters[run_id] = emit
+            self._finished[run_id] = threading.Event()
+        return run_id
+
+    def wait(self, run_id, timeout=OUTPUT_DRAIN_SECONDS):
+        """Wait until the run's last line has been emitted, then forget the run"""
+        self._finished[run_id].wait(timeout)
+        with self._lock:
+            del self._emitters[run_id]
+            del self._finished[run_id]
+
+    def _pump(self):
+        while True:
+            message = self.queue.get()
+            if message is None:
+                return
+            run_id, line = message
+            with self._lock:
+                emit = self._emitters.get(run_id)
+                finished = self._finished.get(run_id)
+            if line is None:
+                if finished:
+                    finished.set()
+            elif emit:
+                emit(line)
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join()
+        self.queue.close()
+
+
+class LineRelay:
+    """Worker side: file-like object sending each complete line to the parent"""
+
+    def __init__(self, queue, run_id):
+        self.queue = queue
+        self.run_id = run_id
+        self._partial = ""
+
+    def write(self, text):
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.queue.put((self.run_id, line))
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        """Send any unterminated line and the end-of-output marker"""
+        if self._partial:
+            self.queue.put((self.run_id, self._partial))
+            self._partial = ""
+        self.queue.put((self.run_id, None))
+
+
+def get_worker_pool(workers):
+    """Process-wide pool of warm stage workers and its OutputRelay, created on first use"""
+    global _pool, _pool_workers, _relay
+    with _pool_lock:
+        if _pool is not None and _pool_workers != workers:
+            _close_pool()
+        if _pool is None:
+            _relay = OutputRelay()
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, initializer=_warm_up, initargs=(_relay.queue,)
+            )
+            _pool_workers = workers
+        return _pool, _relay
+
+
+def _close_pool():
+    global _pool, _pool_workers, _relay
+    if _pool is not None:
+        _pool.shutdown()
+        _relay.close()
+    _pool = None
+    _pool_workers = None
+    _relay = None
+
+
+def close_worker_pool():
+    """Shut the workers down and stop relaying their output"""
+    with _pool_lock:
+        _close_pool()
+
+
+def run_warm_stage(workers, emit, script, entry, inputs, outputs, artifact_dir, params=None):
+    """
+    Parent side: run a stage on the warm pool; params are keyword
+    arguments for the entry function.
+
+    emit(line) is called for every line of the stage's stdout and log
+    output while it runs. Returns (CPU seconds, peak RSS in MB) and
+    re-raises the stage's exception.
+    """
+    pool, relay = get_worker_pool(workers)
+    run_id = relay.register(emit)
+    try:
+        return pool.submit(
+            run_stage_module, run_id, script, entry, inputs, outputs, artifact_dir, params
+        ).result()
+    finally:
+        relay.wait(run_id)
+
+
+def make_artifact_dir():
+    return tempfile.mkdtemp(prefix="pipeline-artifacts-", dir=ARTIFACT_ROOT)
+
+
+def remove_artifact_dir(artifact_dir):
+    shutil.rmtree(artifact_dir, ignore_errors=True)
+
+
+# --------------------------------------------------
+def artifact_path(artifact_dir, name):
+    return os.path.join(artifact_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ARTIFACT_EXTENSION)
+
+
+def write_artifact(artifact_dir, name, value):
+    import pyarrow as pa
+
+    if not isinstance(value, pa.Table):
+        value = pa.Table.from_pandas(value, preserve_index=False)
+    # Write under a temporary name so readers never see a partial file
+    path = artifact_path(artifact_dir, name)
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, value.schema) as writer:
+            writer.write_table(value)
+    os.replace(path + ".tmp", path)
+
+
+def read_artifact(artifact_dir, name):
+    """Arrow table backed by the memory-mapped artifact file, or None"""
+    import pyarrow as pa
+
+    path = artifact_path(artifact_dir, name)
+    if not os.path.exists(path):
+        return None
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+# --------------------------------------------------
+def load_stage_module(script):
+    """Import a stage script once per worker; later stages reuse the module"""
+    path = os.path.abspath(script)
+    if path not in _modules:
+        name = "stage_" + re.sub(r"\W", "_", os.path.splitext(os.path.relpath(path))[0])
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[path] = module
+    return _modules[path]
+
+
+def run_stage_module(run_id, script, entry, inputs, outputs, artifact_dir, params=None):
+    """
+    Worker side: call script's entry function and publish its outputs.
+
+    stdout and log output are relayed to the parent as run_id's lines.
+    Returns (CPU seconds, peak RSS in MB). The worker is long-lived,
+    so peak RSS covers every stage it has run so far.
+    """
+    cpu_before, _ = process_usage()
+    captured = LineRelay(_output_queue, run_id)
+    handler = logging.StreamHandler(captured)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        with contextlib.redirect_stdout(captured):
+            module = load_stage_module(script)
+            function = getattr(module, entry)
+            kwargs = dict(params or {})
+            if "artifacts" in inspect.signature(function).parameters:
+                artifacts = {name: read_artifact(artifact_dir, name) for name in inputs}
+                kwargs["artifacts"] = {
+                    name: value for name, value in artifacts.items() if value is not None
+                }
+            result = function(**kwargs)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise RuntimeError(f"{script} exited with status {e.code}") from None
+        result = None
+    finally:
+        root.removeHandler(handler)
+        captured.finish()
+
+    if isinstance(result, dict):
+        for name, value in result.items():
+            if name in outputs:
+                write_artifact(artifact_dir, name, value)
+    cpu_after, peak_rss_mb = process_usage()
+    cpu_seconds = cpu_after - cpu_before if cpu_before is not None else None
+    return cpu_seconds, peak_rss_mb
@@ -0,0 +1,173 @@
+import pytest
+
+from contextlib import contextmanager
+
+from batch_executor import BatchExecutor, PipelineExecutor
+
+
+class FakeCursor:
+    """Records statements; savepoint handling is not simulated"""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+class ListQuarantine:
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, cursor, source, record, error):
+        self.records.append((source, record, str(error)))
+
+
+class BadRowWriter:
+    """write_batch that fails any batch containing a bad row"""
+
+    def __init__(self, bad_rows):
+        self.bad_rows = set(bad_rows)
+        self.stored = []
+        self.attempts = []
+
+    def __call__(self, cursor, rows):
+        self.attempts.append(list(rows))
+        bad = self.bad_rows.intersection(rows)
+        if bad:
+            raise ValueError(f"bad row {min(bad)}")
+        self.stored.extend(rows)
+
+
+def make_executor(bad_rows):
+    writer = BadRowWriter(bad_rows)
+    quarantine = ListQuarantine()
+    executor = BatchExecutor(FakeCursor(), writer, quarantine, "test")
+    return executor, writer, quarantine
+
+
+def test_clean_batch_is_written_once():
+    executor, writer, quarantine = make_executor(bad_rows=[])
+
+    assert executor.execute(list(range(10))) == (10, 0)
+    assert writer.attempts == [list(range(10))]
+    assert quarantine.records == []
+
+
+def test_empty_batch():
+    executor, writer, _ = make_executor(bad_rows=[])
+
+    assert executor.execute([]) == (0, 0)
+    assert writer.attempts == []
+
+
+@pytest.mark.parametrize("bad_rows", [[0], [7], [3, 4], [0, 15], [1, 5, 9, 13]])
+def test_bisection_quarantines_only_bad_rows(bad_rows):
+    rows = list(range(16))
+    executor, writer, quarantine = make_executor(bad_rows)
+
+    stored, quarantined = executor.execute(rows)
+
+    assert (stored, quarantined) == (len(rows) - len(bad_rows), len(bad_rows))
+    assert sorted(writer.stored) == [row for row in rows if row not in bad_rows]
+    assert [record for _, record, _ in quarantine.records] == sorted(bad_rows)
+    assert all(source == "test" for source, _, _ in quarantine.records)
+
+
+def test_bad_row_is_attempted_once_on_its_own():
+    executor, writer, quarantine = make_executor(bad_rows=[2])
+
+    executor.execute([0, 1, 2, 3])
+
+    assert writer.attempts.count([2]) == 1
+    assert quarantine.records == [("test", 2, "bad row 2")]
+
+
+def test_single_row_batch_is_not_retried():
+    executor, writer, quarantine = make_executor(bad_rows=[5])
+
+    assert executor.execute([5]) == (0, 1)
+    assert writer.attempts == [[5]]
+    assert len(quarantine.records) == 1
+
+
+def test_write_batch_row_count_is_used():
+    executor = BatchExecutor(FakeCursor(), lambda cursor, rows: len(rows) - 1,
+                             ListQuarantine(), "test")
+
+    assert executor.execute([1, 2, 3]) == (2, 0)
+
+
+def test_failed_attempt_rolls_back_to_savepoint():
+    executor, _, _ = make_executor(bad_rows=[1])
+
+    executor.execute([0, 1])
+
+    statements = executor.cursor.statements
+    assert statements[:3] == [
+        "SAVEPOINT batch_write",
+        "ROLLBACK TO SAVEPOINT batch_write",
+        "RELEASE SAVEPOINT batch_write",
+    ]
+    assert statements.count("SAVEPOINT batch_write") == statements.count(
+        "RELEASE SAVEPOINT batch_write")
+
+
+class FakeConnection:
+    """Counts the pipelines, commits and rollbacks of a psycopg 3 connection"""
+
+    def __init__(self):
+        self.pipelines = 0
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor()
+
+    @contextmanager
+    def pipeline(self):
+        self.pipelines += 1
+        yield
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def make_pipeline_executor(bad_rows, max_in_flight=2):
+    conn = FakeConnection()
+    writer = BadRowWriter(bad_rows)
+    quarantine = ListQuarantine()
+    executor = PipelineExecutor(conn, writer, quarantine, "test", max_in_flight)
+    return executor, conn, writer, quarantine
+
+
+def test_pipeline_commits_once_per_group():
+    executor, conn, writer, quarantine = make_pipeline_executor(bad_rows=[])
+    batches = [[1, 2], [3, 4], [5, 6], [7]]
+
+    assert executor.execute(batches) == (7, 0)
+    assert conn.pipelines == 2
+    assert conn.commits == 2
+    assert conn.rollbacks == 0
+    assert writer.attempts == batches
+
+
+def test_failed_group_is_replayed_and_bad_rows_quarantined():
+    executor, conn, writer, quarantine = make_pipeline_executor(bad_rows=[4])
+
+    assert executor.execute([[1, 2], [3, 4], [5, 6]]) == (5, 1)
+    assert conn.rollbacks == 1
+    assert conn.commits == 2
+    assert [record for _, record, _ in quarantine.records] == [4]
+    # The failed group is sent again batch by batch, then bisected
+    assert writer.attempts[2:] == [[1, 2], [3, 4], [3], [4], [5, 6]]
@@ -0,0 +1,84 @@
+from datetime import date, time
+
+import pytest
+
+from copy_stream import CopyStream, format_copy_row, format_copy_value
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, "\\N"),
+    ("plain text", "plain text"),
+    ("tab\there", "tab\\there"),
+    ("two\nlines", "two\\nlines"),
+    ("carriage\rreturn", "carriage\\rreturn"),
+    ("back\\slash", "back\\\\slash"),
+    ("\\N", "\\\\N"),
+    (42, "42"),
+    (4.5, "4.5"),
+    (date(2013, 1, 2), "2013-01-02"),
+    (time(13, 5, 9), "13:05:09"),
+])
+def test_format_copy_value(value, expected):
+    assert format_copy_value(value) == expected
+
+
+@pytest.mark.parametrize("value", [b"\x00\xff\\", bytearray(b"\x00\xff\\"), memoryview(b"\x00\xff\\")])
+def test_bytea_is_hex_with_an_escaped_backslash(value):
+    # COPY unescapes \\x to \x, which bytea then reads as hex
+    assert format_copy_value(value) == "\\\\x00ff5c"
+
+
+def test_format_copy_row():
+    assert format_copy_row(("a", None, 3)) == "a\t\\N\t3\n"
+
+
+def test_empty_value_is_not_null():
+    assert format_copy_row(("", None)) == "\t\\N\n"
+
+
+ROWS = [(f"user{i}", "text with\ttab and\nnewline" * (i % 3), i, None) for i in range(200)]
+EXPECTED = "".join(format_copy_row(row) for row in ROWS)
+
+
+def test_read_all():
+    assert CopyStream(ROWS).read() == EXPECTED
+
+
+@pytest.mark.parametrize("size", [1, 7, 100, 8192])
+def test_read_in_chunks(size):
+    stream = CopyStream(ROWS)
+    chunks = []
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        assert len(chunk) <= size
+        chunks.append(chunk)
+
+    assert "".join(chunks) == EXPECTED
+    # Every chunk but the last is full
+    assert all(len(chunk) == size for chunk in chunks[:-1])
+
+
+def test_rows_are_rendered_lazily():
+    consumed = []
+
+    def rows():
+        for row in ROWS:
+            consumed.append(row)
+            yield row
+
+    stream = CopyStream(rows())
+    stream.read(10)
+
+    assert len(consumed) == 1
+
+
+def test_readline_reads_like_read():
+    stream = CopyStream(ROWS)
+
+    assert stream.readline(5) + stream.read() == EXPECTED
+
+
+def test_no_rows():
+    assert CopyStream([]).read(100) == ""
@@ -0,0 +1,109 @@
+import csv
+import io
+
+import pytest
+
+import generate_clickstream
+from generate_clickstream import (
+    generate_clickstream_events_external,
+    generate_clickstream_events_sharded,
+    merge_runs,
+)
+
+
+@pytest.fixture
+def transactions_path(tmp_path):
+    path = tmp_path / "purchase_history.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["transaction_id", "user_id", "product_id", "transaction_date",
+                         "transaction_time", "quantity", "price", "rating"])
+        for i in range(300):
+            timestamp = 1357084800 + (i * 7919 % 300) * 3600
+            writer.writerow([f"T{i}", f"U{i % 40}", f"P{i % 25}", "01 2, 2013",
+                             timestamp, 1, 9.99, 5.0])
+    return path
+
+
+def read_events(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def event_number(event):
+    return int(event["event_id"][len("EVT"):])
+
+
+def write_run(path, timestamps, tag):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for i, timestamp in enumerate(timestamps):
+            f.write(f"{tag}{i},U,P,product_view,t,{timestamp},web\n")
+    return str(path)
+
+
+def test_merge_runs_orders_by_timestamp(tmp_path):
+    runs = [[1, 4, 4, 9], [2, 4, 8], [], [0, 10], [3, 3, 4], [4]]
+    run_paths = [write_run(tmp_path / f"run-{i}.csv", run, f"r{i}-") for i, run in enumerate(runs)]
+    out = io.StringIO()
+
+    merge_runs(run_paths, out)
+
+    lines = out.getvalue().splitlines()
+    assert [int(line.split(",")[5]) for line in lines] == sorted(t for run in runs for t in run)
+    # Equal timestamps keep the order of their runs
+    assert [line.split(",")[0] for line in lines if line.split(",")[5] == "4"] == [
+        "r0-1", "r0-2", "r1-1", "r4-2", "r5-0"]
+
+
+@pytest.mark.parametrize("fan_in", [2, 64])
+def test_external_engine_output_is_sorted_and_complete(tmp_path, transactions_path,
+                                                       monkeypatch, capsys, fan_in):
+    # Small runs and a small fan-in exercise multi-pass merging
+    monkeypatch.setattr(generate_clickstream, "MERGE_FAN_IN", fan_in)
+    output_path = tmp_path / "clickstream_events.csv"
+
+    generate_clickstream_events_external(
+        str(transactions_path), str(output_path), run_rows=200, seed=7)
+
+    events = read_events(output_path)
+    timestamps = [int(event["event_timestamp"]) for event in events]
+    assert timestamps == sorted(timestamps)
+    assert sorted(map(event_number, events)) == list(range(1, len(events) + 1))
+    assert sum(event["event_type"] == "purchase_click" for event in events) == 300
+    assert list(tmp_path.glob("clickstream-runs-*")) == []
+
+
+def test_external_engine_is_reproducible(tmp_path, transactions_path, capsys):
+    outputs = []
+    for name in ("first.csv", "second.csv"):
+        generate_clickstream_events_external(
+            str(transactions_path), str(tmp_path / name), run_rows=200, seed=7)
+        outputs.append((tmp_path / name).read_bytes())
+
+    assert outputs[0] == outputs[1]
+
+
+def test_sharded_output_does_not_depend_on_workers(tmp_path, transactions_path, monkeypatch,
+                                                   capsys):
+    monkeypatch.setattr(generate_clickstream, "SHARD_TRANSACTIONS", 70)
+    outputs = {}
+    for workers in (1, 3):
+        output_path = tmp_path / f"events-{workers}.csv"
+        generate_clickstream_events_sharded(
+            str(transactions_path), str(output_path), workers=workers, seed=11)
+        outputs[workers] = output_path.read_bytes()
+
+    assert outputs[1] == outputs[3]
+    events = read_events(tmp_path / "events-1.csv")
+    assert sorted(map(event_number, events)) == list(range(1, len(events) + 1))
+    timestamps = [int(event["event_timestamp"]) for event in events]
+    assert timestamps == sorted(timestamps)
+
+
+def test_sharded_output_depends_on_the_seed(tmp_path, transactions_path, monkeypatch, capsys):
+    monkeypatch.setattr(generate_clickstream, "SHARD_TRANSACTIONS", 70)
+    for seed in (11, 12):
+        generate_clickstream_events_sharded(
+            str(transactions_path), str(tmp_path / f"events-{seed}.csv"), workers=2, seed=seed)
+
+    assert (tmp_path / "events-11.csv").read_bytes() != (tmp_path / "events-12.csv").read_bytes()
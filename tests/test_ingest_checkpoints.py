@@ -0,0 +1,107 @@
+import pytest
+
+import ingest_checkpoints
+from ingest_checkpoints import (
+    FileCheckpoint,
+    PartitionCheckpoint,
+    WatermarkTracker,
+    complete_lines_end,
+)
+
+
+def write_lines(path, count):
+    path.write_text("".join(f'{{"n": {i}}}\n' for i in range(count)), encoding="utf-8")
+    return path
+
+
+def test_watermark_keeps_the_highest_value():
+    tracker = WatermarkTracker()
+    for value in (5, None, 9, 3):
+        tracker.observe(value)
+
+    assert tracker.watermark == 9
+
+
+def test_watermark_starts_from_the_saved_value():
+    tracker = WatermarkTracker(watermark=20)
+    tracker.observe(10)
+
+    assert tracker.watermark == 20
+
+
+def test_track_passes_items_through_and_skips_bad_values():
+    tracker = WatermarkTracker()
+    items = [{"t": "3"}, {"t": "bad"}, {}, {"t": None}, {"t": 7}, {"t": 4}]
+
+    assert list(tracker.track(items, lambda item: item["t"])) == items
+    assert tracker.watermark == 7
+
+
+def test_partition_is_done_at_its_range_end():
+    partition = PartitionCheckpoint("data.json", 100, 200)
+    assert partition.committed_offset == 100
+    assert not partition.is_done
+
+    partition.committed_offset = 200
+    assert partition.is_done
+
+
+def test_partition_checkpoints_cover_the_file(tmp_path):
+    path = write_lines(tmp_path / "data.json", 100)
+    size = path.stat().st_size
+    checkpoint = FileCheckpoint(str(path), 0, size)
+
+    partitions = checkpoint.partition_checkpoints(4)
+
+    assert len(partitions) == 4
+    assert partitions[0].range_start == 0
+    assert partitions[-1].range_end == size
+    for previous, following in zip(partitions, partitions[1:]):
+        assert previous.range_end == following.range_start
+
+
+def test_partition_checkpoints_resume_unfinished_ranges(tmp_path):
+    path = write_lines(tmp_path / "data.json", 100)
+    first_run = FileCheckpoint(str(path), 0, path.stat().st_size).partition_checkpoints(2)
+    finished, interrupted = first_run
+    finished.committed_offset = finished.range_end
+    interrupted.committed_offset = interrupted.range_start + 10
+
+    # The file grew after the interrupted run
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"n": 100}\n{"n": 101}\n')
+    checkpoint = FileCheckpoint(str(path), 0, path.stat().st_size, partitions=first_run)
+
+    partitions = checkpoint.partition_checkpoints(2)
+
+    assert partitions[0] is interrupted
+    assert partitions[1].range_start == interrupted.range_end
+    assert partitions[-1].range_end == path.stat().st_size
+
+
+def test_finished_run_has_no_new_partitions(tmp_path):
+    path = write_lines(tmp_path / "data.json", 10)
+    size = path.stat().st_size
+    done = PartitionCheckpoint(str(path), 0, size, committed_offset=size)
+    checkpoint = FileCheckpoint(str(path), 0, size, partitions=[done])
+
+    assert checkpoint.partition_checkpoints(4) == []
+
+
+@pytest.mark.parametrize("scan_bytes", [1, 5, 64 * 1024])
+def test_complete_lines_end_leaves_a_torn_tail(tmp_path, monkeypatch, scan_bytes):
+    monkeypatch.setattr(ingest_checkpoints, "TAIL_SCAN_BYTES", scan_bytes)
+    path = write_lines(tmp_path / "data.json", 3)
+    complete = path.stat().st_size
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"n": 3, "text": "half wri')
+
+    assert complete_lines_end(str(path), path.stat().st_size) == complete
+    assert complete_lines_end(str(path), complete) == complete
+
+
+def test_complete_lines_end_without_a_newline(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text('{"n": 0', encoding="utf-8")
+
+    assert complete_lines_end(str(path), path.stat().st_size) == 0
@@ -0,0 +1,56 @@
+import io
+import json
+
+import pytest
+
+from json_stream import iter_object_items
+
+DOCUMENT = {
+    "metadata": {"total_products": 3, "note": "braces { and ] in a string"},
+    "products": [{"id": 1, "tags": ["a", "b"]}, {"id": 2}, {"id": 3, "nested": {"x": [1, 2]}}],
+    "empty": [],
+    "trailer": "end",
+}
+
+
+def items(text, stream_keys=(), chunk_size=7):
+    return list(iter_object_items(io.StringIO(text), stream_keys, chunk_size))
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_members_in_document_order(indent):
+    result = items(json.dumps(DOCUMENT, indent=indent))
+
+    assert result == list(DOCUMENT.items())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+def test_stream_keys_yield_array_elements(chunk_size):
+    result = items(json.dumps(DOCUMENT, indent=2), ("products", "empty"), chunk_size)
+
+    assert result == [
+        ("metadata", DOCUMENT["metadata"]),
+        ("products", {"id": 1, "tags": ["a", "b"]}),
+        ("products", {"id": 2}),
+        ("products", {"id": 3, "nested": {"x": [1, 2]}}),
+        ("trailer", "end"),
+    ]
+
+
+def test_empty_object():
+    assert items(" { } ") == []
+
+
+def test_non_object_is_rejected():
+    with pytest.raises(ValueError):
+        items("[1, 2]")
+
+
+def test_streamed_key_must_be_an_array():
+    with pytest.raises(ValueError):
+        items('{"products": {"id": 1}}', ("products",))
+
+
+def test_truncated_document_is_rejected():
+    with pytest.raises(ValueError):
+        items('{"products": [{"id": 1}, {"id"', ("products",))
@@ -0,0 +1,136 @@
+import gzip
+import json
+import threading
+
+import pytest
+
+from popularity_api import (
+    PopularityDataset,
+    decode_cursor,
+    encode_cursor,
+    export_suffix,
+    make_server,
+    page_cursors,
+)
+from popularity_client import iter_api_records
+
+METADATA = {"total_products": 5, "exported_products": 5, "source": "test"}
+PRODUCTS = [
+    {"product_id": f"P{i}", "popularity_score": 100.0 - i, "review_count": i, "name": "é\"\\"}
+    for i in range(5)
+]
+
+
+def write_json(path):
+    path.write_text(json.dumps({"metadata": METADATA, "products": PRODUCTS}), encoding="utf-8")
+
+
+def ndjson_lines():
+    return "".join(json.dumps(record) + "\n" for record in [{"metadata": METADATA}, *PRODUCTS])
+
+
+def write_ndjson(path):
+    path.write_text(ndjson_lines(), encoding="utf-8")
+
+
+def write_ndjson_gz(path):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(ndjson_lines())
+
+
+def write_parquet(path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pylist(PRODUCTS).replace_schema_metadata(
+        {"popularity_metadata": json.dumps(METADATA)})
+    pq.write_table(table, str(path))
+
+
+WRITERS = {
+    "product_popularity.json": write_json,
+    "product_popularity.ndjson": write_ndjson,
+    "product_popularity.ndjson.gz": write_ndjson_gz,
+    "product_popularity.parquet": write_parquet,
+}
+
+
+@pytest.mark.parametrize("offset", [0, 1, 1000])
+def test_cursor_round_trip(offset):
+    assert decode_cursor(encode_cursor(offset)) == offset
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor(-1), "b2Zmc2V0OmFiYw=="])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_page_cursors():
+    assert [decode_cursor(cursor) for cursor in page_cursors(25, 10)] == [0, 10, 20]
+
+
+@pytest.mark.parametrize("name, suffix", [
+    ("a.json", ".json"), ("a.NDJSON", ".ndjson"), ("a.ndjson.gz", ".ndjson.gz"),
+    ("a.ndjson.zst", ".ndjson.zst"), ("a.parquet", ".parquet"),
+])
+def test_export_suffix(name, suffix):
+    assert export_suffix(name) == suffix
+
+
+def test_unsupported_export():
+    with pytest.raises(ValueError, match="Unsupported"):
+        export_suffix("a.csv")
+
+
+@pytest.mark.parametrize("name", sorted(WRITERS))
+def test_every_format_loads_the_same_dataset(tmp_path, name):
+    path = tmp_path / name
+    WRITERS[name](path)
+
+    dataset = PopularityDataset(str(path))
+
+    assert dataset.metadata == METADATA
+    assert len(dataset) == len(PRODUCTS)
+    assert json.loads(dataset.products_json(0, len(dataset))) == PRODUCTS
+    assert json.loads(dataset.products_json(1, 3)) == PRODUCTS[1:3]
+    assert dataset.products_json(4, 100) == dataset.products_json(4, 5)
+    assert dataset.products_json(5, 10) == b"[]"
+
+
+def test_version_follows_the_file_content(tmp_path):
+    path = tmp_path / "product_popularity.json"
+    write_json(path)
+    version = PopularityDataset(str(path)).version
+
+    assert PopularityDataset(str(path)).version == version
+    changed = [dict(PRODUCTS[0], popularity_score=1.0), *PRODUCTS[1:]]
+    path.write_text(json.dumps({"metadata": METADATA, "products": changed}))
+    assert PopularityDataset(str(path)).version != version
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = tmp_path / "product_popularity.json"
+    write_json(path)
+    server = make_server(str(path), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("concurrency, page_size", [(1, 1), (3, 2), (8, 1000)])
+def test_client_fetches_every_page_in_order(server, concurrency, page_size):
+    records = list(iter_api_records(server.url, concurrency, page_size))
+
+    assert records == [("metadata", METADATA)] + [("products", product) for product in PRODUCTS]
+
+
+def test_client_stops_early(server):
+    records = iter_api_records(server.url, concurrency=2, page_size=1)
+
+    assert next(records) == ("metadata", METADATA)
+    assert next(records) == ("products", PRODUCTS[0])
+    records.close()
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from popularity_stats import (
+    PopularitySummary,
+    ScoreHistogram,
+    StreamingTopK,
+    bottom_k_indices,
+    top_k_indices,
+)
+
+SCORES = [50.0, 90.5, 10.0, 90.5, 75.25, 10.0, 0.0, 100.0, 75.25, 10.0]
+
+
+def stable_descending(values):
+    return list(np.argsort(-np.asarray(values), kind="stable"))
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 5, 10, 20])
+def test_top_k_matches_a_stable_sort(k):
+    assert list(top_k_indices(SCORES, k)) == stable_descending(SCORES)[:k]
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 5, 10, 20])
+def test_bottom_k_matches_a_stable_sort(k):
+    assert list(bottom_k_indices(SCORES, k)) == stable_descending(SCORES)[-k:]
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 5, 10, 20])
+def test_streaming_top_k_matches_a_stable_sort(k):
+    top = StreamingTopK(k)
+    for index, score in enumerate(SCORES):
+        top.push(score, index)
+
+    assert top.items() == stable_descending(SCORES)[:k]
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 5, 10, 20])
+def test_streaming_bottom_k_matches_a_stable_sort(k):
+    bottom = StreamingTopK(k, largest=False)
+    for index, score in enumerate(SCORES):
+        bottom.push(score, index)
+
+    # Same items and order as the tail of a stable descending sort
+    assert bottom.items() == stable_descending(SCORES)[-k:]
+
+
+def test_streaming_top_k_ties_keep_stream_order():
+    top = StreamingTopK(3)
+    for item in "abcde":
+        top.push(1.0, item)
+
+    assert top.items() == ["a", "b", "c"]
+
+
+def test_streaming_top_k_on_a_random_stream():
+    rng = np.random.default_rng(0)
+    scores = np.round(rng.uniform(0, 100, 5000), 1)
+    top = StreamingTopK(25)
+    for index, score in enumerate(scores):
+        top.push(float(score), index)
+
+    assert top.items() == stable_descending(scores)[:25]
+
+
+def test_histogram_quantiles_are_exact_at_score_resolution():
+    rng = np.random.default_rng(1)
+    scores = np.round(rng.uniform(0, 100, 10001), 2)
+    histogram = ScoreHistogram()
+    histogram.add_many(scores)
+
+    assert histogram.mean == pytest.approx(scores.mean())
+    ordered = np.sort(scores)
+    for q, value in histogram.quantiles().items():
+        assert value == pytest.approx(ordered[int(q * len(scores))])
+
+
+def test_summary_selects_top_and_bottom_records():
+    records = [{"product_id": f"P{i}", "popularity_score": score} for i, score in enumerate(SCORES)]
+    summary = PopularitySummary(top=3, bottom=2).add_scores(
+        np.asarray(SCORES), lambda indices: [records[i] for i in indices])
+
+    order = stable_descending(SCORES)
+    assert summary.top_products() == [records[i] for i in order[:3]]
+    assert summary.bottom_products() == [records[i] for i in order[-2:]]
@@ -0,0 +1,127 @@
+from datetime import date, time
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from ingest_checkpoints import WatermarkTracker  # noqa: E402
+from purchase_columnar import RangeBytesReader, batch_to_csv, iter_typed_batches  # noqa: E402
+
+FIELDNAMES = ["transaction_id", "user_id", "product_id", "transaction_date",
+              "transaction_time", "quantity", "price", "rating"]
+
+LINES = [
+    "T0,U0,P0,\"01 2, 2013\",1357084800,1,9.99,5.0",
+    "T1,U1,P1,bad date,1357084800,1,9.99,5.0",
+    "T2,U2,P2,\"12 31, 2012\",1356998399,2,1.5,4.0",
+    "T3,U3,P3,\"01 2, 2013\",not a time,1,9.99,5.0",
+    "T4,U4,P4,\"06 15, 2013\",1371300000,3,abc,3.0",
+    "T5,U5,P5,\"06 15, 2013\",1371301234,1,2.25,",
+]
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "purchase_history.csv"
+    path.write_text(",".join(FIELDNAMES) + "\n" + "\n".join(LINES) + "\n", encoding="utf-8")
+    return path
+
+
+def header_end(path):
+    with open(path, "rb") as f:
+        f.readline()
+        return f.tell()
+
+
+def transaction_ids(batches):
+    return [row["transaction_id"] for batch in batches for row in batch.to_pylist()]
+
+
+def load(path, start=None, end=None, batch_rows=1000, tracker=None):
+    rejected = []
+    start = header_end(path) if start is None else start
+    end = path.stat().st_size if end is None else end
+    batches = list(iter_typed_batches(
+        str(path), start, end, FIELDNAMES, batch_rows,
+        lambda row, error: rejected.append(row["transaction_id"]), tracker))
+    return batches, rejected
+
+
+def test_rows_are_typed(csv_path):
+    batches, _ = load(csv_path)
+    rows = pa.Table.from_batches(batches).to_pylist()
+
+    assert rows[0] == {
+        "transaction_id": "T0", "user_id": "U0", "product_id": "P0",
+        "transaction_date": date(2013, 1, 2), "transaction_time": time(0, 0),
+        "quantity": 1, "price": 9.99, "rating": 5.0,
+    }
+    assert rows[1]["transaction_date"] == date(2012, 12, 31)
+    assert rows[1]["transaction_time"] == time(23, 59, 59)
+
+
+def test_rows_that_do_not_convert_are_rejected(csv_path):
+    batches, rejected = load(csv_path)
+
+    assert rejected == ["T1", "T3", "T4", "T5"]
+    assert transaction_ids(batches) == ["T0", "T2"]
+
+
+def test_batches_are_sliced_to_batch_rows(csv_path):
+    batches, _ = load(csv_path, batch_rows=1)
+
+    assert [batch.num_rows for batch in batches] == [1, 1]
+
+
+def test_tracker_sees_the_highest_transaction_time(csv_path):
+    tracker = WatermarkTracker()
+    load(csv_path, tracker=tracker)
+
+    assert tracker.watermark == 1371301234
+
+
+def test_byte_range(csv_path):
+    start = header_end(csv_path)
+    middle = start + len(LINES[0]) + 1 + len(LINES[1]) + 1 + len(LINES[2]) + 1
+
+    first, _ = load(csv_path, end=middle)
+    second, rejected = load(csv_path, start=middle)
+
+    assert transaction_ids(first) == ["T0", "T2"]
+    assert transaction_ids(second) == []
+    assert rejected == ["T3", "T4", "T5"]
+
+
+def test_range_bytes_reader_stops_at_end(csv_path):
+    reader = RangeBytesReader(str(csv_path), 2, 10)
+    try:
+        assert reader.read() == csv_path.read_bytes()[2:10]
+    finally:
+        reader.close()
+
+
+def test_batch_to_csv_has_no_header(csv_path):
+    batches, _ = load(csv_path)
+
+    text = batch_to_csv(batches[0]).read().decode("utf-8")
+
+    assert text.splitlines()[0].startswith('"T0","U0","P0",2013-01-02,00:00:00,1,9.99,5')
+
+
+def test_columnar_blocks_advance_position_at_block_ends(csv_path, monkeypatch):
+    import purchase_columnar
+    from ingest_purchase_history import ColumnarBlocks
+
+    monkeypatch.setattr(purchase_columnar, "READ_BLOCK_SIZE", 2 * len(LINES[0]))
+    start, end = header_end(csv_path), csv_path.stat().st_size
+    blocks = ColumnarBlocks(str(csv_path), start, end, FIELDNAMES, 1)
+    rejected = []
+
+    positions = []
+    for batch in blocks.batches(lambda row, error: rejected.append(row["transaction_id"])):
+        positions.append((transaction_ids([batch]), blocks.position))
+
+    t2_end = start + sum(len(line) + 1 for line in LINES[:3])
+    assert positions == [(["T0"], start), (["T2"], t2_end)]
+    assert rejected == ["T1", "T3", "T4", "T5"]
+    assert blocks.position == end
@@ -0,0 +1,50 @@
+from review_dedup import HASH_BYTES, ContentHashIndex, review_content_hash
+
+REVIEW = {
+    "reviewerID": "A1",
+    "asin": "B00",
+    "unixReviewTime": 1357084800,
+    "reviewText": "Works as described.",
+}
+
+
+def test_hash_is_stable_and_sized():
+    content_hash = review_content_hash(REVIEW)
+
+    assert len(content_hash) == HASH_BYTES
+    assert review_content_hash(dict(REVIEW)) == content_hash
+
+
+def test_hash_ignores_fields_outside_the_identity():
+    assert review_content_hash({**REVIEW, "overall": 1.0}) == review_content_hash(REVIEW)
+
+
+def test_hash_changes_with_each_identity_field():
+    content_hash = review_content_hash(REVIEW)
+    for field, value in (("reviewerID", "A2"), ("asin", "B01"),
+                         ("unixReviewTime", 1357084801), ("reviewText", "Broke.")):
+        assert review_content_hash({**REVIEW, field: value}) != content_hash
+
+
+def test_missing_fields_hash_like_empty_ones():
+    assert review_content_hash({}) == review_content_hash(
+        {"reviewerID": "", "asin": "", "reviewText": None})
+
+
+def test_add_if_new_only_accepts_unseen_hashes():
+    index = ContentHashIndex()
+    content_hash = review_content_hash(REVIEW)
+
+    assert index.add_if_new(content_hash)
+    assert not index.add_if_new(content_hash)
+    assert len(index) == 1
+
+
+def test_from_hashes_seeds_the_index():
+    hashes = [review_content_hash({**REVIEW, "reviewerID": f"B{i}"}) for i in range(5)]
+    # Hashes read back from a database come as memoryview
+    index = ContentHashIndex.from_hashes(memoryview(h) for h in hashes)
+
+    assert len(index) == 5
+    assert not any(index.add_if_new(h) for h in hashes)
+    assert index.add_if_new(review_content_hash(REVIEW))
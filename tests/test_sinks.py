@@ -0,0 +1,93 @@
+from datetime import date, time
+
+import pytest
+
+from sinks import SQLiteSink, TableSpec, open_sink
+
+SPEC = TableSpec(
+    name="purchases",
+    columns=[("transaction_id", "TEXT"), ("transaction_date", "DATE"),
+             ("transaction_time", "TIME"), ("price", "DOUBLE")],
+    key="transaction_id",
+    partition_by="transaction_date",
+)
+
+ROWS = [
+    ("T1", date(2013, 1, 2), time(10, 0), 9.99),
+    ("T2", date(2013, 1, 31), time(11, 30), 5.0),
+    ("T3", date(2013, 2, 1), time(23, 59, 59), 1.25),
+]
+
+
+def test_sqlite_sink_ignores_known_keys(tmp_path):
+    path = str(tmp_path / "pipeline.sqlite")
+    with open_sink("sqlite", SPEC, path) as sink:
+        assert sink.write(ROWS[:2]) == 2
+        assert sink.write(ROWS) == 1
+
+    with SQLiteSink(SPEC, path) as sink:
+        assert sorted(sink.key_values()) == ["T1", "T2", "T3"]
+        stored = sink.conn.execute(
+            "SELECT transaction_date, transaction_time FROM purchases WHERE transaction_id = 'T3'"
+        ).fetchone()
+    assert stored == ("2013-02-01", "23:59:59")
+
+
+def test_sqlite_sink_accepts_arrow_batches(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    batch = pa.RecordBatch.from_pylist([dict(zip(["transaction_id", "transaction_date",
+                                                  "transaction_time", "price"], row))
+                                        for row in ROWS])
+    with open_sink("sqlite", SPEC, str(tmp_path / "pipeline.sqlite")) as sink:
+        assert sink.write(batch) == 3
+        assert sorted(sink.key_values()) == ["T1", "T2", "T3"]
+
+
+def test_parquet_sink_partitions_dates_by_month(tmp_path):
+    ds = pytest.importorskip("pyarrow.dataset")
+    root = tmp_path / "parquet"
+    with open_sink("parquet", SPEC, str(root)) as sink:
+        assert sink.write(ROWS) == 3
+
+    months = sorted(path.name for path in (root / "purchases").iterdir())
+    assert months == ["transaction_date_month=2013-01", "transaction_date_month=2013-02"]
+
+    table = ds.dataset(str(root / "purchases"), format="parquet", partitioning="hive").to_table()
+    rows = sorted(zip(*(table.column(name).to_pylist() for name in
+                        ("transaction_id", "transaction_date", "price"))))
+    assert rows == [(row[0], row[1], row[3]) for row in ROWS]
+
+
+def test_parquet_sink_buffers_until_flush_rows(tmp_path):
+    pytest.importorskip("pyarrow")
+    from sinks import ParquetSink
+
+    sink = ParquetSink(SPEC, str(tmp_path), flush_rows=3)
+    sink.write(ROWS[:2])
+    assert not list((tmp_path / "purchases").rglob("*.parquet"))
+    sink.write(ROWS[2:])
+    assert list((tmp_path / "purchases").rglob("*.parquet"))
+    sink.close()
+
+
+def test_parquet_sink_appends_and_reports_keys(tmp_path):
+    pytest.importorskip("pyarrow")
+    for rows in (ROWS[:1], ROWS[1:]):
+        with open_sink("parquet", SPEC, str(tmp_path)) as sink:
+            sink.write(rows)
+
+    with open_sink("parquet", SPEC, str(tmp_path)) as sink:
+        assert sorted(sink.key_values()) == ["T1", "T2", "T3"]
+
+
+def test_duckdb_sink_counts_new_rows(tmp_path):
+    pytest.importorskip("duckdb")
+    with open_sink("duckdb", SPEC, str(tmp_path / "pipeline.duckdb")) as sink:
+        assert sink.write(ROWS[:2]) == 2
+        assert sink.write(ROWS) == 1
+        assert sorted(sink.key_values()) == ["T1", "T2", "T3"]
+
+
+def test_unknown_sink():
+    with pytest.raises(ValueError):
+        open_sink("csv", SPEC, "out")
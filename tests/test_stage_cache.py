@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from stage_cache import StageCache, file_digest
+from stage_graph import Stage
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "helper.py").write_text("VALUE = 1\n")
+    (tmp_path / "stage.py").write_text("import helper\n\ndef main():\n    pass\n")
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "input.csv").write_text("a,b\n1,2\n")
+    with StageCache(str(tmp_path / "cache")) as cache:
+        yield tmp_path, cache
+
+
+STAGE = Stage("load", "Load", "stage.py", ["raw/input.csv", "upstream.out"],
+              ["out/result.csv", "table:results"], "", "")
+PRODUCERS = {"upstream.out": "upstream"}
+
+
+def key(cache, upstream_key="u1", stage=STAGE):
+    return cache.stage_key(stage, {"upstream": upstream_key}, PRODUCERS)
+
+
+def test_key_is_stable(workspace):
+    _, cache = workspace
+
+    assert key(cache) == key(cache)
+
+
+def test_key_changes_with_an_imported_module(workspace):
+    root, cache = workspace
+    before = key(cache)
+    (root / "helper.py").write_text("VALUE = 2\n")
+
+    assert key(cache) != before
+
+
+def test_key_changes_with_an_external_input(workspace):
+    root, cache = workspace
+    before = key(cache)
+    (root / "raw" / "input.csv").write_text("a,b\n1,3\n")
+
+    assert key(cache) != before
+
+
+def test_key_changes_with_an_upstream_key(workspace):
+    _, cache = workspace
+
+    assert key(cache, "u1") != key(cache, "u2")
+
+
+def test_key_changes_with_the_entry_point(workspace):
+    _, cache = workspace
+
+    assert key(cache) != key(cache, stage=STAGE._replace(entry="other"))
+
+
+def test_key_changes_with_params(workspace):
+    _, cache = workspace
+    with_input = STAGE._replace(params={"input_file": "raw/input.csv"})
+
+    assert key(cache) != key(cache, stage=with_input)
+    assert key(cache, stage=with_input) != key(
+        cache, stage=STAGE._replace(params={"input_file": "raw/other.csv"}))
+
+
+def test_key_changes_with_the_execution_mode(workspace):
+    _, cache = workspace
+
+    assert (cache.stage_key(STAGE, {"upstream": "u1"}, PRODUCERS, "warm")
+            != cache.stage_key(STAGE, {"upstream": "u1"}, PRODUCERS, "subprocess"))
+
+
+def test_missing_external_input_has_no_key(workspace):
+    root, cache = workspace
+    (root / "raw" / "input.csv").unlink()
+
+    assert key(cache) is None
+    assert cache.lookup("load", None) is None
+
+
+def test_upstream_without_a_key_has_no_key(workspace):
+    _, cache = workspace
+
+    assert key(cache, upstream_key=None) is None
+
+
+def test_parallel_file_digest_matches_sequential(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 100)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        parallel = file_digest(str(path), executor, chunk_bytes=1000)
+    assert parallel == file_digest(str(path), chunk_bytes=1000)
+
+
+def test_lookup_and_restore(workspace):
+    root, cache = workspace
+    (root / "out").mkdir()
+    output = root / "out" / "result.csv"
+    output.write_text("result\n")
+    stage_key = key(cache)
+    cache.save("load", stage_key, {"out/result.csv": str(output), "table:results": None})
+    cache.flush()
+
+    assert cache.lookup("load", "other-key") is None
+    with StageCache(str(root / "cache")) as reloaded:
+        record = reloaded.lookup("load", stage_key)
+    assert record is not None
+
+    output.write_text("changed\n")
+    assert cache.restore(record) == ["out/result.csv"]
+    assert output.read_text() == "result\n"
+    assert cache.restore(record) == []
+
+
+def test_lookup_requires_output_tables(workspace):
+    root, cache = workspace
+    stage_key = key(cache)
+    cache.save("load", stage_key, {"table:results": None})
+
+    assert cache.lookup("load", stage_key, table_exists=lambda table: table == "results")
+    assert cache.lookup("load", stage_key, table_exists=lambda table: False) is None
+    assert cache.lookup("load", stage_key) is not None
+
+
+def test_lookup_misses_an_output_file_the_recorded_run_did_not_leave(workspace):
+    _, cache = workspace
+    stage_key = key(cache)
+    # A subprocess run keeps in-memory artifacts to itself
+    cache.save("load", stage_key, {"merged_data": None})
+
+    assert cache.lookup("load", stage_key, path_for=lambda artifact: None) is not None
+    assert cache.lookup("load", stage_key, path_for=lambda artifact: "/tmp/merged_data.arrow") is None
@@ -0,0 +1,60 @@
+import pytest
+
+from stage_graph import Stage, StageGraph
+
+
+def stage(name, inputs=(), outputs=()):
+    return Stage(name, name, f"{name}.py", list(inputs), list(outputs), "", "")
+
+
+# raw -> a -> b -> d
+#          \-> c -/
+#   e (independent)
+STAGES = [
+    stage("a", ["raw.csv"], ["a.out"]),
+    stage("b", ["a.out"], ["b.out"]),
+    stage("c", ["a.out"], ["c.out"]),
+    stage("d", ["b.out", "c.out"], ["d.out"]),
+    stage("e", ["other.csv"], ["table:e"]),
+]
+
+
+def test_dependencies_and_external_inputs():
+    graph = StageGraph(STAGES)
+
+    assert graph.dependencies == {"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"], "e": []}
+    assert graph.external_inputs() == ["other.csv", "raw.csv"]
+
+
+def test_levels_group_independent_stages():
+    assert StageGraph(STAGES).levels() == [["a", "e"], ["b", "c"], ["d"]]
+
+
+def test_levels_ignore_declaration_order():
+    assert StageGraph(STAGES[::-1]).levels() == [["e", "a"], ["c", "b"], ["d"]]
+
+
+def test_critical_path_follows_the_slowest_chain():
+    durations = {"a": 1.0, "b": 5.0, "c": 2.0, "d": 1.0, "e": 4.0}
+
+    assert StageGraph(STAGES).critical_path(durations) == (["a", "b", "d"], 7.0)
+
+
+def test_critical_path_can_be_a_single_stage():
+    durations = {"a": 1.0, "b": 1.0, "c": 1.0, "d": 1.0, "e": 10.0}
+
+    assert StageGraph(STAGES).critical_path(durations) == (["e"], 10.0)
+
+
+def test_critical_path_of_an_empty_graph():
+    assert StageGraph([]).critical_path({}) == ([], 0.0)
+
+
+def test_duplicate_output_is_rejected():
+    with pytest.raises(ValueError, match="written by both"):
+        StageGraph([stage("a", outputs=["x"]), stage("b", outputs=["x"])])
+
+
+def test_cycle_is_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        StageGraph([stage("a", ["y"], ["x"]), stage("b", ["x"], ["y"])])
@@ -0,0 +1,132 @@
+import queue
+import textwrap
+
+import pytest
+
+from stage_workers import (
+    LineRelay,
+    OutputRelay,
+    close_worker_pool,
+    make_artifact_dir,
+    read_artifact,
+    remove_artifact_dir,
+    run_warm_stage,
+    write_artifact,
+)
+
+pa = pytest.importorskip("pyarrow")
+
+
+def test_line_relay_sends_complete_lines():
+    lines = queue.Queue()
+    relay = LineRelay(lines, "run")
+
+    relay.write("first\nsec")
+    relay.write("ond\n\nthird")
+    relay.finish()
+
+    sent = []
+    while not lines.empty():
+        sent.append(lines.get())
+    assert sent == [("run", "first"), ("run", "second"), ("run", ""), ("run", "third"),
+                    ("run", None)]
+
+
+def test_output_relay_routes_lines_by_run():
+    relay = OutputRelay()
+    emitted = {"a": [], "b": []}
+    try:
+        run_a = relay.register(emitted["a"].append)
+        run_b = relay.register(emitted["b"].append)
+        for run_id, line in ((run_a, "a1"), (run_b, "b1"), (run_a, "a2")):
+            relay.queue.put((run_id, line))
+        relay.queue.put((run_a, None))
+        relay.queue.put((run_b, None))
+        relay.wait(run_a)
+        relay.wait(run_b)
+    finally:
+        relay.close()
+
+    assert emitted == {"a": ["a1", "a2"], "b": ["b1"]}
+
+
+@pytest.fixture
+def artifact_dir():
+    path = make_artifact_dir()
+    yield path
+    remove_artifact_dir(path)
+
+
+def test_artifact_round_trip(artifact_dir):
+    table = pa.table({"id": [1, 2, 3], "name": ["a", "b", "c"]})
+    write_artifact(artifact_dir, "merged data", table)
+
+    assert read_artifact(artifact_dir, "merged data").equals(table)
+    assert read_artifact(artifact_dir, "missing") is None
+
+
+STAGE_SCRIPT = """
+import logging
+
+import pyarrow as pa
+
+
+def main(artifacts):
+    logging.getLogger().setLevel(logging.INFO)
+    print("starting")
+    logging.info("got %d rows", artifacts["numbers"].num_rows)
+    doubled = pa.table({"n": [2 * n for n in artifacts["numbers"].column("n").to_pylist()]})
+    return {"doubled": doubled, "ignored": doubled}
+
+
+def fail():
+    print("about to fail")
+    raise SystemExit(3)
+
+
+def greet(name, punctuation="."):
+    print(f"hello {name}{punctuation}")
+"""
+
+
+@pytest.fixture
+def warm_pool():
+    yield 1
+    close_worker_pool()
+
+
+def test_run_warm_stage(tmp_path, artifact_dir, warm_pool):
+    script = tmp_path / "stage_double.py"
+    script.write_text(textwrap.dedent(STAGE_SCRIPT))
+    write_artifact(artifact_dir, "numbers", pa.table({"n": [1, 2, 3]}))
+    lines = []
+
+    cpu_seconds, peak_rss_mb = run_warm_stage(
+        warm_pool, lines.append, str(script), "main", ["numbers"], ["doubled"], artifact_dir)
+
+    assert lines[0] == "starting"
+    assert lines[1].endswith("| INFO | got 3 rows")
+    assert read_artifact(artifact_dir, "doubled").column("n").to_pylist() == [2, 4, 6]
+    assert read_artifact(artifact_dir, "ignored") is None
+    assert peak_rss_mb is None or peak_rss_mb > 0
+
+
+def test_warm_stage_exit_status_is_an_error(tmp_path, artifact_dir, warm_pool):
+    script = tmp_path / "stage_fail.py"
+    script.write_text(textwrap.dedent(STAGE_SCRIPT))
+    lines = []
+
+    with pytest.raises(RuntimeError, match="exited with status 3"):
+        run_warm_stage(warm_pool, lines.append, str(script), "fail", [], [], artifact_dir)
+    assert lines == ["about to fail"]
+
+
+def test_warm_stage_params_are_entry_arguments(tmp_path, artifact_dir, warm_pool):
+    script = tmp_path / "stage_greet.py"
+    script.write_text(textwrap.dedent(STAGE_SCRIPT))
+    lines = []
+
+    run_warm_stage(warm_pool, lines.append, str(script), "greet", [], [], artifact_dir,
+                   {"name": "pipeline", "punctuation": "!"})
+
+    assert lines == ["hello pipeline!"]